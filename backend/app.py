@@ -1,17 +1,33 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory, g
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, verify_jwt_in_request
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import os
+import hmac
 import json
+import time
 import logging
+import threading
 from datetime import datetime
 from config import Config
-from database import db
+from database import db, is_duplicate_key
 from ml_processor import MLProcessor
+from model_artifacts import EXPORT_FORMATS as MODEL_EXPORT_FORMATS, portable_artifact
+from model_registry import ModelRegistry, MODEL_ALIASES, normalize_routes, choose_route
 from data_processor import DataProcessor
 from gemini_service import GeminiService
+from dataset_io import get_file_extension, write_dataframe, export_filename, EXPORT_FORMATS
+from dataset_store import dataset_store
+from blob_store import blob_store, StorageQuotaExceeded
+from dataset_filters import normalize_filters
+from encoding import normalize_encoding
+from feature_pipeline import normalize_pipeline
+from fingerprints import normalize_dedup
+from background import background_tasks, cpu_pool
+from metrics import metrics, span, server_timing, RequestProfiler
+from pagination import page_params, keyset_condition, paginate
+from prediction_log import PredictionLog
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -27,9 +43,230 @@ Config.init_app(app)
 ml_processor = MLProcessor()
 data_processor = DataProcessor()
 gemini_service = GeminiService()
+prediction_log = PredictionLog(db)
+model_registry = ModelRegistry(db)
+
+# Bounds the insight streams of this process, which each hold a worker thread (or greenlet) open
+insights_streams = threading.BoundedSemaphore(Config.INSIGHTS_MAX_STREAMS)
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
+    return '.' in filename and get_file_extension(filename) in Config.ALLOWED_EXTENSIONS
+
+def find_dataset(dataset_id, user_id, fresh=False):
+    """Ownership lookup of a user's dataset (file path, name, type, headers) through the query cache.
+    
+    Returns a list with the dataset row, or an empty list if the user does not own it.
+    The file path changes when rows are appended, so the row is only cached for
+    QUERY_CACHE_MUTABLE_TTL seconds; fresh=True reads it from the database, for
+    callers about to change it.
+    """
+    query = "SELECT id, file_path, filename, file_type, headers FROM datasets WHERE id = %s AND user_id = %s"
+    if fresh:
+        return db.execute_query(query, (dataset_id, user_id))
+    return db.cached_query(query, (dataset_id, user_id), tables=['datasets'], ttl=Config.QUERY_CACHE_MUTABLE_TTL)
+
+def find_model(model_id, user_id, fresh=False):
+    """Ownership lookup of a user's model (path, name, algorithm, dataset, version) through the query cache.
+    
+    The model path changes when the model is updated, so the row is only cached
+    for QUERY_CACHE_MUTABLE_TTL seconds; fresh=True reads it from the database,
+    for callers about to change it.
+    """
+    query = "SELECT id, model_path, model_name, algorithm, dataset_id, version FROM models WHERE id = %s AND user_id = %s"
+    if fresh:
+        return db.execute_query(query, (model_id, user_id))
+    return db.cached_query(query, (model_id, user_id), tables=['models'], ttl=Config.QUERY_CACHE_MUTABLE_TTL)
+
+# Attempts at numbering a new model version when concurrent trainings take the same number
+MODEL_VERSION_ATTEMPTS = 5
+
+def insert_model_version(dataset_id, params):
+    """Insert a trained model as the next version of its dataset's models; returns (model_id, version).
+    
+    Two trainings finishing together can read the same next version; the
+    unique (dataset_id, version) index rejects the second insert, which is
+    retried with a fresh number.
+    """
+    for attempt in range(MODEL_VERSION_ATTEMPTS):
+        versions = db.execute_query(
+            "SELECT COALESCE(MAX(version), 0) + 1 AS version FROM models WHERE dataset_id = %s",
+            (dataset_id,)
+        )
+        version = int(versions[0]['version']) if versions else 1
+        try:
+            model_id = db.execute_query(
+                """INSERT INTO models 
+                   (workflow_id, dataset_id, user_id, model_name, model_type, algorithm, 
+                    model_path, train_test_split, accuracy, metrics, status, description, version)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'trained', %s, %s)""",
+                tuple(params) + (version,),
+                fetch=False
+            )
+            return model_id, version
+        except Exception as e:
+            if not is_duplicate_key(e) or attempt == MODEL_VERSION_ATTEMPTS - 1:
+                raise
+
+def serve_prediction(model_info, features, alias=None):
+    """Predict with a model version, counting it and its latency per version and alias (see metrics.py)"""
+    started = time.perf_counter()
+    try:
+        prediction = ml_processor.predict(model_info['model_path'], features, model_info['algorithm'])
+    except Exception:
+        metrics.observe_prediction(model_info['id'], alias, time.perf_counter() - started, error=True)
+        raise
+    metrics.observe_prediction(model_info['id'], alias, time.perf_counter() - started)
+    return prediction
+
+def storage_used(user_id):
+    """Bytes of uploads counted against a user's storage quota"""
+    rows = db.execute_query(
+        "SELECT COALESCE(SUM(file_size), 0) AS used FROM datasets WHERE user_id = %s",
+        (user_id,)
+    )
+    return int(rows[0]['used']) if rows else 0
+
+def convert_dataset_task(dataset_id, file_path):
+    """Convert an upload into the columnar store and mark the dataset as processed"""
+    try:
+        meta = data_processor.convert_dataset(file_path)
+        db.execute_query(
+            "UPDATE datasets SET row_count = %s, status = 'processed' WHERE id = %s",
+            (meta['row_count'], dataset_id),
+            fetch=False
+        )
+        return meta
+    except Exception:
+        db.execute_query(
+            "UPDATE datasets SET status = 'error' WHERE id = %s",
+            (dataset_id,),
+            fetch=False
+        )
+        raise
+
+def conversion_status(dataset_id, file_path):
+    """Report whether the columnar conversion of a dataset has finished"""
+    if not dataset_store.needs_conversion(file_path):
+        return {'status': 'not_required'}
+    meta = dataset_store.load_meta(file_path)
+    if meta and meta.get('converted_at'):
+        return {
+            'status': 'completed',
+            'converted_at': meta['converted_at'],
+            'conversion_seconds': meta.get('conversion_seconds'),
+            'sheets': meta.get('sheets', [])
+        }
+    task = background_tasks.status(f"convert:{dataset_id}")
+    return task or {'status': 'pending'}
+
+def delta_option(data, filters):
+    """The "delta" flag of a cleaning or transformation request; raises ValueError"""
+    delta = data.get('delta', False)
+    if not isinstance(delta, bool):
+        raise ValueError("delta must be a boolean")
+    if delta and filters:
+        raise ValueError("delta cannot be combined with a filter")
+    return delta
+
+def generate_insights_task(workflow_id, summary):
+    """Generate AI insights for a workflow and store them in workflows.insights.
+    
+    A timeout or error is recorded as insights_status 'failed' with the
+    message in insights_error; insights only ever holds generated text.
+    """
+    try:
+        insights = gemini_service.get_data_insights(summary, timeout=Config.INSIGHTS_TIMEOUT, raise_errors=True)
+    except Exception as e:
+        db.execute_query(
+            "UPDATE workflows SET insights_status = 'failed', insights_error = %s WHERE id = %s",
+            (str(e), workflow_id),
+            fetch=False
+        )
+        raise
+    db.execute_query(
+        "UPDATE workflows SET insights = %s, insights_status = 'completed', insights_error = NULL WHERE id = %s",
+        (insights, workflow_id),
+        fetch=False
+    )
+    return insights
+
+def insights_status(workflow_id, user_id):
+    """Return the insight state of a workflow, or None if it does not belong to the user"""
+    workflows = db.execute_query(
+        "SELECT insights, insights_status, insights_error FROM workflows WHERE id = %s AND user_id = %s",
+        (workflow_id, user_id)
+    )
+    if not workflows:
+        return None
+    workflow = workflows[0]
+    if workflow['insights'] is not None:
+        return {'workflow_id': workflow_id, 'status': 'completed', 'insights': workflow['insights']}
+    task = background_tasks.status(f"insights:{workflow_id}")
+    if workflow['insights_status'] == 'failed' and not (task and task['status'] in ['pending', 'running']):
+        return {'workflow_id': workflow_id, 'status': 'failed', 'insights': None, 'error': workflow['insights_error']}
+    task = task or {'status': 'pending'}
+    return {'workflow_id': workflow_id, 'status': task['status'], 'insights': None, 'error': task.get('error')}
+
+def is_admin_request():
+    """Whether the request carries a valid token of a user listed in ADMIN_USER_IDS"""
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        return False
+    return identity is not None and int(identity) in Config.ADMIN_USER_IDS
+
+def is_metrics_request():
+    """Whether the request carries the METRICS_TOKEN as a bearer token (scrapers) or is an admin's"""
+    authorization = request.headers.get('Authorization', '')
+    if Config.METRICS_TOKEN and hmac.compare_digest(authorization.encode(), f"Bearer {Config.METRICS_TOKEN}".encode()):
+        return True
+    return is_admin_request()
+
+# ==================== REQUEST INSTRUMENTATION ====================
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    profile = request.headers.get('X-Profile')
+    if profile and is_admin_request():
+        # None while another request of this process is being profiled
+        g.profiler = RequestProfiler(profile.lower()).start()
+        g.profile_skipped = g.profiler is None
+
+@app.after_request
+def record_request_metrics(response):
+    seconds = time.perf_counter() - g.get('request_started', time.perf_counter())
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe_request(route, request.method, response.status_code, seconds)
+    
+    spans = g.get('spans', [])
+    if spans:
+        response.headers['Server-Timing'] = server_timing(spans)
+    profiler = g.pop('profiler', None)
+    if profiler:
+        response.headers['X-Profile-File'] = profiler.stop(request.endpoint or 'request')
+    elif g.get('profile_skipped'):
+        response.headers['X-Profile-Skipped'] = 'busy'
+    
+    level = logging.INFO if seconds >= Config.SLOW_REQUEST_SECONDS else logging.DEBUG
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps({
+            'event': 'request',
+            'route': route,
+            'method': request.method,
+            'status': response.status_code,
+            'seconds': round(seconds, 6),
+            'spans': spans
+        }))
+    return response
+
+@app.teardown_request
+def release_request_profiler(error=None):
+    # Requests that ended without a response still hold the process-wide profiler
+    profiler = g.pop('profiler', None)
+    if profiler:
+        profiler.cancel()
 
 # ==================== AUTHENTICATION ENDPOINTS ====================
 
@@ -75,7 +312,7 @@ def signup():
                 'email': email
             }
         }), 201
-        
+    
     except Exception as e:
         logger.error(f"Signup error: {e}")
         return jsonify({'error': str(e)}), 500
@@ -118,7 +355,7 @@ def signin():
                 'email': user['email']
             }
         }), 200
-        
+    
     except Exception as e:
         logger.error(f"Signin error: {e}")
         return jsonify({'error': str(e)}), 500
@@ -128,7 +365,7 @@ def signin():
 @app.route('/api/datasets/upload', methods=['POST'])
 @jwt_required()
 def upload_dataset():
-    """Upload dataset (CSV or Excel)"""
+    """Upload dataset (CSV, Excel, Parquet or Feather)"""
     try:
         user_id = int(get_jwt_identity())
         
@@ -140,36 +377,61 @@ def upload_dataset():
             return jsonify({'error': 'No file selected'}), 400
         
         if not allowed_file(file.filename):
-            return jsonify({'error': 'Invalid file type. Allowed: CSV, XLSX, XLS'}), 400
+            return jsonify({'error': 'Invalid file type. Allowed: CSV, CSV.GZ, CSV.ZST, XLSX, XLS, PARQUET, FEATHER, ARROW'}), 400
         
-        # Save file
+        # Save file under the hash of its content, computed while it streams to disk
         filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        unique_filename = f"{timestamp}_{filename}"
-        filepath = os.path.join(Config.UPLOAD_FOLDER, unique_filename)
-        file.save(filepath)
-        
-        # Process file
-        dataset_info = data_processor.load_dataset(filepath, filename)
+        quota = Config.USER_STORAGE_QUOTA_MB * 1024 * 1024
+        try:
+            with span('upload.save'):
+                filepath, content_hash, file_size, existed = blob_store.save(
+                    file.stream, filename, max(quota - storage_used(user_id), 0) if quota else None
+                )
+        except StorageQuotaExceeded as e:
+            return jsonify({'error': str(e)}), 413
+        
+        # Process file; formats that are slow to parse only get a preview here.
+        # Row-oriented formats are converted to the columnar store in the background
+        preview_only = dataset_store.preview_only(filepath)
+        needs_conversion = dataset_store.needs_conversion(filepath)
+        meta = dataset_store.load_meta(filepath) if existed else None
+        if meta and meta.get('converted_at'):
+            # Same content as an earlier upload: its columnar store and profile are reused, nothing is parsed again
+            dataset_info = data_processor.load_preview(filepath, filename, nrows=10)
+            dataset_info['row_count'] = meta['row_count']
+            preview_only = needs_conversion = False
+        elif preview_only:
+            dataset_info = data_processor.load_preview(filepath, filename, nrows=10)
+        else:
+            dataset_info = data_processor.load_dataset(filepath, filename)
+        status = 'processing' if preview_only else 'processed'
         
         # Save to database
         dataset_id = db.execute_query(
             """INSERT INTO datasets 
-               (user_id, name, filename, file_path, file_type, row_count, column_count, headers, status)
-               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'processed')""",
+               (user_id, name, filename, file_path, file_type, row_count, column_count, headers,
+                content_hash, file_size, status)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
             (
                 user_id,
                 dataset_info['name'],
                 filename,
                 filepath,
                 dataset_info['file_type'],
-                dataset_info['row_count'],
+                dataset_info['row_count'] or 0,
                 dataset_info['column_count'],
-                json.dumps(dataset_info['headers'])
+                json.dumps(dataset_info['headers']),
+                content_hash,
+                # Only new content is charged against the quota; a stored blob takes no extra space
+                0 if existed else file_size,
+                status
             ),
             fetch=False
         )
         
+        if needs_conversion:
+            background_tasks.submit(f"convert:{dataset_id}", convert_dataset_task, dataset_id, filepath)
+        
         return jsonify({
             'message': 'Dataset uploaded successfully',
             'dataset': {
@@ -178,14 +440,45 @@ def upload_dataset():
                 'headers': dataset_info['headers'],
                 'row_count': dataset_info['row_count'],
                 'column_count': dataset_info['column_count'],
+                'status': status,
+                'deduplicated': existed,
+                'conversion': conversion_status(dataset_id, filepath),
                 'data': dataset_info['data'][:10]  # First 10 rows for preview
             }
         }), 201
-        
+    
     except Exception as e:
         logger.error(f"Upload error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/datasets', methods=['GET'])
+@jwt_required()
+def list_datasets():
+    """List the user's datasets, newest first (keyset pagination: ?limit=&cursor=)"""
+    try:
+        user_id = int(get_jwt_identity())
+        try:
+            limit, cursor = page_params(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        condition, condition_params = keyset_condition('d', cursor)
+        datasets = db.execute_query(
+            f"""SELECT d.id, d.name, d.filename, d.file_type, d.row_count, d.column_count, d.status, d.created_at
+                FROM datasets d
+                WHERE d.user_id = %s{condition}
+                ORDER BY d.created_at DESC, d.id DESC
+                LIMIT %s""",
+            (user_id, *condition_params, limit + 1)
+        )
+        datasets, next_cursor = paginate(datasets, limit)
+        
+        return jsonify({'datasets': datasets, 'next_cursor': next_cursor}), 200
+    
+    except Exception as e:
+        logger.error(f"List datasets error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/datasets/<int:dataset_id>', methods=['GET'])
 @jwt_required()
 def get_dataset(dataset_id):
@@ -194,7 +487,7 @@ def get_dataset(dataset_id):
         user_id = int(get_jwt_identity())
         
         datasets = db.execute_query(
-            """SELECT id, name, filename, file_type, row_count, column_count, headers, status, created_at
+            """SELECT id, name, filename, file_path, file_type, row_count, column_count, headers, status, created_at
                FROM datasets WHERE id = %s AND user_id = %s""",
             (dataset_id, user_id)
         )
@@ -206,20 +499,236 @@ def get_dataset(dataset_id):
         dataset['headers'] = json.loads(dataset['headers']) if dataset['headers'] else []
         
         # Load actual data
-        file_path = db.execute_query(
-            "SELECT file_path FROM datasets WHERE id = %s",
-            (dataset_id,)
-        )[0]['file_path']
+        file_path = dataset.pop('file_path')
         
-        dataset_info = data_processor.load_dataset(file_path, dataset['filename'])
+        dataset_info = data_processor.load_preview(file_path, dataset['filename'], nrows=100, sheet=request.args.get('sheet'))
         dataset['data'] = dataset_info['data'][:100]  # First 100 rows
+        dataset['conversion'] = conversion_status(dataset_id, file_path)
         
         return jsonify(dataset), 200
-        
+    
     except Exception as e:
         logger.error(f"Get dataset error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/datasets/<int:dataset_id>/export', methods=['GET'])
+@jwt_required()
+def export_dataset(dataset_id):
+    """Download the raw, cleaned or transformed dataset as CSV, Parquet or Feather"""
+    try:
+        user_id = int(get_jwt_identity())
+        fmt = request.args.get('format', 'parquet').lower()
+        stage = request.args.get('stage', 'cleaned').lower()
+        
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({'error': f"Invalid format. Allowed: {', '.join(EXPORT_FORMATS)}"}), 400
+        if stage not in ['raw', 'cleaned', 'transformed']:
+            return jsonify({'error': 'Invalid stage. Allowed: raw, cleaned, transformed'}), 400
+        try:
+            filters = normalize_filters(json.loads(request.args.get('filter') or '[]'))
+            pipeline = json.loads(request.args.get('pipeline') or 'null')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        datasets = find_dataset(dataset_id, user_id)
+        if not datasets:
+            return jsonify({'error': 'Dataset not found'}), 404
+        
+        dataset = datasets[0]
+        headers = json.loads(dataset['headers']) if dataset['headers'] else []
+        try:
+            dataset_store.check_filters(dataset['file_path'], filters)
+            if stage == 'transformed':
+                pipeline = normalize_pipeline(pipeline, headers)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        df = cpu_pool.run(data_processor.export_dataset, dataset['file_path'], headers, stage, filters, pipeline)
+        with span('data.serialize', rows=len(df)):
+            buffer = write_dataframe(df, fmt)
+        
+        return send_file(
+            buffer,
+            as_attachment=True,
+            download_name=export_filename(dataset['filename'], stage, fmt),
+            mimetype=EXPORT_FORMATS[fmt][1]
+        )
+    
+    except Exception as e:
+        logger.error(f"Export dataset error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<int:dataset_id>/status', methods=['GET'])
+@jwt_required()
+def get_dataset_status(dataset_id):
+    """Poll the processing status of an uploaded dataset"""
+    try:
+        user_id = int(get_jwt_identity())
+        
+        datasets = db.execute_query(
+            "SELECT file_path, row_count, status FROM datasets WHERE id = %s AND user_id = %s",
+            (dataset_id, user_id)
+        )
+        if not datasets:
+            return jsonify({'error': 'Dataset not found'}), 404
+        
+        dataset = datasets[0]
+        return jsonify({
+            'id': dataset_id,
+            'status': dataset['status'],
+            'row_count': dataset['row_count'],
+            'conversion': conversion_status(dataset_id, dataset['file_path'])
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Get dataset status error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<int:dataset_id>/views', methods=['POST'])
+@jwt_required()
+def create_dataset_view(dataset_id):
+    """Materialize a filtered view of a dataset; stages accept the same filter"""
+    try:
+        user_id = int(get_jwt_identity())
+        data = request.get_json()
+        
+        try:
+            filters = normalize_filters(data.get('filter'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not filters:
+            return jsonify({'error': 'filter is required'}), 400
+        
+        datasets = find_dataset(dataset_id, user_id)
+        if not datasets:
+            return jsonify({'error': 'Dataset not found'}), 404
+        
+        file_path = datasets[0]['file_path']
+        if not dataset_store.is_columnar(file_path):
+            return jsonify({
+                'error': 'Dataset is still being converted; retry when conversion has completed',
+                'conversion': conversion_status(dataset_id, file_path)
+            }), 409
+        
+        try:
+            view = data_processor.create_view(file_path, filters)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'dataset_id': dataset_id, **view}), 200
+    
+    except Exception as e:
+        logger.error(f"Create dataset view error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<int:dataset_id>/duplicates', methods=['GET'])
+@jwt_required()
+def get_dataset_duplicates(dataset_id):
+    """Report duplicate row groups, optionally comparing only ?subset=col1,col2"""
+    try:
+        user_id = int(get_jwt_identity())
+        
+        datasets = find_dataset(dataset_id, user_id)
+        if not datasets:
+            return jsonify({'error': 'Dataset not found'}), 404
+        
+        subset = [col for col in request.args.get('subset', '').split(',') if col] or None
+        try:
+            limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+            dedup = normalize_dedup({'subset': subset}, json.loads(datasets[0]['headers'] or '[]'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        report = cpu_pool.run(data_processor.find_duplicates, datasets[0]['file_path'], dedup['subset'], limit)
+        return jsonify({'dataset_id': dataset_id, **report}), 200
+    
+    except Exception as e:
+        logger.error(f"Get dataset duplicates error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<int:dataset_id>/append', methods=['POST'])
+@jwt_required()
+def append_dataset(dataset_id):
+    """Append the rows of an uploaded file (same columns) to a dataset"""
+    try:
+        user_id = int(get_jwt_identity())
+        
+        # The path changes with the first append (fork below), so it is read uncached: another
+        # process may have forked the dataset since this one cached its row
+        datasets = find_dataset(dataset_id, user_id, fresh=True)
+        if not datasets:
+            return jsonify({'error': 'Dataset not found'}), 404
+        
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        if not allowed_file(file.filename) or dataset_store.preview_only(file.filename):
+            return jsonify({'error': 'Invalid file type. Allowed: CSV, CSV.GZ, CSV.ZST, PARQUET, FEATHER, ARROW'}), 400
+        
+        file_path = datasets[0]['file_path']
+        if dataset_store.needs_conversion(file_path) and not dataset_store.is_converted(file_path):
+            return jsonify({
+                'error': 'Dataset is still being converted; retry when conversion has completed',
+                'conversion': conversion_status(dataset_id, file_path)
+            }), 409
+        
+        # The rows go into the columnar store; the uploaded chunk itself is not kept
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        append_path = os.path.join(Config.UPLOAD_FOLDER, f"append_{dataset_id}_{timestamp}_{secure_filename(file.filename)}")
+        with span('upload.save'):
+            file.save(append_path)
+        
+        # Copy-on-write: other datasets with the same upload keep the unmodified blob and store
+        forked = False
+        if blob_store.is_shared(file_path):
+            file_path, forked = blob_store.fork(file_path, dataset_id)
+        try:
+            result = cpu_pool.run(data_processor.append_dataset, file_path, append_path)
+        except ValueError as e:
+            # Only a fork made by this request is removed; an existing one may hold earlier appends
+            if forked:
+                blob_store.discard(file_path)
+            return jsonify({'error': str(e)}), 400
+        finally:
+            os.remove(append_path)
+        
+        db.execute_query(
+            "UPDATE datasets SET row_count = %s, file_path = %s WHERE id = %s",
+            (result['row_count'], file_path, dataset_id),
+            fetch=False
+        )
+        
+        return jsonify({
+            'message': 'Rows appended successfully',
+            'dataset_id': dataset_id,
+            **result
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Append dataset error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<int:dataset_id>/profile', methods=['GET'])
+@jwt_required()
+def get_dataset_profile(dataset_id):
+    """Column statistics of a dataset, kept up to date as rows are appended"""
+    try:
+        user_id = int(get_jwt_identity())
+        
+        datasets = find_dataset(dataset_id, user_id)
+        if not datasets:
+            return jsonify({'error': 'Dataset not found'}), 404
+        
+        profile = cpu_pool.run(data_processor.dataset_profile, datasets[0]['file_path'])
+        return jsonify({'dataset_id': dataset_id, **profile}), 200
+    
+    except Exception as e:
+        logger.error(f"Get dataset profile error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # ==================== DATA PROCESSING ENDPOINTS ====================
 
 @app.route('/api/process/gathering', methods=['POST'])
@@ -235,10 +744,7 @@ def data_gathering():
             return jsonify({'error': 'dataset_id is required'}), 400
         
         # Get dataset
-        datasets = db.execute_query(
-            "SELECT file_path, headers FROM datasets WHERE id = %s AND user_id = %s",
-            (dataset_id, user_id)
-        )
+        datasets = find_dataset(dataset_id, user_id)
         if not datasets:
             return jsonify({'error': 'Dataset not found'}), 404
         
@@ -247,7 +753,7 @@ def data_gathering():
         headers = json.loads(dataset['headers'])
         
         # Process data
-        processed_data = data_processor.process_gathering(file_path, headers)
+        processed_data = cpu_pool.run(data_processor.process_gathering, file_path, headers)
         
         # Save workflow
         workflow_id = db.execute_query(
@@ -263,17 +769,22 @@ def data_gathering():
             fetch=False
         )
         
-        # Use Gemini for insights
+        # Use Gemini for insights, off the request path; clients poll or stream the result
         summary = f"Headers: {', '.join(headers)}. Processed {processed_data.get('row_count', 0)} rows."
-        insights = gemini_service.get_data_insights(summary)
+        background_tasks.submit(f"insights:{workflow_id}", generate_insights_task, workflow_id, summary)
         
         return jsonify({
             'message': 'Data gathering completed',
             'workflow_id': workflow_id,
             'data': processed_data,
-            'insights': insights
+            'insights': None,
+            'insights_handle': {
+                'status': 'pending',
+                'poll_url': f"/api/workflows/{workflow_id}/insights",
+                'stream_url': f"/api/workflows/{workflow_id}/insights/stream"
+            }
         }), 200
-        
+    
     except Exception as e:
         logger.error(f"Data gathering error: {e}")
         return jsonify({'error': str(e)}), 500
@@ -290,18 +801,27 @@ def data_cleaning():
         if not dataset_id:
             return jsonify({'error': 'dataset_id is required'}), 400
         
+        try:
+            filters = normalize_filters(data.get('filter'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Get dataset
-        datasets = db.execute_query(
-            "SELECT file_path FROM datasets WHERE id = %s AND user_id = %s",
-            (dataset_id, user_id)
-        )
+        datasets = find_dataset(dataset_id, user_id)
         if not datasets:
             return jsonify({'error': 'Dataset not found'}), 404
         
         file_path = datasets[0]['file_path']
         
+        try:
+            dataset_store.check_filters(file_path, filters)
+            dedup = normalize_dedup(data.get('dedup'), json.loads(datasets[0]['headers'] or '[]'))
+            delta = delta_option(data, filters)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Process cleaning
-        cleaned_data = data_processor.process_cleaning(file_path)
+        cleaned_data = cpu_pool.run(data_processor.process_cleaning, file_path, filters, dedup, delta)
         
         # Save workflow
         workflow_id = db.execute_query(
@@ -322,7 +842,7 @@ def data_cleaning():
             'workflow_id': workflow_id,
             'data': cleaned_data
         }), 200
-        
+    
     except Exception as e:
         logger.error(f"Data cleaning error: {e}")
         return jsonify({'error': str(e)}), 500
@@ -339,19 +859,28 @@ def data_transformation():
         if not dataset_id:
             return jsonify({'error': 'dataset_id is required'}), 400
         
+        try:
+            filters = normalize_filters(data.get('filter'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Get dataset
-        datasets = db.execute_query(
-            "SELECT file_path, headers FROM datasets WHERE id = %s AND user_id = %s",
-            (dataset_id, user_id)
-        )
+        datasets = find_dataset(dataset_id, user_id)
         if not datasets:
             return jsonify({'error': 'Dataset not found'}), 404
         
         file_path = datasets[0]['file_path']
         headers = json.loads(datasets[0]['headers'])
         
+        try:
+            dataset_store.check_filters(file_path, filters)
+            pipeline = normalize_pipeline(data.get('pipeline'), headers)
+            delta = delta_option(data, filters)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Process transformation
-        transformed_data = data_processor.process_transformation(file_path, headers)
+        transformed_data = cpu_pool.run(data_processor.process_transformation, file_path, headers, filters, pipeline, delta)
         
         # Save workflow
         workflow_id = db.execute_query(
@@ -372,11 +901,69 @@ def data_transformation():
             'workflow_id': workflow_id,
             'data': transformed_data
         }), 200
-        
+    
     except Exception as e:
         logger.error(f"Data transformation error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/workflows/<int:workflow_id>/insights', methods=['GET'])
+@jwt_required()
+def get_workflow_insights(workflow_id):
+    """Poll the AI insights of a workflow"""
+    try:
+        user_id = int(get_jwt_identity())
+        
+        status = insights_status(workflow_id, user_id)
+        if status is None:
+            return jsonify({'error': 'Workflow not found'}), 404
+        
+        return jsonify(status), 200
+    
+    except Exception as e:
+        logger.error(f"Get insights error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/workflows/<int:workflow_id>/insights/stream', methods=['GET'])
+@jwt_required()
+def stream_workflow_insights(workflow_id):
+    """Stream the AI insights of a workflow as server-sent events"""
+    try:
+        user_id = int(get_jwt_identity())
+        
+        status = insights_status(workflow_id, user_id)
+        if status is None:
+            return jsonify({'error': 'Workflow not found'}), 404
+        
+        if status['status'] in ['completed', 'failed']:
+            return Response(
+                f"event: insights\ndata: {json.dumps(status)}\n\n",
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache'}
+            )
+        
+        if not insights_streams.acquire(blocking=False):
+            return jsonify({'error': 'Too many open insight streams, poll /insights instead'}), 503
+        
+        def events(status):
+            deadline = time.monotonic() + Config.INSIGHTS_TIMEOUT
+            while status['status'] not in ['completed', 'failed'] and time.monotonic() < deadline:
+                yield f"event: status\ndata: {json.dumps(status)}\n\n"
+                timeout = min(Config.INSIGHTS_STREAM_HEARTBEAT, max(0, deadline - time.monotonic()))
+                # Wait on the in-process task; a task of another worker is re-checked once per heartbeat
+                if background_tasks.wait(f"insights:{workflow_id}", timeout=timeout) is None:
+                    time.sleep(timeout)
+                status = insights_status(workflow_id, user_id)
+            yield f"event: insights\ndata: {json.dumps(status)}\n\n"
+        
+        response = Response(events(status), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+        # Released when the response is closed, also if the client leaves before the first event
+        response.call_on_close(insights_streams.release)
+        return response
+    
+    except Exception as e:
+        logger.error(f"Stream insights error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # ==================== ML MODELING ENDPOINTS ====================
 
 @app.route('/api/models/suggest', methods=['POST'])
@@ -409,7 +996,7 @@ def suggest_models():
         return jsonify({
             'suggestions': suggestions
         }), 200
-        
+    
     except Exception as e:
         logger.error(f"Suggest models error: {e}")
         return jsonify({'error': str(e)}), 500
@@ -428,21 +1015,28 @@ def train_model():
         if not dataset_id or not model_names:
             return jsonify({'error': 'dataset_id and models are required'}), 400
         
+        try:
+            filters = normalize_filters(data.get('filter'))
+            encoding = normalize_encoding(data.get('encoding'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Get dataset
-        datasets = db.execute_query(
-            "SELECT file_path, headers FROM datasets WHERE id = %s AND user_id = %s",
-            (dataset_id, user_id)
-        )
+        datasets = find_dataset(dataset_id, user_id)
         if not datasets:
             return jsonify({'error': 'Dataset not found'}), 404
         
         file_path = datasets[0]['file_path']
         headers = json.loads(datasets[0]['headers'])
+        try:
+            dataset_store.check_filters(file_path, filters)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Get latest workflow
         workflows = db.execute_query(
-            "SELECT id FROM workflows WHERE dataset_id = %s ORDER BY id DESC LIMIT 1",
-            (dataset_id,)
+            "SELECT id FROM workflows WHERE dataset_id = %s AND user_id = %s ORDER BY id DESC LIMIT 1",
+            (dataset_id, user_id)
         )
         workflow_id = workflows[0]['id'] if workflows else None
         
@@ -450,35 +1044,28 @@ def train_model():
         trained_models = []
         for model_name in model_names:
             try:
-                result = ml_processor.train_model(
-                    file_path, headers, model_name, split_ratio, user_id, dataset_id
+                result = cpu_pool.run(
+                    ml_processor.train_model, file_path, headers, model_name, split_ratio, user_id, dataset_id, filters, encoding
                 )
                 
-                # Save model to database
-                model_id = db.execute_query(
-                    """INSERT INTO models 
-                       (workflow_id, dataset_id, user_id, model_name, model_type, algorithm, 
-                        model_path, train_test_split, accuracy, metrics, status, description)
-                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'trained', %s)""",
-                    (
-                        workflow_id,
-                        dataset_id,
-                        user_id,
-                        result['model_name'],
-                        result['model_type'],
-                        model_name,
-                        result['model_path'],
-                        split_ratio,
-                        result.get('accuracy'),
-                        json.dumps(result.get('metrics', {})),
-                        f"Trained {model_name} on dataset"
-                    ),
-                    fetch=False
-                )
+                # Save model to database, as the next version of the dataset's models
+                model_id, result['version'] = insert_model_version(dataset_id, (
+                    workflow_id,
+                    dataset_id,
+                    user_id,
+                    result['model_name'],
+                    result['model_type'],
+                    model_name,
+                    result['model_path'],
+                    split_ratio,
+                    result.get('accuracy'),
+                    json.dumps(result.get('metrics', {})),
+                    f"Trained {model_name} on dataset"
+                ))
                 
                 result['id'] = model_id
                 trained_models.append(result)
-                
+            
             except Exception as e:
                 logger.error(f"Error training {model_name}: {e}")
                 continue
@@ -487,11 +1074,44 @@ def train_model():
             'message': 'Models trained successfully',
             'models': trained_models
         }), 200
-        
+    
     except Exception as e:
         logger.error(f"Train model error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/models', methods=['GET'])
+@jwt_required()
+def list_models():
+    """List the user's models, newest first, optionally for one dataset (?dataset_id=&limit=&cursor=)"""
+    try:
+        user_id = int(get_jwt_identity())
+        try:
+            limit, cursor = page_params(request.args)
+            dataset_id = request.args.get('dataset_id', type=int)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        condition, condition_params = keyset_condition('m', cursor)
+        if dataset_id:
+            condition = f" AND m.dataset_id = %s{condition}"
+            condition_params = (dataset_id, *condition_params)
+        models = db.execute_query(
+            f"""SELECT m.id, m.dataset_id, m.model_name, m.model_type, m.algorithm, m.version, m.accuracy,
+                       m.status, m.created_at
+                FROM models m
+                WHERE m.user_id = %s{condition}
+                ORDER BY m.created_at DESC, m.id DESC
+                LIMIT %s""",
+            (user_id, *condition_params, limit + 1)
+        )
+        models, next_cursor = paginate(models, limit)
+        
+        return jsonify({'models': models, 'next_cursor': next_cursor}), 200
+    
+    except Exception as e:
+        logger.error(f"List models error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/models/<int:model_id>', methods=['GET'])
 @jwt_required()
 def get_model(model_id):
@@ -500,7 +1120,7 @@ def get_model(model_id):
         user_id = int(get_jwt_identity())
         
         models = db.execute_query(
-            """SELECT id, model_name, model_type, algorithm, accuracy, precision_score, 
+            """SELECT id, dataset_id, model_name, model_type, algorithm, version, accuracy, precision_score, 
                       recall_score, f1_score, r2_score, mse, mae, metrics, status, 
                       description, created_at, trained_at
                FROM models WHERE id = %s AND user_id = %s""",
@@ -514,7 +1134,7 @@ def get_model(model_id):
         model['metrics'] = json.loads(model['metrics']) if model['metrics'] else {}
         
         return jsonify(model), 200
-        
+    
     except Exception as e:
         logger.error(f"Get model error: {e}")
         return jsonify({'error': str(e)}), 500
@@ -532,52 +1152,87 @@ def predict(model_id):
             return jsonify({'error': 'Features are required'}), 400
         
         # Get model
-        models = db.execute_query(
-            "SELECT model_path, algorithm, dataset_id FROM models WHERE id = %s AND user_id = %s",
-            (model_id, user_id)
-        )
+        models = find_model(model_id, user_id)
         if not models:
             return jsonify({'error': 'Model not found'}), 404
         
         model_info = models[0]
         
         # Make prediction
-        prediction = ml_processor.predict(model_info['model_path'], features, model_info['algorithm'])
+        prediction = serve_prediction(model_info, features)
         
-        # Save prediction
-        prediction_id = db.execute_query(
-            """INSERT INTO predictions (model_id, user_id, input_features, prediction_result, confidence_score)
-               VALUES (%s, %s, %s, %s, %s)""",
-            (
-                model_id,
-                user_id,
-                json.dumps(features),
-                json.dumps(prediction),
-                prediction.get('confidence', 0)
-            ),
-            fetch=False
-        )
+        # Log prediction; rows are inserted in batches in the background
+        prediction_id = prediction_log.append(model_id, user_id, features, prediction)
         
         return jsonify({
-            'prediction_id': prediction_id,
+            'prediction_id': prediction_id,  # Listed by GET /api/predictions once the buffered row is written
             'prediction': prediction
         }), 200
-        
+    
     except Exception as e:
         logger.error(f"Predict error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/models/<int:model_id>/update', methods=['POST'])
+@jwt_required()
+def update_model(model_id):
+    """Continue training a model (SGD, Random Forest) on the rows appended to its dataset since training"""
+    try:
+        user_id = int(get_jwt_identity())
+        
+        # Read uncached: the update must start from the current model, not one replaced in another process
+        models = find_model(model_id, user_id, fresh=True)
+        if not models:
+            return jsonify({'error': 'Model not found'}), 404
+        
+        model_info = models[0]
+        datasets = find_dataset(model_info['dataset_id'], user_id, fresh=True)
+        if not datasets:
+            return jsonify({'error': 'Dataset not found'}), 404
+        
+        try:
+            result = cpu_pool.run(
+                ml_processor.update_model, model_info['model_path'], datasets[0]['file_path'],
+                json.loads(datasets[0]['headers']), model_info['algorithm']
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if result['model_path'] != model_info['model_path']:
+            # Only replaces the model this update started from; a concurrent update that saved first wins
+            db.execute_query(
+                "UPDATE models SET model_path = %s, trained_at = NOW() WHERE id = %s AND model_path = %s",
+                (result['model_path'], model_id, model_info['model_path']),
+                fetch=False
+            )
+            current = find_model(model_id, user_id, fresh=True)
+            if not current or current[0]['model_path'] != result['model_path']:
+                ml_processor.discard_model(result['model_path'])
+                return jsonify({'error': 'The model was updated concurrently; retry the update'}), 409
+        
+        return jsonify({
+            'message': 'Model updated' if result['rows'] else 'No new rows since the model was trained',
+            'model_id': model_id,
+            'method': result['method'],
+            'rows': result['rows'],
+            'score_before_update': result.get('score_before_update')
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Update model error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/models/<int:model_id>/download', methods=['GET'])
 @jwt_required()
 def download_model(model_id):
-    """Download trained model as .pkl file"""
+    """Download trained model as .pkl file (loadable with plain joblib), or exported with ?format=skops|onnx"""
     try:
         user_id = int(get_jwt_identity())
+        fmt = request.args.get('format', 'pkl').lower()
+        if fmt not in MODEL_EXPORT_FORMATS:
+            return jsonify({'error': f"Invalid format. Allowed: {', '.join(MODEL_EXPORT_FORMATS)}"}), 400
         
-        models = db.execute_query(
-            "SELECT model_path, model_name FROM models WHERE id = %s AND user_id = %s",
-            (model_id, user_id)
-        )
+        models = find_model(model_id, user_id)
         
         if not models:
             return jsonify({'error': 'Model not found'}), 404
@@ -588,17 +1243,201 @@ def download_model(model_id):
         if not os.path.exists(model_path):
             return jsonify({'error': 'Model file not found'}), 404
         
+        if fmt == 'pkl':
+            with span('ml.export'):
+                artifact = portable_artifact(model_path)
+            return send_file(
+                artifact,
+                as_attachment=True,
+                download_name=f"{model_name}_{model_id}.pkl",
+                mimetype=MODEL_EXPORT_FORMATS[fmt]
+            )
+        
+        try:
+            with span('ml.export'):
+                buffer = ml_processor.export_model(model_path, fmt)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         return send_file(
-            model_path,
+            buffer,
             as_attachment=True,
-            download_name=f"{model_name}_{model_id}.pkl",
-            mimetype='application/octet-stream'
+            download_name=f"{model_name}_{model_id}.{fmt}",
+            mimetype=MODEL_EXPORT_FORMATS[fmt]
         )
-        
+    
     except Exception as e:
         logger.error(f"Download model error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/predictions', methods=['GET'])
+@jwt_required()
+def list_predictions():
+    """List the user's predictions, newest first, optionally for one model or one prediction id (?model_id=&prediction_id=&limit=&cursor=)"""
+    try:
+        user_id = int(get_jwt_identity())
+        try:
+            limit, cursor = page_params(request.args)
+            model_id = request.args.get('model_id', type=int)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        prediction_id = request.args.get('prediction_id')
+        
+        condition, condition_params = keyset_condition('p', cursor)
+        if model_id:
+            condition = f" AND p.model_id = %s{condition}"
+            condition_params = (model_id, *condition_params)
+        if prediction_id:
+            condition = f" AND p.prediction_uuid = %s{condition}"
+            condition_params = (prediction_id, *condition_params)
+        predictions = db.execute_query(
+            f"""SELECT p.id, p.prediction_uuid AS prediction_id, p.model_id, p.input_features, p.prediction_result,
+                       p.confidence_score, p.created_at
+                FROM predictions p
+                WHERE p.user_id = %s{condition}
+                ORDER BY p.created_at DESC, p.id DESC
+                LIMIT %s""",
+            (user_id, *condition_params, limit + 1)
+        )
+        predictions, next_cursor = paginate(predictions, limit)
+        for prediction in predictions:
+            prediction['input_features'] = json.loads(prediction['input_features']) if prediction['input_features'] else {}
+            prediction['prediction_result'] = json.loads(prediction['prediction_result']) if prediction['prediction_result'] else None
+        
+        return jsonify({'predictions': predictions, 'next_cursor': next_cursor}), 200
+    
+    except Exception as e:
+        logger.error(f"List predictions error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# ==================== MODEL REGISTRY ====================
+
+@app.route('/api/datasets/<int:dataset_id>/registry', methods=['GET'])
+@jwt_required()
+def model_registry_view(dataset_id):
+    """A dataset's model versions with their prediction counters, and its aliases with their traffic split"""
+    try:
+        user_id = int(get_jwt_identity())
+        if not find_dataset(dataset_id, user_id):
+            return jsonify({'error': 'Dataset not found'}), 404
+        
+        versions = db.execute_query(
+            """SELECT id, version, model_name, model_type, algorithm, accuracy, status, created_at, trained_at
+               FROM models WHERE dataset_id = %s AND user_id = %s
+               ORDER BY version, id""",
+            (dataset_id, user_id)
+        )
+        aliases = model_registry.aliases(dataset_id, user_id)
+        for version in versions:
+            version['aliases'] = [
+                alias for alias, entry in aliases.items()
+                if any(route['model_id'] == version['id'] for route in entry['routes'])
+            ]
+            # Counted by this worker process; GET /api/metrics has them per process for aggregation
+            version['stats'] = metrics.prediction_stats(version['id'])
+        
+        return jsonify({'versions': versions, 'aliases': aliases}), 200
+    
+    except Exception as e:
+        logger.error(f"Model registry error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<int:dataset_id>/aliases/<alias>', methods=['PUT'])
+@jwt_required()
+def set_model_alias(dataset_id, alias):
+    """Point an alias at one model version or split its traffic, e.g. {"routes": [{"model_id": 3, "weight": 90}, {"model_id": 5, "weight": 10}]}"""
+    try:
+        user_id = int(get_jwt_identity())
+        if alias not in MODEL_ALIASES:
+            return jsonify({'error': f"Invalid alias. Allowed: {', '.join(MODEL_ALIASES)}"}), 400
+        try:
+            routes = normalize_routes(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if not find_dataset(dataset_id, user_id):
+            return jsonify({'error': 'Dataset not found'}), 404
+        
+        for route in routes:
+            models = find_model(route['model_id'], user_id)
+            if not models or models[0]['dataset_id'] != dataset_id:
+                return jsonify({'error': f"Model {route['model_id']} is not a version of this dataset's models"}), 400
+            # Loaded before the swap, so the first requests routed to it do not wait for the load
+            try:
+                ml_processor.load_model(models[0]['model_path'])
+                ml_processor.compiled_model(models[0]['model_path'])
+            except Exception as e:
+                return jsonify({'error': f"Model {route['model_id']} could not be loaded: {e}"}), 400
+        
+        previous = model_registry.routes(dataset_id, alias, user_id)
+        model_registry.set_routes(dataset_id, alias, user_id, routes)
+        
+        return jsonify({
+            'alias': alias,
+            'routes': routes,
+            'previous_routes': list(previous) if previous else None
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Set model alias error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<int:dataset_id>/aliases/<alias>', methods=['DELETE'])
+@jwt_required()
+def remove_model_alias(dataset_id, alias):
+    """Unset an alias"""
+    try:
+        user_id = int(get_jwt_identity())
+        if not find_dataset(dataset_id, user_id):
+            return jsonify({'error': 'Dataset not found'}), 404
+        if model_registry.routes(dataset_id, alias, user_id) is None:
+            return jsonify({'error': 'Alias not found'}), 404
+        
+        model_registry.remove(dataset_id, alias, user_id)
+        return jsonify({'message': f"Alias {alias} removed"}), 200
+    
+    except Exception as e:
+        logger.error(f"Remove model alias error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<int:dataset_id>/predict', methods=['POST'])
+@jwt_required()
+def predict_alias(dataset_id):
+    """Predict with the model version an alias routes to ({"features": {...}, "alias": "production", "routing_key": ...})"""
+    try:
+        user_id = int(get_jwt_identity())
+        data = request.get_json(silent=True) or {}
+        features = data.get('features', {})
+        alias = data.get('alias', 'production')
+        
+        if not features:
+            return jsonify({'error': 'Features are required'}), 400
+        if alias not in MODEL_ALIASES:
+            return jsonify({'error': f"Invalid alias. Allowed: {', '.join(MODEL_ALIASES)}"}), 400
+        
+        routes = model_registry.routes(dataset_id, alias, user_id)
+        if routes is None:
+            return jsonify({'error': f"No model version is published as {alias} for this dataset"}), 404
+        route = choose_route(routes, data.get('routing_key'))
+        models = find_model(route['model_id'], user_id)
+        if not models:
+            return jsonify({'error': 'Model not found'}), 404
+        
+        model_info = models[0]
+        prediction = serve_prediction(model_info, features, alias)
+        prediction_id = prediction_log.append(model_info['id'], user_id, features, prediction)
+        
+        return jsonify({
+            'prediction_id': prediction_id,
+            'prediction': prediction,
+            'model_id': model_info['id'],
+            'version': model_info.get('version'),
+            'alias': alias
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Alias predict error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # ==================== VISUALIZATION ENDPOINTS ====================
 
 @app.route('/api/visualizations/generate', methods=['POST'])
@@ -614,19 +1453,25 @@ def generate_visualization():
         if not dataset_id:
             return jsonify({'error': 'dataset_id is required'}), 400
         
+        try:
+            filters = normalize_filters(data.get('filter'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Get dataset
-        datasets = db.execute_query(
-            "SELECT file_path, headers FROM datasets WHERE id = %s AND user_id = %s",
-            (dataset_id, user_id)
-        )
+        datasets = find_dataset(dataset_id, user_id)
         if not datasets:
             return jsonify({'error': 'Dataset not found'}), 404
         
         file_path = datasets[0]['file_path']
         headers = json.loads(datasets[0]['headers'])
+        try:
+            dataset_store.check_filters(file_path, filters)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Generate visualizations
-        viz_data = data_processor.generate_visualizations(file_path, headers, viz_type)
+        viz_data = cpu_pool.run(data_processor.generate_visualizations, file_path, headers, viz_type, filters)
         
         # Save visualization
         viz_id = db.execute_query(
@@ -647,7 +1492,7 @@ def generate_visualization():
             'visualization_id': viz_id,
             'data': viz_data
         }), 200
-        
+    
     except Exception as e:
         logger.error(f"Generate visualization error: {e}")
         return jsonify({'error': str(e)}), 500
@@ -657,26 +1502,32 @@ def generate_visualization():
 @app.route('/api/history', methods=['GET'])
 @jwt_required()
 def get_history():
-    """Get user's project history"""
+    """Get user's project history, newest first (keyset pagination: ?limit=&cursor=)"""
     try:
         user_id = int(get_jwt_identity())
+        try:
+            limit, cursor = page_params(request.args, default_limit=50)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Get project sessions with model info
+        # Get project sessions with model info; the joins are primary-key lookups per page row
+        condition, condition_params = keyset_condition('ps', cursor)
         sessions = db.execute_query(
-            """SELECT ps.id, ps.session_name, ps.insights, ps.created_at, ps.updated_at,
-                      m.id as model_id, m.model_name, m.accuracy, m.model_type,
-                      d.name as dataset_name
-               FROM project_sessions ps
-               LEFT JOIN models m ON ps.model_id = m.id
-               LEFT JOIN datasets d ON ps.dataset_id = d.id
-               WHERE ps.user_id = %s
-               ORDER BY ps.created_at DESC
-               LIMIT 50""",
-            (user_id,)
+            f"""SELECT ps.id, ps.session_name, ps.insights, ps.created_at, ps.updated_at,
+                       m.id as model_id, m.model_name, m.accuracy, m.model_type,
+                       d.name as dataset_name
+                FROM project_sessions ps
+                LEFT JOIN models m ON ps.model_id = m.id
+                LEFT JOIN datasets d ON ps.dataset_id = d.id
+                WHERE ps.user_id = %s{condition}
+                ORDER BY ps.created_at DESC, ps.id DESC
+                LIMIT %s""",
+            (user_id, *condition_params, limit + 1)
         )
+        sessions, next_cursor = paginate(sessions, limit)
         
-        return jsonify({'history': sessions}), 200
-        
+        return jsonify({'history': sessions, 'next_cursor': next_cursor}), 200
+    
     except Exception as e:
         logger.error(f"Get history error: {e}")
         return jsonify({'error': str(e)}), 500
@@ -700,11 +1551,63 @@ def load_history_session(session_id):
         session['workflow_summary'] = json.loads(session['workflow_summary']) if session['workflow_summary'] else {}
         
         return jsonify(session), 200
-        
+    
     except Exception as e:
         logger.error(f"Load history error: {e}")
         return jsonify({'error': str(e)}), 500
 
+# ==================== STORAGE ====================
+
+@app.route('/api/storage', methods=['GET'])
+@jwt_required()
+def get_storage_usage():
+    """Bytes of uploads counted against the user's quota"""
+    try:
+        user_id = int(get_jwt_identity())
+        quota = Config.USER_STORAGE_QUOTA_MB * 1024 * 1024
+        used = storage_used(user_id)
+        return jsonify({
+            'used_bytes': used,
+            'quota_bytes': quota or None,
+            'available_bytes': max(quota - used, 0) if quota else None
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Get storage usage error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/storage/gc', methods=['POST'])
+@jwt_required()
+def collect_storage_garbage():
+    """Remove uploads and columnar stores no dataset references (admins only)"""
+    try:
+        if not is_admin_request():
+            return jsonify({'error': 'Forbidden'}), 403
+        referenced = [row['file_path'] for row in db.execute_query("SELECT DISTINCT file_path FROM datasets")]
+        report = cpu_pool.run(blob_store.collect_garbage, referenced)
+        return jsonify(report), 200
+    
+    except Exception as e:
+        logger.error(f"Storage GC error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# ==================== METRICS ====================
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics: request latency per route, stage latency, rows and peak RSS (METRICS_TOKEN or admins)"""
+    if not is_metrics_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics/profiles/<path:filename>', methods=['GET'])
+@jwt_required()
+def download_profile(filename):
+    """Download a request profile taken with the X-Profile header (admins only)"""
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    return send_from_directory(Config.PROFILE_FOLDER, filename, as_attachment=True)
+
 # ==================== HEALTH CHECK ====================
 
 @app.route('/api/health', methods=['GET'])
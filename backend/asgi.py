@@ -0,0 +1,13 @@
+"""
+ASGI entry point for asyncio servers:
+
+    uvicorn asgi:application --workers 2
+
+The Flask app (routes, JWT auth, CORS) is served unchanged through asgiref's
+WSGI adapter; blocking handlers run in its thread pool (ASGI_THREADS) and
+CPU-bound stages are handed to the CPU_WORKERS process pool.
+"""
+from asgiref.wsgi import WsgiToAsgi
+from app import app
+
+application = WsgiToAsgi(app)
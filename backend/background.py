@@ -0,0 +1,149 @@
+import time
+import threading
+import logging
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+from config import Config
+from metrics import call_with_spans, record_span
+from shared_features import shared_features, init_worker
+
+logger = logging.getLogger(__name__)
+
+class BackgroundTasks:
+    """Run slow work (file conversion, LLM calls) off the request path and track its status.
+    
+    Finished tasks are kept for task_ttl seconds so their status can be
+    polled, and at most max_finished of them are kept at all.
+    """
+    
+    def __init__(self, max_workers=None, task_ttl=None, max_finished=None):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or Config.BACKGROUND_WORKERS,
+            thread_name_prefix='dataflow-bg'
+        )
+        self.task_ttl = Config.BACKGROUND_TASK_TTL if task_ttl is None else task_ttl
+        self.max_finished = Config.BACKGROUND_TASK_MAX if max_finished is None else max_finished
+        self._tasks = {}
+        self._lock = threading.Lock()
+    
+    def submit(self, key, fn, *args, **kwargs):
+        """Schedule fn in the background under a task key, unless that key is already running"""
+        with self._lock:
+            self._evict()
+            task = self._tasks.get(key)
+            if task and task['status'] in ['pending', 'running']:
+                return task['future']
+            task = {
+                'status': 'pending',
+                'error': None,
+                'submitted_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'finished': None,
+                'future': None
+            }
+            self._tasks[key] = task
+            task['future'] = self._executor.submit(self._run, key, task, fn, *args, **kwargs)
+            return task['future']
+    
+    def _run(self, key, task, fn, *args, **kwargs):
+        task['status'] = 'running'
+        try:
+            result = fn(*args, **kwargs)
+            task['status'] = 'completed'
+            return result
+        except Exception as e:
+            logger.error(f"Background task {key} failed: {e}")
+            task['status'] = 'failed'
+            task['error'] = str(e)
+            raise
+        finally:
+            task['finished_at'] = datetime.now().isoformat()
+            task['finished'] = time.monotonic()
+    
+    def _evict(self):
+        # Called with the lock held; running tasks are never evicted
+        finished = sorted(
+            (task['finished'], key) for key, task in self._tasks.items() if task['finished'] is not None
+        )
+        expired = time.monotonic() - self.task_ttl
+        excess = len(finished) - self.max_finished
+        for i, (finished_at, key) in enumerate(finished):
+            if i < excess or finished_at < expired:
+                del self._tasks[key]
+    
+    def status(self, key):
+        """Return the status of a task, or None if it is unknown to this process (or evicted)"""
+        with self._lock:
+            self._evict()
+            task = self._tasks.get(key)
+        if not task:
+            return None
+        return {
+            'status': task['status'],
+            'error': task['error'],
+            'submitted_at': task['submitted_at'],
+            'finished_at': task['finished_at']
+        }
+    
+    def wait(self, key, timeout=None):
+        """Block until a task finishes or timeout seconds pass; return its status, or None if it is unknown to this process"""
+        with self._lock:
+            task = self._tasks.get(key)
+        if not task:
+            return None
+        wait([task['future']], timeout=timeout)
+        return self.status(key)
+    
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+class CpuPool:
+    """Process pool for CPU-bound pandas/sklearn stages.
+    
+    Request threads (or greenlets, or event loops) only wait on the result,
+    so one server process keeps serving I/O-bound requests while stages run.
+    With max_workers=0 the work runs inline in the caller.
+    """
+    
+    def __init__(self, max_workers=None):
+        self.max_workers = Config.CPU_WORKERS if max_workers is None else max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+    
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn avoids forking a process that already runs threads
+                context = multiprocessing.get_context(Config.CPU_POOL_START_METHOD)
+                # Workers attach to the feature matrices shared before fork
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=context,
+                    initializer=init_worker,
+                    initargs=(shared_features.descriptors(),)
+                )
+            return self._executor
+    
+    def run(self, fn, *args, **kwargs):
+        """Run fn in a worker process and wait for its result"""
+        if not self.max_workers:
+            return fn(*args, **kwargs)
+        result, spans = self._get_executor().submit(call_with_spans, fn, *args, **kwargs).result()
+        self._record(spans)
+        return result
+    
+    def _record(self, spans):
+        # Stage spans recorded in the worker process are merged into this process's metrics
+        for entry in spans:
+            record_span(entry)
+    
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+# Global background task runner
+background_tasks = BackgroundTasks()
+
+# Global process pool for CPU-bound stages
+cpu_pool = CpuPool()
@@ -0,0 +1,487 @@
+"""
+Benchmark suite for the data and ML pipeline.
+
+Generates a synthetic dataset, times every DataProcessor / MLProcessor stage
+and the main endpoints (through Flask's test client with an in-memory fake
+database) and writes machine-readable results with peak memory:
+
+    python benchmark.py --rows 100000 --cols 30 --output bench.json
+    python benchmark.py --rows 100000 --cols 30 --baseline bench.json --threshold 0.2
+
+With --baseline the run is compared stage by stage against a saved result
+and the exit code is 1 if any stage got slower than the threshold allows.
+The imports suite also fails when a cold `import app` exceeds --import-budget
+or imports sklearn, joblib or the Gemini SDK eagerly.
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import resource
+import warnings
+import subprocess
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from config import Config
+
+def generate_dataset(rows, cols, categorical_ratio=0.3, null_ratio=0.05, cardinality=20, seed=42):
+    """Synthetic dataset: numeric and categorical feature columns plus a binary target as last column"""
+    rng = np.random.default_rng(seed)
+    n_features = max(cols - 1, 1)
+    n_categorical = int(round(n_features * categorical_ratio))
+    data = {}
+    for i in range(n_features):
+        if i < n_categorical:
+            values = rng.integers(0, cardinality, rows).astype(str)
+            data[f'cat_{i}'] = np.char.add('level_', values).astype(object)
+        else:
+            data[f'num_{i}'] = rng.normal(100, 25, rows).round(3)
+    df = pd.DataFrame(data)
+    if null_ratio > 0:
+        for col in df.columns:
+            mask = rng.random(rows) < null_ratio
+            df.loc[mask, col] = None
+    df['target'] = rng.integers(0, 2, rows)
+    return df
+
+class FakeDatabase:
+    """In-memory stand-in for database.Database, answering the queries the endpoints issue"""
+    
+    def __init__(self, dataset_row):
+        self.dataset_row = dataset_row
+        self.models = {}
+        self.aliases = {}
+        self.next_id = 1
+    
+    def _new_id(self):
+        self.next_id += 1
+        return self.next_id
+    
+    def get_connection(self):
+        return self
+    
+    def connect(self):
+        return self
+    
+    def is_connected(self):
+        return True
+    
+    def close(self):
+        return None
+    
+    def execute_query(self, query, params=None, fetch=True):
+        normalized = ' '.join(query.split())
+        if not fetch:
+            if normalized.startswith('INSERT INTO models'):
+                model_id = self._new_id()
+                self.models[model_id] = {
+                    'id': model_id,
+                    'model_path': params[6],
+                    'algorithm': params[5],
+                    'model_name': params[3],
+                    'dataset_id': params[1]
+                }
+                return model_id
+            if normalized.startswith('INSERT INTO model_aliases'):
+                self.aliases[(params[0], params[1])] = {'alias': params[1], 'routes': params[3], 'updated_at': None}
+            return self._new_id() if normalized.startswith('INSERT') else 0
+        if 'SUM(file_size)' in normalized:
+            return [{'used': 0}]
+        if 'MAX(version)' in normalized:
+            return [{'version': 1}]
+        if 'FROM model_aliases' in normalized:
+            alias = self.aliases.get((params[0], params[1]))
+            return [dict(alias)] if alias else []
+        if 'FROM datasets' in normalized:
+            return [dict(self.dataset_row)]
+        if 'FROM models' in normalized:
+            model = self.models.get(params[0]) if params else None
+            return [dict(model)] if model else []
+        if 'FROM workflows' in normalized:
+            return [{'id': 1, 'insights': None, 'insights_status': None, 'insights_error': None}]
+        return []
+    
+    def execute_many(self, query, params_list, connection=None):
+        return None
+    
+    def cached_query(self, query, params, tables, ttl=None):
+        return self.execute_query(query, params)
+
+def measure(fn, repeat=1, trace_memory=True):
+    """Time fn over several runs; returns timings, peak traced memory and the last result"""
+    timings = []
+    peak_bytes = 0
+    result = None
+    for _ in range(repeat):
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+        if trace_memory:
+            peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    return {
+        'mean_s': round(float(np.mean(timings)), 6),
+        'min_s': round(float(np.min(timings)), 6),
+        'max_s': round(float(np.max(timings)), 6),
+        'peak_mb': round(peak_bytes / (1024 * 1024), 3) if trace_memory else None
+    }, result
+
+def label_encoder_loop(X_df):
+    """The per-column LabelEncoder loop prepare_data used before encoding.py, as a reference point"""
+    from sklearn.preprocessing import LabelEncoder
+    X_processed = pd.DataFrame(index=X_df.index)
+    for col in X_df.columns:
+        if X_df[col].dtype.kind in 'biuf':
+            X_processed[col] = X_df[col].fillna(X_df[col].median())
+        else:
+            X_processed[col] = LabelEncoder().fit_transform(X_df[col].fillna('Unknown').astype(str))
+    return X_processed
+
+def tree_inference_benchmarks(model, compiled, encoder, loaded, args, trace):
+    """Latency of sklearn's and the compiled tree inference on one row and on batches; fails unless they agree exactly"""
+    X = encoder.transform(loaded[encoder.columns])
+    X = X.toarray() if hasattr(X, 'toarray') else np.asarray(X)
+    results = {}
+    for batch in [1, Config.TREE_INFERENCE_MAX_ROWS, min(len(X), 10000)]:
+        rows = X[:batch]
+        expected = model.predict_proba(rows) if compiled.classes_ is not None else model.predict(rows)
+        actual = compiled.predict_proba(rows) if compiled.classes_ is not None else compiled.predict(rows)
+        if not np.array_equal(expected, actual) or not np.array_equal(model.predict(rows), compiled.predict(rows)):
+            raise RuntimeError(f"Compiled {type(model).__name__} differs from sklearn on {batch} rows")
+        for engine, estimator in [('sklearn', model), ('compiled', compiled)]:
+            key = f"ml.tree_inference[{type(model).__name__}|{batch}|{engine}]"
+            results[key], _ = measure(lambda: estimator.predict(rows), max(args.repeat, 20) if batch == 1 else args.repeat, trace)
+            results[key]['rows_per_s'] = round(batch / results[key]['min_s'], 1) if results[key]['min_s'] else None
+    return results
+
+def run_stage_benchmarks(file_path, df, args):
+    """Time each DataProcessor and MLProcessor stage directly"""
+    from data_processor import DataProcessor
+    from ml_processor import MLProcessor
+    from model_artifacts import save_artifact, load_artifact, compact_model
+    from tree_inference import compile_model
+    
+    data_processor = DataProcessor()
+    ml_processor = MLProcessor()
+    headers = list(df.columns)
+    filename = os.path.basename(file_path)
+    rows = len(df)
+    trace = not args.no_memory
+    results = {}
+    
+    stages = [
+        ('data.load_dataset', lambda: data_processor.load_dataset(file_path, filename)),
+        ('data.convert_dataset', lambda: data_processor.convert_dataset(file_path)),
+        ('data.process_gathering', lambda: data_processor.process_gathering(file_path, headers)),
+        ('data.process_cleaning', lambda: data_processor.process_cleaning(file_path)),
+        ('data.process_transformation', lambda: data_processor.process_transformation(file_path, headers)),
+        ('data.generate_visualizations', lambda: data_processor.generate_visualizations(file_path, headers)),
+        ('ml.prepare_data', lambda: ml_processor.prepare_data(file_path, headers))
+    ]
+    for name, fn in stages:
+        # Conversion only happens once per file, so it is not repeated
+        results[name], _ = measure(fn, 1 if name == 'data.convert_dataset' else args.repeat, trace)
+        results[name]['rows_per_s'] = round(rows / results[name]['min_s'], 1) if results[name]['min_s'] else None
+    
+    # Feature encoding alone: the old per-column loop against each encoding strategy
+    from dataset_store import dataset_store
+    from encoding import FeatureEncoder, ENCODING_STRATEGIES
+    loaded = dataset_store.load(file_path, columns=headers)
+    X_df, y = loaded[headers[:-1]], loaded[headers[-1]].to_numpy()
+    encoders = [('ml.encode[label_encoder_loop]', lambda: label_encoder_loop(X_df))]
+    options = [(strategy, {'strategy': strategy, 'high_cardinality': 'hash' if strategy == 'onehot' else strategy})
+               for strategy in ENCODING_STRATEGIES]
+    # Every category of every column as a CSR column
+    options.append(('onehot_sparse', {'strategy': 'onehot', 'high_cardinality': 'onehot', 'sparse': True}))
+    for name, kwargs in options:
+        encoders.append((f"ml.encode[{name}]", lambda kwargs=kwargs: FeatureEncoder(**kwargs).fit_transform(X_df, y)))
+    for name, fn in encoders:
+        results[name], _ = measure(fn, args.repeat, trace)
+        results[name]['rows_per_s'] = round(rows / results[name]['min_s'], 1) if results[name]['min_s'] else None
+    
+    for model_name in args.models:
+        key = f"ml.train_model[{model_name}]"
+        results[key], trained = measure(
+            lambda: ml_processor.train_model(file_path, headers, model_name, 70, 0, 0), args.repeat, trace
+        )
+        results[key]['rows_per_s'] = round(rows / results[key]['min_s'], 1) if results[key]['min_s'] else None
+        
+        features = {col: 0 for col in headers[:-1]}
+        key = f"ml.predict[{model_name}]"
+        results[key], _ = measure(
+            lambda: ml_processor.predict(trained['model_path'], features, model_name), max(args.repeat, 20), trace
+        )
+        
+        # Model file size, save and load time per compression setting, also compacted for tree models
+        model = ml_processor.load_model(trained['model_path'])
+        compiled = compile_model(model)
+        if compiled is not None:
+            results.update(tree_inference_benchmarks(model, compiled, ml_processor.load_encoder(trained['model_path']), loaded, args, trace))
+        compacted = compact_model(model)
+        artifact_path = os.path.join(Config.MODELS_FOLDER, 'bench_artifact.pkl')
+        for variant, saved in [('', model), ('|compact', compacted)]:
+            if variant and compacted is model:
+                continue
+            for compression in args.model_compressions:
+                key = f"ml.artifact[{model_name}|{compression}{variant}]"
+                saving, size = measure(lambda: save_artifact(saved, artifact_path, compression), 1, False)
+                results[key], _ = measure(lambda: load_artifact(artifact_path), args.repeat, trace)
+                results[key].update({'size_mb': round(size / (1024 * 1024), 3), 'save_s': saving['min_s']})
+    
+    # Appending a tenth of the rows to a copy of the dataset, then cleaning and transforming only
+    # those rows with the parameters fitted on the rest (once each: a delta run consumes its delta)
+    copy_path = os.path.join(os.path.dirname(file_path), f"delta_{filename}")
+    shutil.copyfile(file_path, copy_path)
+    data_processor.convert_dataset(copy_path)
+    data_processor.process_cleaning(copy_path)
+    data_processor.process_transformation(copy_path, headers)
+    chunk_path = os.path.join(os.path.dirname(file_path), 'append_chunk.parquet')
+    dataset_store.load(copy_path).sample(frac=0.1, random_state=0).to_parquet(chunk_path, index=False)
+    delta_stages = [
+        ('data.append_dataset', lambda: data_processor.append_dataset(copy_path, chunk_path)),
+        ('data.process_cleaning[delta]', lambda: data_processor.process_cleaning(copy_path, delta=True)),
+        ('data.process_transformation[delta]', lambda: data_processor.process_transformation(copy_path, headers, delta=True))
+    ]
+    for name, fn in delta_stages:
+        results[name], _ = measure(fn, 1, trace)
+    return results
+
+def run_endpoint_benchmarks(file_path, df, args):
+    """Time the main endpoints through Flask's test client with a fake database"""
+    import app as app_module
+    from flask_jwt_extended import create_access_token
+    
+    headers = list(df.columns)
+    fake_db = FakeDatabase({
+        'id': 1,
+        'name': os.path.basename(file_path),
+        'filename': os.path.basename(file_path),
+        'file_path': file_path,
+        'file_type': 'csv',
+        'headers': json.dumps(headers),
+        'row_count': len(df),
+        'column_count': len(headers),
+        'status': 'processed',
+        'created_at': None
+    })
+    app_module.db = fake_db
+    app_module.prediction_log.db = fake_db
+    app_module.model_registry.db = fake_db
+    client = app_module.app.test_client()
+    with app_module.app.app_context():
+        token = create_access_token(identity='1')
+    auth = {'Authorization': f"Bearer {token}"}
+    trace = not args.no_memory
+    results = {}
+    
+    with open(file_path, 'rb') as f:
+        csv_bytes = f.read()
+    
+    def post(path, body):
+        response = client.post(path, json=body, headers=auth)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response.get_json()
+    
+    def upload():
+        response = client.post(
+            '/api/datasets/upload',
+            data={'file': (io.BytesIO(csv_bytes), os.path.basename(file_path))},
+            headers=auth,
+            content_type='multipart/form-data'
+        )
+        if response.status_code >= 400:
+            raise RuntimeError(f"upload returned {response.status_code}")
+        return response.get_json()
+    
+    endpoints = [
+        ('api.upload', upload),
+        ('api.gathering', lambda: post('/api/process/gathering', {'dataset_id': 1})),
+        ('api.cleaning', lambda: post('/api/process/cleaning', {'dataset_id': 1})),
+        ('api.transformation', lambda: post('/api/process/transformation', {'dataset_id': 1})),
+        ('api.visualization', lambda: post('/api/visualizations/generate', {'dataset_id': 1}))
+    ]
+    for name, fn in endpoints:
+        results[name], _ = measure(fn, args.repeat, trace)
+    
+    model_name = args.models[0]
+    results['api.train'], trained = measure(
+        lambda: post('/api/models/train', {'dataset_id': 1, 'models': [model_name]}), args.repeat, trace
+    )
+    model_id = trained['models'][0]['id']
+    features = {col: 0 for col in headers[:-1]}
+    results['api.predict'], _ = measure(
+        lambda: post(f"/api/models/{model_id}/predict", {'features': features}), max(args.repeat, 20), trace
+    )
+    
+    # The same model published as the dataset's production version and predicted through the alias
+    response = client.put('/api/datasets/1/aliases/production', json={'model_id': model_id}, headers=auth)
+    if response.status_code >= 400:
+        raise RuntimeError(f"alias update returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    results['api.predict[alias]'], _ = measure(
+        lambda: post('/api/datasets/1/predict', {'features': features, 'alias': 'production'}), max(args.repeat, 20), trace
+    )
+    return results
+
+# Modules that must not be imported until first use (see ml_processor.preload)
+LAZY_MODULES = ['sklearn', 'google.generativeai', 'joblib', 'scipy']
+
+def run_import_benchmarks(args):
+    """Time a cold `import app` in a fresh interpreter and check that heavy modules stay lazy"""
+    code = (
+        "import sys, json, time; start = time.perf_counter(); import app; "
+        "print(json.dumps({'seconds': time.perf_counter() - start, "
+        f"'eager': [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))"
+    )
+    env = dict(os.environ, GEMINI_BACKEND='stub')
+    timings = []
+    eager = []
+    for _ in range(args.repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env, capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(output)
+        timings.append(result['seconds'])
+        eager = result['eager']
+    return {
+        'startup.import_app': {
+            'mean_s': round(float(np.mean(timings)), 6),
+            'min_s': round(float(np.min(timings)), 6),
+            'max_s': round(float(np.max(timings)), 6),
+            'budget_s': args.import_budget,
+            'eager_modules': eager,
+            'within_budget': float(np.min(timings)) <= args.import_budget and not eager
+        }
+    }
+
+def compare(results, baseline, threshold):
+    """Compare min timings against a baseline; returns (report, regressed stage names)"""
+    report = {}
+    regressions = []
+    for name, current in results['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or not previous.get('min_s'):
+            continue
+        ratio = current['min_s'] / previous['min_s']
+        report[name] = {
+            'baseline_s': previous['min_s'],
+            'current_s': current['min_s'],
+            'ratio': round(ratio, 3)
+        }
+        if previous.get('peak_mb') and current.get('peak_mb'):
+            report[name]['memory_ratio'] = round(current['peak_mb'] / previous['peak_mb'], 3)
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return report, regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the DataFlow AI data and ML pipeline')
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--cols', type=int, default=20)
+    parser.add_argument('--categorical-ratio', type=float, default=0.3)
+    parser.add_argument('--null-ratio', type=float, default=0.05)
+    parser.add_argument('--cardinality', type=int, default=20, help='Distinct values per categorical column')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--models', nargs='+', default=['Random Forest', 'Logistic Regression'])
+    parser.add_argument('--model-compressions', nargs='+', default=['none', 'zstd:1', 'zstd:3', 'zstd:9', 'zlib:3', 'lzma:1'],
+                        help='Model file compression settings to compare (MODEL_COMPRESSION values)')
+    parser.add_argument('--suite', choices=['all', 'stages', 'endpoints', 'imports'], default='all')
+    parser.add_argument('--import-budget', type=float, default=1.5, help='Seconds allowed for a cold `import app`')
+    parser.add_argument('--no-memory', action='store_true', help='Skip tracemalloc (lower overhead timings)')
+    parser.add_argument('--output', help='Write results JSON to this file (default: stdout)')
+    parser.add_argument('--baseline', help='Compare against a saved results JSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown ratio before failing')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary working directory')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    warnings.simplefilter('ignore')
+    
+    # Isolate every artifact the pipeline writes. Set in the environment too, before any
+    # module or CPU pool worker reads the configuration: workers import config afresh
+    workdir = tempfile.mkdtemp(prefix='dataflow-bench-')
+    overrides = {
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'MODELS_FOLDER': os.path.join(workdir, 'models'),
+        'STORE_FOLDER': os.path.join(workdir, 'store'),
+        'LLM_CACHE_FOLDER': os.path.join(workdir, 'cache'),
+        'GEMINI_BACKEND': 'stub'
+    }
+    os.environ.update(overrides)
+    for name, value in overrides.items():
+        setattr(Config, name, value)
+    for folder in [Config.UPLOAD_FOLDER, Config.MODELS_FOLDER, Config.STORE_FOLDER]:
+        os.makedirs(folder, exist_ok=True)
+    
+    try:
+        df = generate_dataset(args.rows, args.cols, args.categorical_ratio, args.null_ratio, args.cardinality)
+        results = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(),
+                'rows': args.rows,
+                'cols': args.cols,
+                'categorical_ratio': args.categorical_ratio,
+                'null_ratio': args.null_ratio,
+                'cardinality': args.cardinality,
+                'repeat': args.repeat,
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'numpy': np.__version__,
+                'platform': platform.platform()
+            },
+            'results': {}
+        }
+        try:
+            import sklearn
+            results['meta']['sklearn'] = sklearn.__version__
+        except ImportError:
+            pass
+        
+        if args.suite in ['all', 'imports']:
+            results['results'].update(run_import_benchmarks(args))
+        if args.suite in ['all', 'stages']:
+            file_path = os.path.join(Config.UPLOAD_FOLDER, 'bench_stages.csv')
+            df.to_csv(file_path, index=False)
+            results['results'].update(run_stage_benchmarks(file_path, df, args))
+        if args.suite in ['all', 'endpoints']:
+            file_path = os.path.join(Config.UPLOAD_FOLDER, 'bench_endpoints.csv')
+            df.to_csv(file_path, index=False)
+            results['results'].update(run_endpoint_benchmarks(file_path, df, args))
+        
+        results['meta']['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        
+        exit_code = 0
+        startup = results['results'].get('startup.import_app')
+        if startup and not startup['within_budget']:
+            exit_code = 1
+        if args.baseline:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+            report, regressions = compare(results, baseline, args.threshold)
+            results['comparison'] = {'threshold': args.threshold, 'stages': report, 'regressions': regressions}
+            exit_code = 1 if regressions else exit_code
+        
+        output = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(output)
+        else:
+            print(output)
+        return exit_code
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import os
+import re
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+from config import Config
+from dataset_io import get_file_extension
+from dataset_store import dataset_store
+
+logger = logging.getLogger(__name__)
+
+# Name of an unmodified blob: the SHA-256 of its content and the format extension
+BLOB_NAME = re.compile(r'^[0-9a-f]{64}\.')
+
+class StorageQuotaExceeded(Exception):
+    """An upload would take the user over USER_STORAGE_QUOTA_MB"""
+
+class BlobStore:
+    """Content-addressed uploads: every distinct file is stored once, named by the SHA-256 of its bytes.
+    
+    The columnar store, profile and other artifacts derived from an upload are
+    keyed by its file name (see DatasetStore), so datasets uploaded with the
+    same content share them. A dataset gets its own copy (fork) before it is
+    modified, and files no dataset references are removed by collect_garbage.
+    """
+    
+    def __init__(self, root=None):
+        self.root = root or Config.UPLOAD_FOLDER
+    
+    def save(self, stream, filename, max_bytes=None):
+        """Stream an upload to disk, hashing it on the way; returns (path, digest, size, existed).
+        
+        Nothing is written under the final name when the content is already
+        stored. max_bytes only limits new content: an upload of a stored blob
+        takes no space, so it is accepted at any size. Past max_bytes the rest
+        of the upload is only hashed, not written, and StorageQuotaExceeded is
+        raised once it turns out to be new.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(prefix='.upload-', dir=self.root)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(Config.UPLOAD_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    digest.update(chunk)
+                    if max_bytes is None or size <= max_bytes:
+                        f.write(chunk)
+            path = os.path.join(self.root, f"{digest.hexdigest()}.{get_file_extension(filename)}")
+            existed = os.path.exists(path)
+            if existed:
+                os.remove(tmp_path)
+                # Refreshed so garbage collection does not take it before the new dataset references it
+                os.utime(path)
+            elif max_bytes is not None and size > max_bytes:
+                raise StorageQuotaExceeded(f"Upload exceeds the remaining storage quota of {max_bytes} bytes")
+            else:
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path, digest.hexdigest(), size, existed
+    
+    def is_shared(self, file_path):
+        """Whether a path is a content-addressed blob that other datasets may link to"""
+        return bool(BLOB_NAME.match(os.path.basename(file_path)))
+    
+    def fork(self, file_path, key):
+        """Give one dataset its own copy of a shared blob and its columnar store; returns (path, created).
+        
+        Files are hard-linked rather than copied. This is safe because the
+        store only ever replaces its files atomically and never writes into
+        them in place. An existing fork is returned as it is, never rebuilt:
+        it may already hold rows appended to it.
+        """
+        digest, ext = os.path.basename(file_path).split('.', 1)
+        forked = os.path.join(os.path.dirname(file_path), f"{digest}-{key}.{ext}")
+        # Forks of the same blob are made one at a time, across processes
+        with dataset_store.locked(file_path):
+            if os.path.exists(forked):
+                return forked, False
+            store_dir = dataset_store.store_dir(file_path)
+            forked_dir = dataset_store.store_dir(forked)
+            # A store left behind by a fork that failed half-way
+            shutil.rmtree(forked_dir, ignore_errors=True)
+            if os.path.isdir(store_dir):
+                shutil.copytree(store_dir, forked_dir, copy_function=_link, ignore=shutil.ignore_patterns('.lock', '*.tmp'))
+                meta = dataset_store.load_meta(forked)
+                if meta:
+                    meta['source'] = forked
+                    dataset_store.save_meta(forked, meta)
+            # Linked last, so an existing fork file always comes with its complete store
+            _link(file_path, forked)
+            os.utime(forked)
+        return forked, True
+    
+    def discard(self, file_path):
+        """Remove an upload file and everything derived from it"""
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        dataset_store.remove(file_path)
+    
+    def collect_garbage(self, referenced, grace_seconds=None):
+        """Remove uploads no dataset references, with their columnar stores; returns counts of what was removed.
+        
+        Files modified within grace_seconds (BLOB_GC_GRACE_SECONDS) are kept,
+        so uploads that are still being saved or recorded are never removed.
+        """
+        referenced = {os.path.basename(path) for path in referenced}
+        cutoff = time.time() - (Config.BLOB_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds)
+        removed_files = removed_stores = freed_bytes = 0
+        if os.path.isdir(self.root):
+            for entry in os.scandir(self.root):
+                if not entry.is_file() or entry.name in referenced:
+                    continue
+                stat = entry.stat()
+                if stat.st_mtime > cutoff:
+                    continue
+                # A hard-linked blob frees its space with its last link
+                freed_bytes += stat.st_size if stat.st_nlink == 1 else 0
+                self.discard(entry.path)
+                removed_files += 1
+        
+        # Columnar stores whose upload is gone
+        if os.path.isdir(dataset_store.root):
+            for entry in os.scandir(dataset_store.root):
+                if not entry.is_dir() or entry.name in referenced or os.path.exists(os.path.join(self.root, entry.name)):
+                    continue
+                if entry.stat().st_mtime > cutoff:
+                    continue
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed_stores += 1
+        logger.info(f"Storage GC removed {removed_files} uploads and {removed_stores} orphaned stores ({freed_bytes} bytes)")
+        return {'removed_files': removed_files, 'removed_stores': removed_stores, 'freed_bytes': freed_bytes}
+
+def _link(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # No hard links across devices or on some file systems
+        shutil.copy2(src, dst)
+
+# Global blob store instance
+blob_store = BlobStore()
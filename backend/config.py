@@ -14,20 +14,119 @@ class Config:
     MYSQL_USER = os.environ.get('MYSQL_USER') or 'root'
     MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD') or ''
     MYSQL_DATABASE = os.environ.get('MYSQL_DATABASE') or 'dataflow_ai'
+    # The pure-Python driver lets gevent workers yield during queries
+    MYSQL_USE_PURE = (os.environ.get('MYSQL_USE_PURE') or '').lower() in ['1', 'true', 'yes']
+    # Connections per process, shared by its threads / greenlets; queries wait when all are in use
+    MYSQL_POOL_SIZE = int(os.environ.get('MYSQL_POOL_SIZE') or 10)
+    
+    # Cached metadata lookups (dataset/model ownership, paths, headers); per process, dropped on local writes
+    QUERY_CACHE_SIZE = int(os.environ.get('QUERY_CACHE_SIZE') or 4096)
+    QUERY_CACHE_TTL = int(os.environ.get('QUERY_CACHE_TTL') or 300)
+    # Rows whose paths change (appended datasets, updated models); bounds how long other processes use an old path
+    QUERY_CACHE_MUTABLE_TTL = float(os.environ.get('QUERY_CACHE_MUTABLE_TTL') or 2)
     
     # Gemini API
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY') or ''
+    GEMINI_BACKEND = os.environ.get('GEMINI_BACKEND') or 'gemini'  # 'stub' answers offline with canned text
+    GEMINI_TIMEOUT = float(os.environ.get('GEMINI_TIMEOUT') or 10)  # Seconds before falling back
+    INSIGHTS_TIMEOUT = float(os.environ.get('INSIGHTS_TIMEOUT') or 60)  # Background insight generation limit
+    # Open insight streams per process; each holds a worker thread (or a greenlet under gevent) until the insights are ready
+    INSIGHTS_MAX_STREAMS = int(os.environ.get('INSIGHTS_MAX_STREAMS') or 4)
+    INSIGHTS_STREAM_HEARTBEAT = float(os.environ.get('INSIGHTS_STREAM_HEARTBEAT') or 15)  # Seconds between status events
+    
+    # LLM response cache (keyed by prompt hash)
+    LLM_CACHE_FOLDER = os.environ.get('LLM_CACHE_FOLDER') or os.path.join(os.path.dirname(__file__), 'cache', 'llm')
+    LLM_CACHE_SIZE = int(os.environ.get('LLM_CACHE_SIZE') or 512)
+    LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL') or 24 * 3600)
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY') or 4)
     
     # Upload Configuration
-    UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(os.path.dirname(__file__), 'uploads')
     MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50MB
-    ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls'}
+    ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls', 'parquet', 'feather', 'arrow', 'csv.gz', 'csv.zst'}
+    
+    UPLOAD_CHUNK_BYTES = int(os.environ.get('UPLOAD_CHUNK_BYTES') or 1024 * 1024)  # Read and hashed per step while saving
+    USER_STORAGE_QUOTA_MB = int(os.environ.get('USER_STORAGE_QUOTA_MB') or 5120)  # Per user, over all their datasets; 0 disables
+    BLOB_GC_GRACE_SECONDS = int(os.environ.get('BLOB_GC_GRACE_SECONDS') or 3600)  # Unreferenced uploads younger than this are kept
+    
+    # Columnar formats
+    PARQUET_COMPRESSION = os.environ.get('PARQUET_COMPRESSION') or 'zstd'
+    ARROW_COMPRESSION = os.environ.get('ARROW_COMPRESSION') or 'zstd'
+    PARQUET_ROW_GROUP_SIZE = int(os.environ.get('PARQUET_ROW_GROUP_SIZE') or 128 * 1024)  # Rows per row group (filter pushdown granularity)
+    CSV_BLOCK_SIZE = int(os.environ.get('CSV_BLOCK_SIZE') or 16 * 1024 * 1024)  # Bytes per parser thread chunk
+    
+    # Rows hashed per chunk / Parquet batch for duplicate detection
+    ROW_HASH_CHUNK_ROWS = int(os.environ.get('ROW_HASH_CHUNK_ROWS') or 256 * 1024)
+    
+    # Date format detection at ingest, on a sample of each text column
+    DATE_DETECT_SAMPLE_ROWS = int(os.environ.get('DATE_DETECT_SAMPLE_ROWS') or 200)
+    DATE_DETECT_MIN_RATIO = float(os.environ.get('DATE_DETECT_MIN_RATIO') or 0.95)  # Share of the sample a format must parse
+    
+    # Columnar store for converted datasets
+    STORE_FOLDER = os.environ.get('STORE_FOLDER') or os.path.join(os.path.dirname(__file__), 'store')
     
     # Models Storage
-    MODELS_FOLDER = os.path.join(os.path.dirname(__file__), 'models')
+    MODELS_FOLDER = os.environ.get('MODELS_FOLDER') or os.path.join(os.path.dirname(__file__), 'models')
+    # Saved model files: joblib compressor[:level] (none, zstd, lz4, zlib, lzma), optionally per algorithm.
+    # zstd files need this app's registered compressor to load; the others load with plain joblib
+    MODEL_COMPRESSION = os.environ.get('MODEL_COMPRESSION') or 'zlib:3'
+    MODEL_COMPRESSION_BY_ALGORITHM = dict(  # e.g. 'Random Forest=zstd:9;K-Nearest Neighbors=none'
+        item.strip().split('=', 1) for item in (os.environ.get('MODEL_COMPRESSION_BY_ALGORITHM') or '').split(';') if '=' in item
+    )
+    # Drop node statistics only training uses from saved tree models (predictions are unchanged, feature importances are lost)
+    MODEL_COMPACT_TREES = (os.environ.get('MODEL_COMPACT_TREES') or '').lower() in ['1', 'true', 'yes']
+    
+    # Categorical feature encoding (see encoding.py); a training request may override these
+    ENCODING_STRATEGY = os.environ.get('ENCODING_STRATEGY') or 'ordinal'
+    ENCODING_HIGH_CARDINALITY = os.environ.get('ENCODING_HIGH_CARDINALITY') or 'ordinal'
+    ENCODING_MAX_CATEGORIES = int(os.environ.get('ENCODING_MAX_CATEGORIES') or 50)  # Above this a column counts as high-cardinality
+    ENCODING_HASH_BUCKETS = int(os.environ.get('ENCODING_HASH_BUCKETS') or 32)
+    ENCODING_SPARSE_MIN_COLUMNS = int(os.environ.get('ENCODING_SPARSE_MIN_COLUMNS') or 256)  # One-hot / hash columns above which features are kept as CSR
+    
+    # Trees added to a random forest per incremental update on appended rows
+    WARM_START_ESTIMATORS = int(os.environ.get('WARM_START_ESTIMATORS') or 10)
+    
+    # Loaded models kept in memory per process
+    MODEL_CACHE_SIZE = int(os.environ.get('MODEL_CACHE_SIZE') or 32)
+    # Seconds a process serves cached alias routes (see model_registry.py) before re-reading them
+    MODEL_ALIAS_TTL = float(os.environ.get('MODEL_ALIAS_TTL') or 5)
+    
+    # Random forests are flattened into NumPy node arrays for predictions ('sklearn' uses the estimators as they are)
+    TREE_INFERENCE = os.environ.get('TREE_INFERENCE') or 'compiled'
+    TREE_INFERENCE_MAX_ROWS = int(os.environ.get('TREE_INFERENCE_MAX_ROWS') or 64)  # Larger batches are faster through sklearn
+    
+    # Pre-fork warmup: most-predicted models and their datasets' feature matrices (shared memory)
+    WARMUP_MODELS = int(os.environ.get('WARMUP_MODELS') or 10)
+    WARMUP_DATASETS = int(os.environ.get('WARMUP_DATASETS') or 3)
+    WARMUP_MAX_FEATURE_MB = int(os.environ.get('WARMUP_MAX_FEATURE_MB') or 256)  # Per matrix
+    
+    # Prediction log write-behind buffer
+    PREDICTION_LOG_BATCH_SIZE = int(os.environ.get('PREDICTION_LOG_BATCH_SIZE') or 200)
+    PREDICTION_LOG_FLUSH_SECONDS = float(os.environ.get('PREDICTION_LOG_FLUSH_SECONDS') or 2.0)
+    PREDICTION_LOG_MAX_ROWS = int(os.environ.get('PREDICTION_LOG_MAX_ROWS') or 10000)  # In-memory bound; oldest rows are dropped beyond it
+    PREDICTION_LOG_SPOOL = os.environ.get('PREDICTION_LOG_SPOOL') or ''  # Optional local file path for durable buffering
+    
+    # Threads computing independent feature engineering groups (see feature_pipeline.py)
+    FEATURE_THREADS = int(os.environ.get('FEATURE_THREADS') or min(4, os.cpu_count() or 1))
+    
+    # Background workers for conversions and other off-request work
+    BACKGROUND_WORKERS = int(os.environ.get('BACKGROUND_WORKERS') or 2)
+    BACKGROUND_TASK_TTL = float(os.environ.get('BACKGROUND_TASK_TTL') or 3600)  # Seconds a finished task's status stays pollable
+    BACKGROUND_TASK_MAX = int(os.environ.get('BACKGROUND_TASK_MAX') or 1000)  # Finished tasks kept at most; oldest are evicted first
+    
+    # Process pool for CPU-bound stages (0 runs them in the request thread)
+    CPU_WORKERS = int(os.environ.get('CPU_WORKERS') or 0)
+    CPU_POOL_START_METHOD = os.environ.get('CPU_POOL_START_METHOD') or 'spawn'
+    
+    # Observability: per-request profiles (X-Profile header) are only taken for these user ids
+    ADMIN_USER_IDS = {int(x) for x in (os.environ.get('ADMIN_USER_IDS') or '').split(',') if x.strip()}
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or ''  # Bearer token for scraping /api/metrics; admins can always read it
+    PROFILE_FOLDER = os.path.join(os.path.dirname(__file__), 'profiles')
+    SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS') or 1.0)  # Requests slower than this log their spans at INFO
     
     @staticmethod
     def init_app(app):
         # Create necessary directories
         os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
-        os.makedirs(Config.MODELS_FOLDER, exist_ok=True)
\ No newline at end of file
+        os.makedirs(Config.MODELS_FOLDER, exist_ok=True)
+        os.makedirs(Config.STORE_FOLDER, exist_ok=True)
\ No newline at end of file
@@ -1,7 +1,15 @@
 import pandas as pd
 import numpy as np
+import os
 import json
 import logging
+from dataset_io import get_file_extension, get_file_type, read_dataframe, read_csv
+from dataset_store import dataset_store
+from dataset_filters import normalize_filters
+from dataset_profile import describe_profile
+from feature_pipeline import normalize_pipeline, pipeline_hash, run_pipeline
+from metrics import span
+from fingerprints import normalize_dedup, hash_rows, duplicate_mask, duplicate_groups
 
 logger = logging.getLogger(__name__)
 
@@ -9,16 +17,10 @@ class DataProcessor:
     """Handle data processing workflows: gathering, cleaning, transformation"""
     
     def load_dataset(self, file_path, filename):
-        """Load dataset from file (CSV or Excel)"""
+        """Load dataset from file (CSV, Excel, Parquet or Feather)"""
         try:
-            file_ext = filename.rsplit('.', 1)[1].lower()
-            
-            if file_ext == 'csv':
-                df = pd.read_csv(file_path)
-            elif file_ext in ['xlsx', 'xls']:
-                df = pd.read_excel(file_path)
-            else:
-                raise ValueError(f"Unsupported file type: {file_ext}")
+            file_ext = get_file_extension(filename)
+            df = dataset_store.load(file_path)
             
             # Convert to list of dictionaries
             data = df.to_dict('records')
@@ -26,7 +28,7 @@ class DataProcessor:
             
             return {
                 'name': filename,
-                'file_type': file_ext,
+                'file_type': get_file_type(file_ext),
                 'headers': headers,
                 'row_count': len(df),
                 'column_count': len(headers),
@@ -36,25 +38,94 @@ class DataProcessor:
             logger.error(f"Error loading dataset: {e}")
             raise
     
+    def load_columns(self, file_path, columns=None, nrows=None, filters=None):
+        """Projection-aware loader: read only the columns (and rows) a stage needs"""
+        try:
+            return dataset_store.load(file_path, columns=list(columns) if columns else None, nrows=nrows, filters=filters)
+        except Exception as e:
+            logger.error(f"Error loading dataset columns: {e}")
+            raise
+    
+    def load_preview(self, file_path, filename, nrows=100, sheet=None):
+        """Read only the first rows of a dataset; the row count is filled in after conversion"""
+        try:
+            file_ext = get_file_extension(filename)
+            df = dataset_store.load(file_path, sheet=sheet, nrows=nrows)
+            headers = [str(col) for col in df.columns]
+            
+            return {
+                'name': filename,
+                'file_type': get_file_type(file_ext),
+                'headers': headers,
+                'row_count': None,
+                'column_count': len(headers),
+                'data': df.to_dict('records')
+            }
+        except Exception as e:
+            logger.error(f"Error loading dataset preview: {e}")
+            raise
+    
+    def convert_dataset(self, file_path):
+        """Convert an upload into the columnar store (all sheets for Excel)"""
+        try:
+            return dataset_store.convert(file_path)
+        except Exception as e:
+            logger.error(f"Error converting dataset: {e}")
+            raise
+    
+    def create_view(self, file_path, filters, nrows=10):
+        """Materialize (or reuse) a filtered view and return its key, size and a preview"""
+        try:
+            import pyarrow.parquet as pq
+            path = dataset_store.materialize_view(file_path, filters)
+            return {
+                'view_id': os.path.splitext(os.path.basename(path))[0],
+                'filter': normalize_filters(filters),
+                'row_count': pq.ParquetFile(path).metadata.num_rows,
+                'sample_data': dataset_store.load(file_path, filters=filters, nrows=nrows).to_dict('records')
+            }
+        except Exception as e:
+            logger.error(f"Error creating dataset view: {e}")
+            raise
+    
+    def append_dataset(self, file_path, append_path):
+        """Append the rows of an uploaded file to a dataset's columnar store"""
+        try:
+            schema = dataset_store.schema(file_path)
+            if schema and get_file_extension(append_path).startswith('csv'):
+                # Parsed with the dataset's own CSV schema, so the columns get the same types
+                df, _ = read_csv(append_path, schema=schema)
+            else:
+                df = read_dataframe(append_path)
+            meta = dataset_store.append(file_path, df)
+            return {
+                'appended_rows': len(df),
+                'row_count': meta['row_count'],
+                'parts': len(meta['parts'])
+            }
+        except Exception as e:
+            logger.error(f"Error appending to dataset: {e}")
+            raise
+    
+    def dataset_profile(self, file_path):
+        """Column statistics (counts, mean, std, min, max, distinct estimate) from the stored profile"""
+        try:
+            return describe_profile(dataset_store.profile(file_path))
+        except Exception as e:
+            logger.error(f"Error profiling dataset: {e}")
+            raise
+    
     def process_gathering(self, file_path, headers):
         """Data gathering and standardization"""
         try:
-            df = pd.read_csv(file_path) if file_path.endswith('.csv') else pd.read_excel(file_path)
+            df = dataset_store.load(file_path)
             
             # Standardize column names (lowercase, replace spaces)
             df.columns = df.columns.str.lower().str.replace(' ', '_')
             
             # Standardize data types
-            for col in df.columns:
-                # Try to convert to numeric if possible
-                if df[col].dtype == 'object':
-                    try:
-                        numeric_vals = pd.to_numeric(df[col], errors='coerce')
-                        # Only convert if at least 80% of values are numeric
-                        if numeric_vals.notna().sum() / len(df) > 0.8:
-                            df[col] = numeric_vals
-                    except:
-                        pass
+            with span('data.standardize', rows=len(df)):
+                self._standardize_types(df)
             
             # Return standardized data summary
             return {
@@ -68,129 +139,226 @@ class DataProcessor:
             logger.error(f"Error in data gathering: {e}")
             raise
     
-    def process_cleaning(self, file_path):
-        """Data cleaning - handle missing values, duplicates, bias"""
+    def _standardize_types(self, df):
+        """Convert object columns that are at least 80% numeric to numbers, in place"""
+        for col in df.columns:
+            # Try to convert to numeric if possible
+            if df[col].dtype == 'object':
+                try:
+                    numeric_vals = pd.to_numeric(df[col], errors='coerce')
+                    # Only convert if at least 80% of values are numeric
+                    if numeric_vals.notna().sum() / len(df) > 0.8:
+                        df[col] = numeric_vals
+                except:
+                    pass
+    
+    def process_cleaning(self, file_path, filters=None, dedup=None, delta=False):
+        """Data cleaning - handle missing values, duplicates, bias.
+        
+        With delta, only the parts appended since the last unfiltered run are
+        cleaned, with that run's fill values and outlier bounds, and rows
+        repeating an already cleaned row count as duplicates.
+        """
         try:
-            df = pd.read_csv(file_path) if file_path.endswith('.csv') else pd.read_excel(file_path)
-            original_count = len(df)
-            
-            # Remove duplicates
-            df = df.drop_duplicates()
-            duplicates_removed = original_count - len(df)
-            
-            # Handle missing values
-            missing_stats = {}
-            for col in df.columns:
-                missing_count = df[col].isna().sum()
-                if missing_count > 0:
-                    missing_stats[col] = {
-                        'count': int(missing_count),
-                        'percentage': round((missing_count / len(df)) * 100, 2)
-                    }
-                    # Fill numeric columns with median
-                    if df[col].dtype in ['int64', 'float64']:
-                        df[col].fillna(df[col].median(), inplace=True)
-                    # Fill categorical columns with mode
-                    else:
-                        df[col].fillna(df[col].mode()[0] if not df[col].mode().empty else 'Unknown', inplace=True)
-            
-            # Detect and handle outliers (using IQR method for numeric columns)
-            outlier_stats = {}
-            for col in df.select_dtypes(include=[np.number]).columns:
+            dedup = normalize_dedup(dedup)
+            fitted = dataset_store.load_fitted(file_path, 'cleaning') if delta and not filters else None
+            # Parts appended while this runs are left for the next delta run
+            parts = dataset_store.parts(file_path)
+            start = fitted['parts'] if fitted else 0
+            df = dataset_store.load(file_path, filters=filters, part_range=None if filters else (start, len(parts)))
+            # Stored row fingerprints line up with the rows of the unfiltered dataset only
+            hashes = seen = None
+            if not filters:
+                hashes = dataset_store.row_hashes(file_path, dedup['subset'])
+                if fitted:
+                    offset = sum(part['rows'] or 0 for part in parts[:start])
+                    end = sum(part['rows'] or 0 for part in parts)
+                    hashes, seen = hashes[offset:end], hashes[:offset]
+            with span('data.clean', rows=len(df)):
+                df, report = self.clean_dataframe(df, hashes, dedup, fitted, seen)
+            fitted_params = report.pop('fitted')
+            if not filters:
+                dataset_store.save_fitted(file_path, 'cleaning', {**fitted_params, 'parts': len(parts)})
+            if delta:
+                report['delta'] = {'from_part': start, 'to_part': len(parts)}
+            with span('data.serialize'):
+                report['sample_data'] = df.head(10).to_dict('records')
+            return report
+        except Exception as e:
+            logger.error(f"Error in data cleaning: {e}")
+            raise
+    
+    def clean_dataframe(self, df, hashes=None, dedup=None, fitted=None, seen_hashes=None):
+        """Apply the cleaning steps to a DataFrame, returning the cleaned frame and a report.
+        
+        fitted ({'fill': {column: value}, 'bounds': {column: [lower, upper]}},
+        as returned in report['fitted']) is applied instead of recomputing fill
+        values and outlier bounds from df; rows whose hash is in seen_hashes
+        are dropped as duplicates (unless keeping the last of each group).
+        """
+        original_count = len(df)
+        dedup = dedup or normalize_dedup(None)
+        fitted = fitted or {}
+        
+        # Remove duplicates, comparing 64-bit row hashes instead of the rows themselves
+        if hashes is None or len(hashes) != original_count:
+            hashes = hash_rows(df, dedup['subset'])
+        duplicates = duplicate_mask(hashes, dedup['keep'])
+        if seen_hashes is not None and len(seen_hashes) and dedup['keep'] == 'first':
+            duplicates = duplicates | np.isin(hashes, seen_hashes)
+        if duplicates.any():
+            df = df[~duplicates]
+        duplicates_removed = original_count - len(df)
+        
+        # Handle missing values
+        missing_stats = {}
+        fill_values = dict(fitted.get('fill', {}))
+        for col in df.columns:
+            # Fitted for every column, so rows appended later with values missing
+            # where these rows have none are filled like a full re-run would fill them
+            if col not in fill_values:
+                # Fill numeric columns with median
+                if df[col].dtype in ['int64', 'float64']:
+                    fill_values[col] = df[col].median()
+                # Fill categorical columns with mode
+                else:
+                    mode = df[col].mode()
+                    fill_values[col] = mode[0] if not mode.empty else 'Unknown'
+            missing_count = df[col].isna().sum()
+            if missing_count > 0:
+                missing_stats[col] = {
+                    'count': int(missing_count),
+                    'percentage': round((missing_count / len(df)) * 100, 2)
+                }
+                df[col] = df[col].fillna(fill_values[col])
+        
+        # Detect and handle outliers (using IQR method for numeric columns)
+        outlier_stats = {}
+        bounds = dict(fitted.get('bounds', {}))
+        for col in df.select_dtypes(include=[np.number]).columns:
+            if col not in bounds:
                 Q1 = df[col].quantile(0.25)
                 Q3 = df[col].quantile(0.75)
                 IQR = Q3 - Q1
-                lower_bound = Q1 - 1.5 * IQR
-                upper_bound = Q3 + 1.5 * IQR
-                outliers = df[(df[col] < lower_bound) | (df[col] > upper_bound)]
-                if len(outliers) > 0:
-                    outlier_stats[col] = len(outliers)
-                    # Cap outliers (winsorization)
-                    df[col] = df[col].clip(lower=lower_bound, upper=upper_bound)
-            
-            return {
-                'original_rows': original_count,
-                'cleaned_rows': len(df),
-                'duplicates_removed': duplicates_removed,
-                'missing_values': missing_stats,
-                'outliers_handled': outlier_stats,
-                'stats': {
-                    'total_cleaned': len(df),
-                    'columns_cleaned': len(df.columns)
-                },
-                'sample_data': df.head(10).to_dict('records')
+                bounds[col] = [float(Q1 - 1.5 * IQR), float(Q3 + 1.5 * IQR)]
+            lower_bound, upper_bound = bounds[col]
+            outliers = df[(df[col] < lower_bound) | (df[col] > upper_bound)]
+            if len(outliers) > 0:
+                outlier_stats[col] = len(outliers)
+                # Cap outliers (winsorization)
+                df[col] = df[col].clip(lower=lower_bound, upper=upper_bound)
+        
+        return df, {
+            'original_rows': original_count,
+            'cleaned_rows': len(df),
+            'duplicates_removed': duplicates_removed,
+            'missing_values': missing_stats,
+            'outliers_handled': outlier_stats,
+            'stats': {
+                'total_cleaned': len(df),
+                'columns_cleaned': len(df.columns)
+            },
+            'fitted': {
+                # Values that do not survive JSON (e.g. timestamps) are refitted on each run
+                'fill': {col: _json_scalar(value) for col, value in fill_values.items() if _json_scalar(value) is not None},
+                'bounds': bounds
             }
+        }
+    
+    def find_duplicates(self, file_path, subset=None, limit=20):
+        """Report the groups of duplicate rows from the stored row fingerprints, without loading the rows"""
+        try:
+            report = duplicate_groups(dataset_store.row_hashes(file_path, subset), limit=limit)
+            report['subset'] = subset
+            return report
         except Exception as e:
-            logger.error(f"Error in data cleaning: {e}")
+            logger.error(f"Error finding duplicates: {e}")
             raise
     
-    def process_transformation(self, file_path, headers):
-        """Feature engineering and ETL/ELT processes"""
+    def process_transformation(self, file_path, headers, filters=None, pipeline=None, delta=False):
+        """Feature engineering and ETL/ELT processes.
+        
+        With delta, only the parts appended since the last unfiltered run of
+        the same pipeline are transformed, with that run's fitted categories,
+        scaling and bin edges.
+        """
         try:
-            df = pd.read_csv(file_path) if file_path.endswith('.csv') else pd.read_excel(file_path)
-            
-            feature_engineering = {}
-            
-            # Create date features if date columns exist
-            date_cols = df.select_dtypes(include=['datetime64']).columns
-            for col in date_cols:
-                df[f'{col}_year'] = df[col].dt.year
-                df[f'{col}_month'] = df[col].dt.month
-                df[f'{col}_day'] = df[col].dt.day
-                feature_engineering[f'{col}_date_features'] = ['year', 'month', 'day']
-            
-            # Encode categorical variables
-            categorical_cols = df.select_dtypes(include=['object']).columns
-            encoded_features = {}
-            for col in categorical_cols[:10]:  # Limit to first 10 categorical columns
-                try:
-                    df[f'{col}_encoded'] = pd.Categorical(df[col]).codes
-                    encoded_features[col] = f'{col}_encoded'
-                except:
-                    pass
-            
-            # Create interaction features for numeric columns
-            numeric_cols = df.select_dtypes(include=[np.number]).columns[:5]  # Limit to first 5
-            interaction_features = []
-            if len(numeric_cols) >= 2:
-                col1, col2 = numeric_cols[0], numeric_cols[1]
-                df[f'{col1}_x_{col2}'] = df[col1] * df[col2]
-                interaction_features.append(f'{col1}_x_{col2}')
-            
-            # Normalize numeric features (standard scaling)
-            for col in numeric_cols:
-                if df[col].std() > 0:
-                    df[f'{col}_normalized'] = (df[col] - df[col].mean()) / df[col].std()
-            
-            return {
-                'original_features': list(headers),
-                'new_features': list(df.columns),
-                'feature_count': len(df.columns),
-                'feature_engineering': feature_engineering,
-                'encoded_features': encoded_features,
-                'interaction_features': interaction_features,
-                'sample_data': df.head(10).to_dict('records'),
-                'features': {
-                    'total': len(df.columns),
-                    'numeric': len(df.select_dtypes(include=[np.number]).columns),
-                    'categorical': len(df.select_dtypes(include=['object']).columns)
-                }
-            }
+            spec = normalize_pipeline(pipeline)
+            name = f"transformation-{pipeline_hash(spec)}"
+            fitted = dataset_store.load_fitted(file_path, name) if delta and not filters else None
+            part_count = dataset_store.part_count(file_path)
+            start = fitted['parts'] if fitted else 0
+            df = dataset_store.load(file_path, filters=filters, part_range=None if filters else (start, part_count))
+            with span('data.transform', rows=len(df)):
+                df, report = self.transform_dataframe(
+                    df, headers, spec, dataset_store.date_formats(file_path, df), fitted and fitted['steps']
+                )
+            fitted_params = report.pop('fitted')
+            if not filters:
+                dataset_store.save_fitted(file_path, name, {'steps': fitted_params, 'parts': part_count})
+            if delta:
+                report['delta'] = {'from_part': start, 'to_part': part_count}
+            with span('data.serialize'):
+                report['sample_data'] = df.head(10).to_dict('records')
+            return report
         except Exception as e:
             logger.error(f"Error in data transformation: {e}")
             raise
     
-    def generate_visualizations(self, file_path, headers, viz_type='auto'):
+    def transform_dataframe(self, df, headers, pipeline=None, date_formats=None, fitted=None):
+        """Apply a feature pipeline spec (see feature_pipeline.py) to a DataFrame, returning the transformed frame and a report"""
+        spec = normalize_pipeline(pipeline)
+        new_columns, report = run_pipeline(df, spec, date_formats, fitted)
+        
+        # All new columns are added in one concat rather than one by one
+        if new_columns:
+            new_df = pd.DataFrame(new_columns, index=df.index)
+            df = pd.concat([df.drop(columns=[col for col in new_df.columns if col in df.columns]), new_df], axis=1)
+        
+        return df, {
+            'original_features': list(headers),
+            'new_features': list(df.columns),
+            'feature_count': len(df.columns),
+            **report,
+            'pipeline': spec,
+            'features': {
+                'total': len(df.columns),
+                'numeric': len(df.select_dtypes(include=[np.number]).columns),
+                'categorical': len(df.select_dtypes(include=['object', 'string']).columns)
+            }
+        }
+    
+    def export_dataset(self, file_path, headers, stage='cleaned', filters=None, pipeline=None):
+        """Return the dataset as it looks after a pipeline stage (raw, cleaned or transformed)"""
+        if stage not in ['raw', 'cleaned', 'transformed']:
+            raise ValueError(f"Unsupported stage: {stage}. Allowed: raw, cleaned, transformed")
+        try:
+            df = dataset_store.load(file_path, filters=filters)
+            if stage in ['cleaned', 'transformed']:
+                df, _ = self.clean_dataframe(df, None if filters else dataset_store.row_hashes(file_path))
+            if stage == 'transformed':
+                df, _ = self.transform_dataframe(df, headers, pipeline, dataset_store.date_formats(file_path, df))
+            return df
+        except Exception as e:
+            logger.error(f"Error exporting dataset: {e}")
+            raise
+    
+    def generate_visualizations(self, file_path, headers, viz_type='auto', filters=None):
         """Generate visualization data"""
         try:
-            df = pd.read_csv(file_path) if file_path.endswith('.csv') else pd.read_excel(file_path)
-            
             visualizations = []
             
             # Auto-detect best visualization type
             if viz_type == 'auto':
-                # Generate multiple visualization types
-                numeric_cols = df.select_dtypes(include=[np.number]).columns
+                # The charts only use the first 20 rows of the first two numeric
+                # columns, so read just those when the column types are known
+                numeric_cols = dataset_store.numeric_columns(file_path)
+                if numeric_cols is None:
+                    df = self.load_columns(file_path, nrows=20, filters=filters)
+                    numeric_cols = df.select_dtypes(include=[np.number]).columns
+                else:
+                    df = self.load_columns(file_path, numeric_cols[:2], nrows=20, filters=filters) if numeric_cols else None
+                numeric_cols = list(numeric_cols)
                 
                 if len(numeric_cols) > 0:
                     # Bar chart for first numeric column
@@ -205,7 +373,7 @@ class DataProcessor:
                     
                     # Line chart for time series if applicable
                     if len(numeric_cols) >= 2:
-                        chart_data = df.head(20).to_dict('records')
+                        chart_data = df.head(20)[numeric_cols[:2]].to_dict('records')
                         visualizations.append({
                             'type': 'line',
                             'title': f'{numeric_cols[0]} vs {numeric_cols[1]}',
@@ -226,4 +394,10 @@ class DataProcessor:
                 'data': [],
                 'config': {},
                 'error': str(e)
-            }
\ No newline at end of file
+            }
+
+def _json_scalar(value):
+    """A fill value as a plain JSON number, string or boolean, or None"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    return value if isinstance(value, (bool, int, float, str)) else None
@@ -1,74 +1,187 @@
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, errorcode
 from config import Config
+from metrics import span
+from cache import TTLCache
+import re
 import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
+# Table written by an INSERT / UPDATE / DELETE / REPLACE statement
+WRITE_TABLE_PATTERN = re.compile(r'^\s*(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM)\s+`?(\w+)`?', re.IGNORECASE)
+
+def _request_cache():
+    """Per-request query results (flask.g), shared by every stage of one request"""
+    try:
+        from flask import g, has_request_context
+    except ImportError:
+        return None
+    if not has_request_context():
+        return None
+    if 'query_cache' not in g:
+        g.query_cache = {}
+    return g.query_cache
+
+def is_duplicate_key(error):
+    """Whether a query failed on a unique index (MySQL error 1062)"""
+    return getattr(error, 'errno', None) == errorcode.ER_DUP_ENTRY
+
 class Database:
+    """MySQL access through a small connection pool, shared by the threads (or gevent greenlets) of a process.
+    
+    Each query borrows a connection for its duration only. Connections are
+    opened on demand, up to MYSQL_POOL_SIZE at a time; further queries wait
+    for one to be returned.
+    """
     _instance = None
-    _connection = None
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Database, cls).__new__(cls)
+            cls._instance._query_cache = TTLCache(maxsize=Config.QUERY_CACHE_SIZE, ttl=Config.QUERY_CACHE_TTL)
+            cls._instance._cached_keys = {}
+            cls._instance._cache_lock = threading.Lock()
+            cls._instance._idle = deque()
+            cls._instance._slots = threading.BoundedSemaphore(Config.MYSQL_POOL_SIZE)
         return cls._instance
     
-    def get_connection(self):
-        """Get or create MySQL connection"""
-        if self._connection is None or not self._connection.is_connected():
+    def connect(self):
+        """Open a new MySQL connection, outside the pool"""
+        try:
+            connection = mysql.connector.connect(
+                host=Config.MYSQL_HOST,
+                port=Config.MYSQL_PORT,
+                user=Config.MYSQL_USER,
+                password=Config.MYSQL_PASSWORD,
+                database=Config.MYSQL_DATABASE,
+                autocommit=False,
+                use_pure=Config.MYSQL_USE_PURE
+            )
+            logger.info("MySQL connection established")
+            return connection
+        except Error as e:
+            logger.error(f"Error connecting to MySQL: {e}")
+            raise
+    
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection, reconnecting if the idle one was dropped"""
+        with self._slots:
             try:
-                self._connection = mysql.connector.connect(
-                    host=Config.MYSQL_HOST,
-                    port=Config.MYSQL_PORT,
-                    user=Config.MYSQL_USER,
-                    password=Config.MYSQL_PASSWORD,
-                    database=Config.MYSQL_DATABASE,
-                    autocommit=False
-                )
-                logger.info("MySQL connection established")
-            except Error as e:
-                logger.error(f"Error connecting to MySQL: {e}")
-                raise
-        return self._connection
+                connection = self._idle.pop()
+            except IndexError:
+                connection = None
+            if connection is None or not connection.is_connected():
+                connection = self.connect()
+            try:
+                yield connection
+            finally:
+                self._idle.append(connection)
+    
+    def get_connection(self):
+        """Check that a connection can be made (health checks)"""
+        with self.connection() as connection:
+            return connection.is_connected()
     
     def close_connection(self):
-        """Close MySQL connection"""
-        if self._connection and self._connection.is_connected():
-            self._connection.close()
-            self._connection = None
-            logger.info("MySQL connection closed")
+        """Close the idle pooled connections, e.g. before forking workers"""
+        while self._idle:
+            try:
+                connection = self._idle.pop()
+            except IndexError:
+                break
+            if connection.is_connected():
+                connection.close()
+                logger.info("MySQL connection closed")
     
     def execute_query(self, query, params=None, fetch=True):
         """Execute a query and return results"""
-        connection = self.get_connection()
-        cursor = connection.cursor(dictionary=True)
-        try:
-            cursor.execute(query, params or ())
-            if fetch:
-                result = cursor.fetchall()
-            else:
-                connection.commit()
-                result = cursor.lastrowid
-            cursor.close()
-            return result
-        except Error as e:
-            connection.rollback()
-            logger.error(f"Error executing query: {e}")
-            raise
+        with self.connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                with span(f"db.{query.split(None, 1)[0].lower()}") as stage:
+                    cursor.execute(query, params or ())
+                    if fetch:
+                        result = cursor.fetchall()
+                        stage['rows'] = len(result)
+                    else:
+                        connection.commit()
+                        result = cursor.lastrowid
+                cursor.close()
+            except Error as e:
+                connection.rollback()
+                logger.error(f"Error executing query: {e}")
+                raise
+        if not fetch:
+            self._invalidate_written(query)
+        return result
     
-    def execute_many(self, query, params_list):
-        """Execute a query with multiple parameter sets"""
-        connection = self.get_connection()
+    def execute_many(self, query, params_list, connection=None):
+        """Execute a query with multiple parameter sets, on a pooled connection or the given one"""
+        if connection is None:
+            with self.connection() as pooled:
+                return self.execute_many(query, params_list, pooled)
         cursor = connection.cursor()
         try:
-            cursor.executemany(query, params_list)
-            connection.commit()
+            with span(f"db.{query.split(None, 1)[0].lower()}_many", rows=len(params_list)):
+                cursor.executemany(query, params_list)
+                connection.commit()
             cursor.close()
         except Error as e:
             connection.rollback()
             logger.error(f"Error executing batch query: {e}")
             raise
+        self._invalidate_written(query)
+    
+    def cached_query(self, query, params, tables, ttl=None):
+        """Run a read query through the metadata cache.
+        
+        Results are kept per process for ttl seconds (QUERY_CACHE_TTL by
+        default) and per request in flask.g, and are dropped when this
+        process writes to one of the given tables. Writes made by other
+        processes are not seen until the entry expires, so rows with columns
+        that can change (file and model paths) should be read with a short
+        ttl, and code about to change them should read them uncached with
+        execute_query. Returns copies of the rows, so callers may modify them.
+        """
+        key = (query, tuple(params))
+        request_cache = _request_cache()
+        rows = request_cache.get(key) if request_cache is not None else None
+        if rows is None:
+            rows = self._query_cache.get(key)
+            if rows is None:
+                rows = self.execute_query(query, params)
+                self._query_cache.set(key, rows, ttl)
+                with self._cache_lock:
+                    for table in tables:
+                        keys = self._cached_keys.setdefault(table, set())
+                        keys.add(key)
+                        if len(keys) > 2 * self._query_cache.maxsize:
+                            # Forget keys the LRU has already evicted
+                            keys.intersection_update([k for k in keys if k in self._query_cache])
+            if request_cache is not None:
+                request_cache[key] = rows
+        return [dict(row) for row in rows]
+    
+    def invalidate(self, table):
+        """Drop cached query results that read from a table"""
+        with self._cache_lock:
+            keys = self._cached_keys.pop(table, set())
+        for key in keys:
+            self._query_cache.pop(key)
+        request_cache = _request_cache()
+        if request_cache:
+            for key in keys:
+                request_cache.pop(key, None)
+    
+    def _invalidate_written(self, query):
+        match = WRITE_TABLE_PATTERN.match(query)
+        if match:
+            self.invalidate(match.group(1).lower())
 
 # Global database instance
 db = Database()
\ No newline at end of file
@@ -25,16 +25,20 @@ CREATE TABLE IF NOT EXISTS datasets (
     name VARCHAR(255) NOT NULL,
     filename VARCHAR(255) NOT NULL,
     file_path VARCHAR(500) NOT NULL,
-    file_type ENUM('csv', 'xlsx', 'xls') NOT NULL,
+    file_type ENUM('csv', 'xlsx', 'xls', 'parquet', 'feather') NOT NULL,
     row_count INT DEFAULT 0,
     column_count INT DEFAULT 0,
     headers TEXT,  -- JSON array of column names
+    content_hash CHAR(64) NULL,  -- SHA-256 of the uploaded file; identical uploads share one stored file
+    file_size BIGINT NULL,  -- Bytes counted against the user's storage quota (0 when the content was already stored)
     status ENUM('uploaded', 'processing', 'processed', 'error') DEFAULT 'uploaded',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     INDEX idx_user_id (user_id),
-    INDEX idx_status (status)
+    INDEX idx_status (status),
+    INDEX idx_user_created (user_id, created_at),
+    INDEX idx_file_path (file_path)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Data processing workflows table
@@ -47,6 +51,8 @@ CREATE TABLE IF NOT EXISTS workflows (
     input_data TEXT,  -- JSON data
     output_data TEXT,  -- JSON data
     insights TEXT,  -- AI-generated insights
+    insights_status ENUM('pending', 'completed', 'failed') NULL,  -- NULL until insight generation finishes
+    insights_error TEXT NULL,  -- Why insight generation failed or timed out
     metadata TEXT,  -- JSON metadata
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     completed_at TIMESTAMP NULL,
@@ -54,7 +60,8 @@ CREATE TABLE IF NOT EXISTS workflows (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     INDEX idx_dataset_id (dataset_id),
     INDEX idx_user_id (user_id),
-    INDEX idx_status (status)
+    INDEX idx_status (status),
+    INDEX idx_dataset_user_id (dataset_id, user_id, id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Machine Learning Models table
@@ -66,6 +73,7 @@ CREATE TABLE IF NOT EXISTS models (
     model_name VARCHAR(100) NOT NULL,
     model_type ENUM('Regression', 'Classification', 'Clustering', 'Time Series') NOT NULL,
     algorithm VARCHAR(100) NOT NULL,  -- e.g., 'Random Forest', 'Linear Regression'
+    version INT NULL,  -- 1, 2, ... per dataset, in training order
     model_path VARCHAR(500),  -- Path to saved .pkl file
     train_test_split DECIMAL(5,2) DEFAULT 70.00,  -- Train percentage
     accuracy DECIMAL(10,4),
@@ -86,7 +94,22 @@ CREATE TABLE IF NOT EXISTS models (
     INDEX idx_dataset_id (dataset_id),
     INDEX idx_user_id (user_id),
     INDEX idx_status (status),
-    INDEX idx_model_type (model_type)
+    INDEX idx_model_type (model_type),
+    INDEX idx_user_created (user_id, created_at),
+    INDEX idx_dataset_created (dataset_id, created_at),
+    UNIQUE INDEX uq_dataset_version (dataset_id, version)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Model aliases table (production/staging pointers to model versions of a dataset)
+CREATE TABLE IF NOT EXISTS model_aliases (
+    dataset_id INT NOT NULL,
+    alias VARCHAR(32) NOT NULL,
+    user_id INT NOT NULL,
+    routes TEXT NOT NULL,  -- JSON [{"model_id": 3, "weight": 90}, {"model_id": 5, "weight": 10}]
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (dataset_id, alias),
+    FOREIGN KEY (dataset_id) REFERENCES datasets(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Predictions table
@@ -97,12 +120,16 @@ CREATE TABLE IF NOT EXISTS predictions (
     input_features TEXT NOT NULL,  -- JSON
     prediction_result TEXT,  -- JSON
     confidence_score DECIMAL(10,4),
+    prediction_uuid CHAR(32) NULL,  -- Returned as prediction_id by /predict before the row is written
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (model_id) REFERENCES models(id) ON DELETE CASCADE,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     INDEX idx_model_id (model_id),
     INDEX idx_user_id (user_id),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    INDEX idx_user_created (user_id, created_at),
+    INDEX idx_model_created (model_id, created_at),
+    UNIQUE INDEX uq_prediction_uuid (prediction_uuid)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Visualizations table
@@ -140,5 +167,30 @@ CREATE TABLE IF NOT EXISTS project_sessions (
     FOREIGN KEY (dataset_id) REFERENCES datasets(id) ON DELETE SET NULL,
     FOREIGN KEY (model_id) REFERENCES models(id) ON DELETE SET NULL,
     INDEX idx_user_id (user_id),
-    INDEX idx_created_at (created_at)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
\ No newline at end of file
+    INDEX idx_created_at (created_at),
+    INDEX idx_user_created (user_id, created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+-- Migrations for databases created from an earlier version of this schema
+ALTER TABLE datasets MODIFY file_type ENUM('csv', 'xlsx', 'xls', 'parquet', 'feather') NOT NULL;
+-- Composite indexes for keyset-paginated listings and the latest-workflow lookup
+ALTER TABLE datasets ADD INDEX idx_user_created (user_id, created_at);
+ALTER TABLE workflows ADD INDEX idx_dataset_user_id (dataset_id, user_id, id);
+ALTER TABLE models ADD INDEX idx_user_created (user_id, created_at);
+ALTER TABLE models ADD INDEX idx_dataset_created (dataset_id, created_at);
+ALTER TABLE predictions ADD INDEX idx_user_created (user_id, created_at);
+ALTER TABLE predictions ADD INDEX idx_model_created (model_id, created_at);
+ALTER TABLE project_sessions ADD INDEX idx_user_created (user_id, created_at);
+-- Content-addressed uploads and storage quotas
+ALTER TABLE datasets ADD COLUMN content_hash CHAR(64) NULL AFTER headers;
+ALTER TABLE datasets ADD COLUMN file_size BIGINT NULL AFTER content_hash;
+ALTER TABLE datasets ADD INDEX idx_file_path (file_path);
+-- Model versions (numbered per dataset) and aliases
+ALTER TABLE models ADD COLUMN version INT NULL AFTER algorithm;
+UPDATE models m JOIN (SELECT id, ROW_NUMBER() OVER (PARTITION BY dataset_id ORDER BY id) AS version FROM models) v ON m.id = v.id SET m.version = v.version WHERE m.version IS NULL;
+ALTER TABLE models ADD UNIQUE INDEX uq_dataset_version (dataset_id, version);
+-- Insight generation outcome, so failures are not stored as insights
+ALTER TABLE workflows ADD COLUMN insights_status ENUM('pending', 'completed', 'failed') NULL AFTER insights;
+ALTER TABLE workflows ADD COLUMN insights_error TEXT NULL AFTER insights_status;
+-- Prediction ids handed out before buffered prediction rows are written
+ALTER TABLE predictions ADD COLUMN prediction_uuid CHAR(32) NULL AFTER confidence_score;
+ALTER TABLE predictions ADD UNIQUE INDEX uq_prediction_uuid (prediction_uuid);
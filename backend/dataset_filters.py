@@ -0,0 +1,150 @@
+import json
+import hashlib
+import logging
+import pandas as pd
+from dataset_io import parse_dates
+
+logger = logging.getLogger(__name__)
+
+# Supported comparison operators in filter expressions
+FILTER_OPERATORS = ['==', '!=', '<', '<=', '>', '>=', 'in', 'not in']
+
+def normalize_filters(filters, columns=None):
+    """Validate a filter expression and return it as a list of [column, op, value] triples.
+    
+    A filter is a list of conditions that are ANDed together, e.g.
+    [["region", "==", "EU"], ["order_date", ">=", "2024-07-01"]]. A single
+    condition may also be given as an object: {"column": ..., "op": ..., "value": ...}.
+    """
+    if not filters:
+        return []
+    if isinstance(filters, dict) or (isinstance(filters, list) and filters and isinstance(filters[0], str)):
+        filters = [filters]
+    if not isinstance(filters, list):
+        raise ValueError("filter must be a list of [column, op, value] conditions")
+    
+    normalized = []
+    for condition in filters:
+        if isinstance(condition, dict):
+            condition = [condition.get('column'), condition.get('op', '=='), condition.get('value')]
+        if not isinstance(condition, (list, tuple)) or len(condition) != 3:
+            raise ValueError(f"Invalid filter condition: {condition}")
+        column, op, value = condition
+        op = str(op).lower()
+        if op == '=':
+            op = '=='
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f"Unsupported filter operator: {op}. Allowed: {', '.join(FILTER_OPERATORS)}")
+        if columns is not None and column not in columns:
+            raise ValueError(f"Unknown filter column: {column}")
+        if op in ['in', 'not in'] and not isinstance(value, list):
+            raise ValueError(f"Operator '{op}' requires a list value")
+        normalized.append([column, op, value])
+    return normalized
+
+def filter_hash(filters):
+    """Stable hash of a normalized filter, used as the cache key of filtered views"""
+    payload = json.dumps(filters, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def coerce_filters(filters, column_types, date_formats=None):
+    """Cast JSON filter values to the column's type so Arrow can compare them with row-group statistics.
+    
+    Values compared with a text date column (date_formats, as detected at
+    ingest) become Timestamps, for apply_filters; raises ValueError if one
+    is not a date.
+    """
+    date_formats = date_formats or {}
+    coerced = []
+    for column, op, value in filters:
+        if column in date_formats:
+            coerced.append([column, op, _date_value(column, value, date_formats[column])])
+            continue
+        type_name = (column_types or {}).get(column, '')
+        coerced.append([column, op, _coerce_value(column, value, type_name)])
+    return coerced
+
+def dataframe_types(df):
+    """Arrow-style type names for a DataFrame's columns, for coerce_filters"""
+    types = {}
+    for col, dtype in df.dtypes.items():
+        if dtype.kind in 'iu':
+            types[col] = 'int64'
+        elif dtype.kind == 'f':
+            types[col] = 'double'
+        elif dtype.kind == 'M':
+            types[col] = 'timestamp[ns]'
+        elif dtype.kind in 'OSU' or str(dtype) in ['str', 'string']:
+            types[col] = 'string'
+    return types
+
+def _coerce_value(column, value, type_name):
+    """A filter value cast to an Arrow type name; raises ValueError if it does not fit the type"""
+    if isinstance(value, list):
+        return [_coerce_value(column, v, type_name) for v in value]
+    if value is None:
+        return value
+    try:
+        if type_name.startswith(('int', 'uint')):
+            return int(float(value))
+        if type_name in ['double', 'float', 'halffloat']:
+            return float(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Invalid number for filter column {column}: {value}")
+    if type_name in ['string', 'large_string']:
+        return str(value)
+    if type_name.startswith('timestamp'):
+        timestamp = _date_value(column, value, 'ISO8601')
+        # Arrow does not compare timestamps with and without a time zone
+        tz = type_name.partition('tz=')[2].rstrip(']').strip() or None
+        if tz and timestamp.tzinfo is None:
+            return timestamp.tz_localize(tz)
+        if not tz and timestamp.tzinfo is not None:
+            return timestamp.tz_convert(None)
+        return timestamp
+    if type_name.startswith('date'):
+        return _date_value(column, value, 'ISO8601').date()
+    return value
+
+def _date_value(column, value, fmt):
+    """A filter value as a Timestamp: written in the column's own format, or ISO 8601"""
+    if isinstance(value, list):
+        return [_date_value(column, v, fmt) for v in value]
+    if value is None:
+        return value
+    for value_format in dict.fromkeys([fmt, 'ISO8601']):
+        parsed = pd.to_datetime(str(value), format=value_format, errors='coerce')
+        if not pd.isna(parsed):
+            return parsed
+    raise ValueError(f"Invalid date for filter column {column}: {value}")
+
+def apply_filters(df, filters, date_formats=None):
+    """Evaluate a normalized filter on a DataFrame (used where Arrow cannot evaluate it).
+    
+    Text date columns listed in date_formats are parsed with their format
+    and compared as dates, so values coerced by coerce_filters compare
+    chronologically rather than as strings.
+    """
+    date_formats = date_formats or {}
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        series = df[column]
+        if column in date_formats:
+            series = parse_dates(series, date_formats[column])
+        if op == '==':
+            mask &= series == value
+        elif op == '!=':
+            mask &= series != value
+        elif op == '<':
+            mask &= series < value
+        elif op == '<=':
+            mask &= series <= value
+        elif op == '>':
+            mask &= series > value
+        elif op == '>=':
+            mask &= series >= value
+        elif op == 'in':
+            mask &= series.isin(value)
+        elif op == 'not in':
+            mask &= ~series.isin(value)
+    return df[mask]
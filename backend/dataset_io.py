@@ -0,0 +1,230 @@
+import os
+import io
+import csv
+import logging
+import pandas as pd
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Upload formats, longest suffix first so 'csv.gz' wins over 'gz'
+READ_FORMATS = ['csv.gz', 'csv.zst', 'parquet', 'feather', 'arrow', 'xlsx', 'xls', 'csv']
+
+# Tokens parsed as missing values in CSV files (pandas' defaults)
+CSV_NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+                 '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+# Download formats: (file suffix, mimetype)
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'csv.gz': ('csv.gz', 'application/gzip'),
+    'csv.zst': ('csv.zst', 'application/zstd'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'feather': ('feather', 'application/vnd.apache.arrow.file'),
+    'arrow': ('arrow', 'application/vnd.apache.arrow.file')
+}
+
+# Candidate date formats tried on a sample of each text column, in order of preference
+# ('ISO8601' covers dates and timestamps with or without a T, fractions and offsets)
+DATE_FORMATS = [
+    'ISO8601', '%Y/%m/%d', '%Y/%m/%d %H:%M', '%Y/%m/%d %H:%M:%S',
+    '%m/%d/%Y', '%d/%m/%Y', '%m/%d/%Y %H:%M', '%d/%m/%Y %H:%M', '%m/%d/%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S',
+    '%m-%d-%Y', '%d-%m-%Y', '%d.%m.%Y', '%d.%m.%Y %H:%M', '%m/%d/%y', '%d/%m/%y',
+    '%d %b %Y', '%b %d %Y', '%b %d, %Y', '%d %B %Y', '%B %d %Y', '%B %d, %Y', '%d-%b-%Y', '%d-%b-%y'
+]
+
+def get_file_extension(filename):
+    """Return the dataset format of a file name, e.g. 'csv', 'csv.gz', 'parquet'"""
+    name = filename.lower()
+    for ext in READ_FORMATS:
+        if name.endswith('.' + ext):
+            return ext
+    return name.rsplit('.', 1)[1] if '.' in name else ''
+
+def get_file_type(file_ext):
+    """Map a file extension to the datasets.file_type column value"""
+    if file_ext.startswith('csv'):
+        return 'csv'
+    if file_ext == 'arrow':
+        return 'feather'
+    return file_ext
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def excel_engine():
+    """Prefer the Rust-based calamine reader for Excel when it is installed"""
+    try:
+        import python_calamine  # noqa: F401
+        return 'calamine'
+    except ImportError:
+        return None
+
+def read_dataframe(file_path, columns=None, nrows=None):
+    """Read a dataset file into a DataFrame using the fastest reader for its format"""
+    file_ext = get_file_extension(file_path)
+    
+    if file_ext in ['parquet']:
+        # Memory-mapped, multi-threaded Arrow read
+        df = pd.read_parquet(file_path, columns=columns, memory_map=True)
+        return df.head(nrows) if nrows else df
+    
+    if file_ext in ['feather', 'arrow']:
+        # Arrow IPC files are read zero-copy via memory mapping
+        from pyarrow import feather
+        table = feather.read_table(file_path, columns=columns, memory_map=True)
+        return (table.slice(0, nrows) if nrows else table).to_pandas()
+    
+    if file_ext in ['xlsx', 'xls']:
+        return pd.read_excel(file_path, usecols=columns, nrows=nrows, engine=excel_engine())
+    
+    if file_ext.startswith('csv'):
+        if nrows:
+            return pd.read_csv(file_path, usecols=columns, nrows=nrows, sep=sniff_delimiter(file_path))
+        df, _ = read_csv(file_path, columns=columns)
+        return df
+    
+    raise ValueError(f"Unsupported file type: {file_ext}")
+
+def sniff_delimiter(file_path, sample_bytes=64 * 1024):
+    """Detect the delimiter from the first block of a (possibly compressed) CSV"""
+    try:
+        import pyarrow as pa
+        with pa.input_stream(file_path, compression='detect') as stream:
+            sample = stream.read(sample_bytes)
+    except ImportError:
+        with open(file_path, 'rb') as f:
+            sample = f.read(sample_bytes)
+    
+    text = sample.decode('utf-8', errors='ignore')
+    # Drop the last, probably truncated, line
+    if len(sample) == sample_bytes and '\n' in text:
+        text = text[:text.rindex('\n')]
+    try:
+        return csv.Sniffer().sniff(text, delimiters=',;\t|').delimiter
+    except csv.Error:
+        return ','
+
+def read_csv(file_path, columns=None, schema=None):
+    """Parse a CSV with the multi-threaded Arrow reader.
+    
+    Without a schema the column types are inferred, and (for full reads) the
+    inferred schema is returned so later parses can pass it back and skip
+    inference entirely.
+    """
+    if not _has_pyarrow():
+        return pd.read_csv(file_path, usecols=columns), None
+    
+    import pyarrow as pa
+    
+    delimiter = schema['delimiter'] if schema else sniff_delimiter(file_path)
+    na_values = schema['na_values'] if schema else CSV_NA_VALUES
+    column_types = {}
+    if schema:
+        for col, type_name in schema['dtypes'].items():
+            try:
+                column_types[col] = pa.type_for_alias(type_name)
+            except (ValueError, KeyError):
+                pass  # e.g. timezone-aware timestamps; let Arrow infer those
+    
+    try:
+        table = _read_arrow_csv(file_path, delimiter, na_values, column_types, columns)
+        date_columns = [field.name for field in table.schema if pa.types.is_temporal(field.type)]
+        if date_columns and schema is None:
+            # Keep dates as text, like pandas does; their format is resolved from the schema later
+            raw = _read_arrow_csv(file_path, delimiter, na_values, {col: pa.string() for col in date_columns}, date_columns)
+            for col in date_columns:
+                table = table.set_column(table.schema.get_field_index(col), col, raw[col])
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        # Ragged rows or types Arrow cannot handle: fall back to pandas
+        logger.warning(f"Arrow CSV reader failed for {file_path}, falling back to pandas: {e}")
+        return pd.read_csv(file_path, usecols=columns, sep=delimiter, na_values=na_values, keep_default_na=False), schema
+    
+    df = table.to_pandas()
+    if schema is None and not columns:
+        schema = {
+            'delimiter': delimiter,
+            'na_values': na_values,
+            'columns': table.column_names,
+            'dtypes': {field.name: str(field.type) for field in table.schema},
+            'date_columns': date_columns,
+            'date_formats': detect_date_formats(df)
+        }
+    return df, schema
+
+def _read_arrow_csv(file_path, delimiter, na_values, column_types, columns):
+    from pyarrow import csv as pa_csv
+    return pa_csv.read_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(use_threads=True, block_size=Config.CSV_BLOCK_SIZE),
+        parse_options=pa_csv.ParseOptions(delimiter=delimiter),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=column_types,
+            null_values=na_values,
+            strings_can_be_null=True,
+            include_columns=list(columns) if columns else None
+        )
+    )
+
+def write_dataframe(df, fmt):
+    """Serialize a DataFrame into one of EXPORT_FORMATS and return an in-memory buffer"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}. Allowed: {', '.join(EXPORT_FORMATS)}")
+    
+    buffer = io.BytesIO()
+    if fmt == 'parquet':
+        df.to_parquet(buffer, index=False, compression=Config.PARQUET_COMPRESSION)
+    elif fmt in ['feather', 'arrow']:
+        df.reset_index(drop=True).to_feather(buffer, compression=Config.ARROW_COMPRESSION)
+    elif fmt == 'csv.gz':
+        df.to_csv(buffer, index=False, compression={'method': 'gzip'})
+    elif fmt == 'csv.zst':
+        df.to_csv(buffer, index=False, compression={'method': 'zstd'})
+    else:
+        df.to_csv(buffer, index=False)
+    buffer.seek(0)
+    return buffer
+
+def export_filename(name, stage, fmt):
+    """Build the download name for an exported dataset"""
+    stem = os.path.basename(name)
+    for ext in READ_FORMATS:
+        if stem.lower().endswith('.' + ext):
+            stem = stem[:-(len(ext) + 1)]
+            break
+    return f"{stem}_{stage}.{EXPORT_FORMATS[fmt][0]}"
+
+def detect_date_formats(df, sample_size=None):
+    """Find the text columns holding dates and the format each is written in.
+    
+    Only a sample of each column's values is parsed, once per candidate
+    format; a format is taken when it parses at least DATE_DETECT_MIN_RATIO
+    of the sample. Returns {column: format} for use with parse_dates.
+    """
+    sample_size = sample_size or Config.DATE_DETECT_SAMPLE_ROWS
+    formats = {}
+    for col in df.select_dtypes(include=['object', 'string']).columns:
+        values = df[col].dropna()
+        if values.empty:
+            continue
+        step = max(len(values) // sample_size, 1)
+        sample = values.iloc[::step].head(sample_size).astype(str).str.strip()
+        # Skip free text quickly: dates have digits and are short
+        if sample.str.len().max() > 40 or sample.str.contains(r'\d', regex=True).mean() < Config.DATE_DETECT_MIN_RATIO:
+            continue
+        for fmt in DATE_FORMATS:
+            parsed = pd.to_datetime(sample, format=fmt, errors='coerce')
+            if parsed.notna().mean() >= Config.DATE_DETECT_MIN_RATIO:
+                formats[str(col)] = fmt
+                break
+    return formats
+
+def parse_dates(series, fmt=None):
+    """Parse a column of dates with a known format, without per-call format inference"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series, format=fmt, errors='coerce')
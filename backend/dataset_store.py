@@ -0,0 +1,532 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from config import Config
+from dataset_io import read_dataframe, read_csv, get_file_extension, excel_engine, detect_date_formats
+from dataset_filters import normalize_filters, filter_hash, coerce_filters, apply_filters, dataframe_types
+from metrics import span
+from fingerprints import hash_rows, hash_batches, HASH_VERSION
+from dataset_profile import profile_frame, merge_profiles
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class DatasetStore:
+    """Columnar (Parquet) copies of uploaded datasets, keyed by the upload's file path"""
+    
+    META_FILE = 'meta.json'
+    PROFILE_FILE = 'profile.json'
+    
+    # Upload formats that are converted to Parquet after upload
+    CONVERTED_FORMATS = {'xlsx', 'xls', 'csv', 'csv.gz', 'csv.zst'}
+    
+    # Uploads already in a columnar format, read in place by pyarrow.dataset in that format
+    NATIVE_FORMATS = {'parquet': 'parquet', 'feather': 'feather', 'arrow': 'feather'}
+    
+    # Formats too slow to parse fully on the request path
+    PREVIEW_ONLY_FORMATS = {'xlsx', 'xls'}
+    
+    def __init__(self, root=None):
+        self.root = root or Config.STORE_FOLDER
+        # Store locks held by the current thread, so a thread can re-enter one
+        self._held = threading.local()
+    
+    def store_dir(self, file_path):
+        """Directory holding the converted form of an upload"""
+        return os.path.join(self.root, os.path.basename(file_path))
+    
+    def table_path(self, file_path, sheet=None):
+        """Parquet file for the primary table, or for a named Excel sheet"""
+        if sheet is None:
+            return os.path.join(self.store_dir(file_path), 'data.parquet')
+        return os.path.join(self.store_dir(file_path), 'sheets', f"{_safe_name(sheet)}.parquet")
+    
+    def load_meta(self, file_path):
+        """Return the store metadata, or None if the upload has not been converted"""
+        meta_path = os.path.join(self.store_dir(file_path), self.META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def save_meta(self, file_path, meta):
+        """Atomically write the store metadata"""
+        _write_json(os.path.join(self.store_dir(file_path), self.META_FILE), meta)
+    
+    @contextmanager
+    def locked(self, file_path):
+        """Hold an exclusive lock on a dataset's store, across processes (no-op without fcntl); re-entrant per thread"""
+        store_dir = self.store_dir(file_path)
+        held = self._held.__dict__.setdefault('dirs', set())
+        if store_dir in held:
+            yield
+            return
+        os.makedirs(store_dir, exist_ok=True)
+        with open(os.path.join(store_dir, '.lock'), 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            held.add(store_dir)
+            try:
+                yield
+            finally:
+                held.discard(store_dir)
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _record_meta(self, file_path, key, value):
+        """Add a key to the store metadata unless it is set, re-reading the metadata under the store lock.
+        
+        Conversion and appends rewrite the metadata under the same lock, so
+        nothing they wrote in the meantime is overwritten.
+        """
+        with self.locked(file_path):
+            meta = self.load_meta(file_path) or {}
+            if meta.get(key) is None:
+                meta[key] = value
+                self.save_meta(file_path, meta)
+    
+    def needs_conversion(self, file_path):
+        return get_file_extension(file_path) in self.CONVERTED_FORMATS
+    
+    def preview_only(self, file_path):
+        return get_file_extension(file_path) in self.PREVIEW_ONLY_FORMATS
+    
+    def is_converted(self, file_path):
+        meta = self.load_meta(file_path)
+        return bool(meta and meta.get('converted_at'))
+    
+    def is_columnar(self, file_path):
+        """Whether filters can be evaluated by Arrow: the upload is converted or was columnar to begin with"""
+        return self.is_converted(file_path) or get_file_extension(file_path) in self.NATIVE_FORMATS
+    
+    def write_table(self, df, path):
+        """Write a DataFrame to Parquet, falling back to strings for mixed-type columns"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        try:
+            df.to_parquet(tmp_path, index=False, compression=Config.PARQUET_COMPRESSION,
+                          row_group_size=Config.PARQUET_ROW_GROUP_SIZE)
+        except Exception:
+            # Excel columns often mix numbers and text, which Arrow cannot type
+            df = df.copy()
+            for col in df.select_dtypes(include=['object']).columns:
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+            df.to_parquet(tmp_path, index=False, compression=Config.PARQUET_COMPRESSION,
+                          row_group_size=Config.PARQUET_ROW_GROUP_SIZE)
+        os.replace(tmp_path, path)
+    
+    def convert(self, file_path):
+        """Convert an upload (all sheets for Excel) into the columnar store, once.
+        
+        Datasets uploaded with the same content share one store (see
+        blob_store.py), so concurrent conversions wait for each other.
+        """
+        with self.locked(file_path):
+            return self._convert(file_path)
+    
+    def _convert(self, file_path):
+        meta = self.load_meta(file_path)
+        if meta and meta.get('converted_at'):
+            return meta
+        
+        file_ext = get_file_extension(file_path)
+        started = datetime.now()
+        
+        if file_ext in ['xlsx', 'xls']:
+            sheets = pd.read_excel(file_path, sheet_name=None, engine=excel_engine())
+        elif file_ext.startswith('csv'):
+            sheets = {None: self._load_csv(file_path)}
+        else:
+            sheets = {None: read_dataframe(file_path)}
+        
+        sheet_names = [name for name in sheets if name is not None]
+        primary = sheet_names[0] if sheet_names else None
+        for name, df in sheets.items():
+            if name == primary:
+                self.write_table(df, self.table_path(file_path))
+            if name is not None:
+                self.write_table(df, self.table_path(file_path, name))
+        
+        primary_df = sheets[primary]
+        # Row fingerprints for deduplication and the column profile, while the table is in memory anyway
+        self._save_row_hashes(file_path, None, hash_rows(primary_df))
+        _write_json(self.profile_path(file_path), profile_frame(primary_df))
+        meta = self.load_meta(file_path) or {}
+        # CSVs had their date formats detected with the schema on the first parse
+        csv_date_formats = (meta.get('csv_schema') or {}).get('date_formats')
+        meta.update({
+            'source': file_path,
+            'source_format': file_ext,
+            'sheets': sheet_names,
+            'primary_sheet': primary,
+            'row_count': len(primary_df),
+            'parts': [{'file': 'data.parquet', 'rows': len(primary_df)}],
+            'columns': [str(col) for col in primary_df.columns],
+            'date_formats': detect_date_formats(primary_df) if csv_date_formats is None else csv_date_formats,
+            'converted_at': datetime.now().isoformat(),
+            'conversion_seconds': round((datetime.now() - started).total_seconds(), 3)
+        })
+        self.save_meta(file_path, meta)
+        logger.info(f"Converted {file_path} to columnar store in {meta['conversion_seconds']}s")
+        return meta
+    
+    def load(self, file_path, columns=None, sheet=None, nrows=None, filters=None, part_range=None):
+        """Read a dataset, preferring its converted columnar form over the original upload.
+        
+        part_range=(start, stop) reads only those appended parts of the
+        primary table (see append), e.g. the rows added since a stage last ran.
+        """
+        with span('data.parse') as stage:
+            df = self._load(file_path, columns, sheet, nrows, filters, part_range)
+            stage['rows'] = len(df)
+        return df
+    
+    def _load(self, file_path, columns=None, sheet=None, nrows=None, filters=None, part_range=None):
+        if filters:
+            return self._load_filtered(file_path, filters, columns, nrows)
+        if part_range and not self.is_converted(file_path) and part_range[0] >= 1:
+            # An unconverted upload is a single part
+            return read_dataframe(file_path, columns=columns, nrows=1).head(0)
+        if self.is_converted(file_path):
+            if sheet is None:
+                return self._read_parts(file_path, self.part_paths(file_path, part_range), columns, nrows)
+            path = self.table_path(file_path, sheet)
+            if not os.path.exists(path):
+                raise ValueError(f"Sheet not found: {sheet}")
+            return self._read_parquet(path, columns, nrows)
+        if get_file_extension(file_path).startswith('csv') and not nrows:
+            return self._load_csv(file_path, columns)
+        if sheet is not None and get_file_extension(file_path) in ['xlsx', 'xls']:
+            return pd.read_excel(file_path, sheet_name=sheet, usecols=columns, nrows=nrows, engine=excel_engine())
+        return read_dataframe(file_path, columns=columns, nrows=nrows)
+    
+    def _read_parquet(self, path, columns=None, nrows=None):
+        if nrows:
+            # Only decode the first batch instead of the whole file
+            import pyarrow.parquet as pq
+            batch = next(pq.ParquetFile(path).iter_batches(batch_size=nrows, columns=columns), None)
+            return batch.to_pandas() if batch is not None else pd.read_parquet(path, columns=columns)
+        return pd.read_parquet(path, columns=columns)
+    
+    def _read_parts(self, file_path, paths, columns=None, nrows=None):
+        if len(paths) == 1:
+            return self._read_parquet(paths[0], columns, nrows)
+        import pyarrow.parquet as pq
+        if not paths:
+            table = pq.read_schema(self.table_path(file_path)).empty_table()
+            return (table.select(list(columns)) if columns else table).to_pandas()
+        import pyarrow.dataset as pads
+        dataset = pads.dataset(paths, format='parquet')
+        table = dataset.head(nrows, columns=columns) if nrows else dataset.to_table(columns=columns)
+        return table.to_pandas()
+    
+    def parts(self, file_path, meta=None):
+        """Files of the primary table in the order they were added, as {'file', 'rows'} entries"""
+        meta = meta or self.load_meta(file_path) or {}
+        return meta.get('parts') or [{'file': 'data.parquet', 'rows': meta.get('row_count')}]
+    
+    def part_count(self, file_path):
+        return len(self.parts(file_path))
+    
+    def part_paths(self, file_path, part_range=None):
+        parts = self.parts(file_path)
+        if part_range:
+            parts = parts[part_range[0]:part_range[1]]
+        return [os.path.join(self.store_dir(file_path), part['file']) for part in parts]
+    
+    def append(self, file_path, df):
+        """Add rows to a dataset as a new Parquet part and return the updated metadata.
+        
+        The rows must have the dataset's columns and are cast to its column
+        types. Existing parts are never rewritten: the row fingerprints are
+        extended and the stored profile is merged with the new rows' profile.
+        Unconverted uploads are converted first.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        with self.locked(file_path):
+            meta = self._convert(file_path)
+            schema = pq.read_schema(self.table_path(file_path))
+            missing = [col for col in schema.names if col not in df.columns]
+            extra = [str(col) for col in df.columns if col not in schema.names]
+            if missing or extra:
+                raise ValueError(
+                    f"Appended columns do not match the dataset. Missing: {', '.join(missing) or '-'}; "
+                    f"unknown: {', '.join(extra) or '-'}"
+                )
+            try:
+                table = pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+                raise ValueError(f"Appended rows do not match the dataset's column types: {e}")
+            
+            with span('data.append', rows=table.num_rows):
+                # Hashed and profiled as they read back from the store
+                delta = table.to_pandas()
+                profile = merge_profiles(self.profile(file_path), profile_frame(delta))
+                hashes_path = self.row_hashes_path(file_path)
+                hashes = np.load(hashes_path) if os.path.exists(hashes_path) else None
+                
+                parts = self.parts(file_path, meta)
+                part_file = os.path.join('parts', f"part-{len(parts):05d}.parquet")
+                part_path = os.path.join(self.store_dir(file_path), part_file)
+                os.makedirs(os.path.dirname(part_path), exist_ok=True)
+                tmp_path = part_path + '.tmp'
+                pq.write_table(table, tmp_path, compression=Config.PARQUET_COMPRESSION,
+                               row_group_size=Config.PARQUET_ROW_GROUP_SIZE)
+                os.replace(tmp_path, part_path)
+                
+                meta['parts'] = parts + [{'file': part_file, 'rows': table.num_rows, 'appended_at': datetime.now().isoformat()}]
+                meta['row_count'] = meta['row_count'] + table.num_rows
+                self.save_meta(file_path, meta)
+                
+                # Fingerprints over other column subsets are recomputed on their next use
+                shutil.rmtree(os.path.dirname(hashes_path), ignore_errors=True)
+                if hashes is not None and len(hashes) == meta['row_count'] - table.num_rows:
+                    self._save_row_hashes(file_path, None, np.concatenate([hashes, hash_rows(delta)]))
+                _write_json(self.profile_path(file_path), profile)
+                self.clear_views(file_path)
+        logger.info(f"Appended {table.num_rows} rows to {file_path} as {part_file}")
+        return meta
+    
+    def _batches(self, file_path, columns=None):
+        """DataFrames of the primary table's Parquet batches, part by part"""
+        import pyarrow.parquet as pq
+        for path in self.part_paths(file_path):
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=Config.ROW_HASH_CHUNK_ROWS, columns=columns):
+                yield batch.to_pandas()
+    
+    def profile_path(self, file_path):
+        return os.path.join(self.store_dir(file_path), self.PROFILE_FILE)
+    
+    def profile(self, file_path):
+        """Mergeable column profile of the dataset (see dataset_profile.py), computed batch by batch if missing"""
+        path = self.profile_path(file_path)
+        meta = self.load_meta(file_path) or {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                profile = json.load(f)
+            if profile['rows'] == meta.get('row_count', profile['rows']):
+                return profile
+        with span('data.profile') as stage:
+            profile = None
+            if self.is_converted(file_path):
+                for batch in self._batches(file_path):
+                    batch_profile = profile_frame(batch)
+                    profile = batch_profile if profile is None else merge_profiles(profile, batch_profile)
+            if profile is None:
+                profile = profile_frame(self.load(file_path))
+            stage['rows'] = profile['rows']
+        _write_json(path, profile)
+        return profile
+    
+    def fitted_path(self, file_path, name):
+        return os.path.join(self.store_dir(file_path), 'fitted', f"{name}.json")
+    
+    def load_fitted(self, file_path, name):
+        """Parameters a stage fitted on this dataset (fill values, scaling, ...), or None"""
+        path = self.fitted_path(file_path, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def save_fitted(self, file_path, name, fitted):
+        _write_json(self.fitted_path(file_path, name), fitted)
+    
+    def view_path(self, file_path, key):
+        return os.path.join(self.store_dir(file_path), 'views', f"{key}.parquet")
+    
+    def materialize_view(self, file_path, filters):
+        """Evaluate a filter against the columnar data and cache the result by filter hash.
+        
+        Arrow prunes row groups whose min/max statistics cannot match the
+        filter, so only candidate row groups are decoded. Conditions on text
+        date columns are evaluated afterwards on the remaining rows, parsing
+        the column with its detected format. Parquet, Feather and Arrow
+        uploads are read in place. Returns the view's Parquet path, or None
+        if the dataset has not been converted yet.
+        """
+        if not self.is_columnar(file_path):
+            return None
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        types = self.column_types(file_path)
+        filters = normalize_filters(filters, types)
+        path = self.view_path(file_path, filter_hash(filters))
+        if os.path.exists(path):
+            return path
+        
+        date_formats = self._filter_date_formats(file_path)
+        pushed = [condition for condition in filters if condition[0] not in date_formats]
+        dated = [condition for condition in filters if condition[0] in date_formats]
+        expression = pq.filters_to_expression([tuple(c) for c in coerce_filters(pushed, types)]) if pushed else None
+        table = self._arrow_dataset(file_path).to_table(filter=expression)
+        if dated:
+            df = apply_filters(table.to_pandas(), coerce_filters(dated, types, date_formats), date_formats)
+            table = pa.Table.from_pandas(df, schema=table.schema, preserve_index=False)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        pq.write_table(table, tmp_path, compression=Config.PARQUET_COMPRESSION,
+                       row_group_size=Config.PARQUET_ROW_GROUP_SIZE)
+        os.replace(tmp_path, path)
+        logger.info(f"Materialized view {os.path.basename(path)} of {file_path}: {table.num_rows} rows")
+        return path
+    
+    def check_filters(self, file_path, filters):
+        """Validate a filter's columns and values against the dataset's column types, from metadata; raises ValueError"""
+        if not filters:
+            return []
+        types = self.column_types(file_path)
+        filters = normalize_filters(filters, types)
+        coerce_filters(filters, types, self.date_formats(file_path))
+        return filters
+    
+    def _arrow_dataset(self, file_path):
+        """pyarrow.dataset over the converted parts, or over a columnar upload itself"""
+        import pyarrow.dataset as pads
+        if self.is_converted(file_path):
+            return pads.dataset(self.part_paths(file_path), format='parquet')
+        return pads.dataset(file_path, format=self.NATIVE_FORMATS[get_file_extension(file_path)])
+    
+    def _filter_date_formats(self, file_path):
+        """Date formats of the text columns; detected on a sample of an unconverted upload the first time"""
+        meta = self.load_meta(file_path) or {}
+        sample = None
+        if meta.get('date_formats') is None and not self.is_converted(file_path):
+            sample = self.load(file_path, nrows=Config.DATE_DETECT_SAMPLE_ROWS)
+        return self.date_formats(file_path, sample)
+    
+    def _load_filtered(self, file_path, filters, columns=None, nrows=None):
+        path = self.materialize_view(file_path, filters)
+        if path:
+            return self._read_parquet(path, columns, nrows)
+        # Not converted yet: filter in memory, without caching
+        df = self.load(file_path)
+        types = self.column_types(file_path) or dataframe_types(df)
+        date_formats = self.date_formats(file_path, df)
+        df = apply_filters(df, coerce_filters(normalize_filters(filters, types), types, date_formats), date_formats)
+        if columns:
+            df = df[list(columns)]
+        return df.head(nrows) if nrows else df
+    
+    def clear_views(self, file_path):
+        shutil.rmtree(os.path.join(self.store_dir(file_path), 'views'), ignore_errors=True)
+    
+    def row_hashes_path(self, file_path, subset=None):
+        key = 'all' if not subset else hashlib.sha256(json.dumps(list(subset)).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.store_dir(file_path), 'row_hashes', f"{key}-v{HASH_VERSION}.npy")
+    
+    def row_hashes(self, file_path, subset=None):
+        """64-bit hash of every row (over the subset columns), computed once per column set and stored.
+        
+        Converted datasets are hashed one Parquet batch at a time, so the
+        table is never held in memory; the stored array is memory-mapped.
+        """
+        path = self.row_hashes_path(file_path, subset)
+        if os.path.exists(path):
+            hashes = np.load(path, mmap_mode='r')
+            meta = self.load_meta(file_path) or {}
+            if len(hashes) == meta.get('row_count', len(hashes)):
+                return hashes
+        with span('data.hash') as stage:
+            if self.is_converted(file_path):
+                hashes = hash_batches(self._batches(file_path, list(subset) if subset else None))
+            else:
+                hashes = hash_rows(self.load(file_path, columns=list(subset) if subset else None))
+            stage['rows'] = len(hashes)
+        self._save_row_hashes(file_path, subset, hashes)
+        return hashes
+    
+    def _save_row_hashes(self, file_path, subset, hashes):
+        path = self.row_hashes_path(file_path, subset)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, hashes)
+        os.replace(tmp_path, path)
+    
+    def _load_csv(self, file_path, columns=None):
+        """Parse a CSV with the schema cached from its first parse, recording it if missing"""
+        meta = self.load_meta(file_path) or {}
+        df, schema = read_csv(file_path, columns=columns, schema=meta.get('csv_schema'))
+        if schema and not meta.get('csv_schema'):
+            self._record_meta(file_path, 'csv_schema', schema)
+        return df
+    
+    def column_types(self, file_path):
+        """Map column name to Arrow type name using metadata only, or None if unknown"""
+        import pyarrow.parquet as pq
+        if self.is_converted(file_path):
+            return {field.name: str(field.type) for field in pq.read_schema(self.table_path(file_path))}
+        file_ext = get_file_extension(file_path)
+        if file_ext == 'parquet':
+            return {field.name: str(field.type) for field in pq.read_schema(file_path)}
+        if file_ext in ['feather', 'arrow']:
+            from pyarrow import feather
+            return {field.name: str(field.type) for field in feather.read_table(file_path, memory_map=True).schema}
+        schema = self.schema(file_path)
+        return dict(schema['dtypes']) if schema else None
+    
+    def numeric_columns(self, file_path):
+        """Numeric column names from metadata, or None if the types are not known yet"""
+        import pyarrow as pa
+        types = self.column_types(file_path)
+        if types is None:
+            return None
+        numeric = []
+        for col, type_name in types.items():
+            try:
+                arrow_type = pa.type_for_alias(type_name)
+            except (ValueError, KeyError):
+                continue
+            if pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type):
+                numeric.append(col)
+        return numeric
+    
+    def schema(self, file_path):
+        """Return the cached CSV schema (dtypes, date columns and formats, NA tokens, delimiter), if any"""
+        meta = self.load_meta(file_path) or {}
+        return meta.get('csv_schema')
+    
+    def date_formats(self, file_path, df=None):
+        """{column: format} of the text date columns detected at ingest.
+        
+        Datasets ingested before detection existed have it run once on df
+        (when given) and recorded, so the formats are never inferred again.
+        """
+        meta = self.load_meta(file_path) or {}
+        formats = meta.get('date_formats')
+        if formats is None:
+            formats = (meta.get('csv_schema') or {}).get('date_formats')
+        if formats is None and df is not None:
+            formats = detect_date_formats(df)
+            self._record_meta(file_path, 'date_formats', formats)
+        return formats or {}
+    
+    def remove(self, file_path):
+        shutil.rmtree(self.store_dir(file_path), ignore_errors=True)
+
+def _write_json(path, data):
+    """Atomically write a JSON file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp_path, path)
+
+def _safe_name(name):
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in str(name))
+
+# Global dataset store instance
+dataset_store = DatasetStore()
@@ -0,0 +1,233 @@
+import numpy as np
+import pandas as pd
+from config import Config
+
+# Per-column encodings of categorical features
+ENCODING_STRATEGIES = ['ordinal', 'onehot', 'target', 'hash']
+
+# Label of missing categorical values
+UNKNOWN = 'Unknown'
+
+def normalize_encoding(options):
+    """Validate the encoding options of a training request; raises ValueError"""
+    options = dict(options or {})
+    unknown = set(options) - {'strategy', 'high_cardinality', 'max_categories', 'hash_buckets', 'sparse'}
+    if unknown:
+        raise ValueError(f"Unknown encoding options: {', '.join(sorted(unknown))}")
+    for key in ['strategy', 'high_cardinality']:
+        if key in options and options[key] not in ENCODING_STRATEGIES:
+            raise ValueError(f"Invalid encoding {key}: {options[key]}. Allowed: {', '.join(ENCODING_STRATEGIES)}")
+    if options.get('high_cardinality') == 'onehot' and options.get('sparse') is False:
+        raise ValueError("high_cardinality onehot requires sparse output")
+    if 'sparse' in options and not isinstance(options['sparse'], bool):
+        raise ValueError("sparse must be a boolean")
+    for key in ['max_categories', 'hash_buckets']:
+        if key in options and (not isinstance(options[key], int) or options[key] < 1):
+            raise ValueError(f"{key} must be a positive integer")
+    return options
+
+def _factorize(series):
+    """(codes, uniques) of a column; missing values get code -1"""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    return codes, np.asarray(uniques, dtype=object)
+
+def _numeric_from_codes(codes, uniques):
+    """Float values of a factorized column, parsing each distinct value once; None if none is numeric"""
+    parsed = pd.to_numeric(uniques, errors='coerce').astype(np.float64)
+    if np.isnan(parsed).all():
+        return None
+    return np.append(parsed, np.nan)[codes]
+
+def _category_codes(codes, uniques, categories=None):
+    """Codes of a factorized column's values as strings.
+    
+    Only the distinct values are converted to strings and looked up, so no
+    full-column astype(str) is needed. Missing values map to UNKNOWN. Without
+    categories the sorted labels become the categories (the same codes
+    LabelEncoder gives); with categories, unseen labels get -1.
+    """
+    labels = pd.Index(uniques.astype(str), dtype=object)
+    if (codes < 0).any():
+        labels = labels.append(pd.Index([UNKNOWN], dtype=object))
+        codes = np.where(codes < 0, len(labels) - 1, codes)
+    if categories is None:
+        categories = labels.unique().sort_values()
+    return categories.get_indexer(labels)[codes], categories
+
+class FeatureEncoder:
+    """Encodes a feature DataFrame into one preallocated float64 matrix.
+    
+    Numeric columns (and object columns holding numbers) are median-filled.
+    Categorical columns use `strategy` when they have at most `max_categories`
+    distinct values and `high_cardinality` otherwise:
+    
+    - ordinal: sorted category codes (what LabelEncoder produces)
+    - onehot: one 0/1 column per category
+    - target: smoothed mean of the target per category, out-of-fold while training
+    - hash: one 0/1 column per hash bucket (`hash_buckets` columns)
+    
+    The result is a dense matrix, or a SciPy CSR matrix when `sparse` is set
+    (or, by default, when the indicator columns are too many to hold densely).
+    The fitted encoder is saved next to the model and applied to prediction inputs.
+    """
+    
+    def __init__(self, strategy=None, high_cardinality=None, max_categories=None, hash_buckets=None,
+                 sparse=None, smoothing=10.0, folds=5):
+        self.strategy = strategy or Config.ENCODING_STRATEGY
+        self.high_cardinality = high_cardinality or Config.ENCODING_HIGH_CARDINALITY
+        self.max_categories = max_categories or Config.ENCODING_MAX_CATEGORIES
+        self.hash_buckets = hash_buckets or Config.ENCODING_HASH_BUCKETS
+        # None: sparse when the one-hot / hash blocks exceed ENCODING_SPARSE_MIN_COLUMNS columns
+        self.sparse = sparse
+        self.smoothing = smoothing
+        self.folds = folds
+        self.columns = []
+        self.specs = {}
+        self.feature_names = []
+        self.sparse_output = False
+    
+    def fit_transform(self, df, y=None):
+        """Learn the encoding of every column of df and return the encoded matrix"""
+        self.columns = list(df.columns)
+        self.specs = {}
+        n_rows = len(df)
+        prepared = []
+        for col in self.columns:
+            series = df[col]
+            if series.dtype.kind in 'biuf':
+                values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                # One factorize per column serves both the numeric check and the category codes
+                codes, uniques = _factorize(series)
+                values = _numeric_from_codes(codes, uniques)
+            if values is not None:
+                fill = np.nanmedian(values) if not np.isnan(values).all() else 0.0
+                self.specs[col] = {'kind': 'numeric', 'fill': float(fill), 'width': 1}
+                prepared.append(values)
+                continue
+            codes, categories = _category_codes(codes, uniques)
+            method = self.strategy if len(categories) <= self.max_categories else self.high_cardinality
+            if method == 'target' and y is None:
+                method = 'ordinal'
+            spec = {'kind': method, 'categories': categories}
+            if method == 'onehot':
+                spec['width'] = len(categories)
+            elif method == 'hash':
+                spec['width'] = self.hash_buckets
+                spec['buckets'] = self._buckets(categories)
+            else:
+                spec['width'] = 1
+            if method == 'target':
+                spec['means'], spec['prior'] = self._target_means(codes, np.asarray(y, dtype=np.float64), len(categories))
+            self.specs[col] = spec
+            prepared.append(codes)
+        
+        self.feature_names = []
+        for col in self.columns:
+            spec = self.specs[col]
+            if spec['kind'] == 'onehot':
+                self.feature_names += [f"{col}_{label}" for label in spec['categories']]
+            elif spec['kind'] == 'hash':
+                self.feature_names += [f"{col}_hash{i}" for i in range(spec['width'])]
+            else:
+                self.feature_names.append(col)
+        
+        indicator_width = sum(spec['width'] for spec in self.specs.values() if spec['kind'] in ['onehot', 'hash'])
+        self.sparse_output = indicator_width > Config.ENCODING_SPARSE_MIN_COLUMNS if self.sparse is None else self.sparse
+        
+        columns = []
+        for col, values in zip(self.columns, prepared):
+            spec = self.specs[col]
+            if spec['kind'] == 'target':
+                # Out-of-fold means, so a row's own target never leaks into its feature
+                columns.append(self._oof_target(values, np.asarray(y, dtype=np.float64), len(spec['categories'])))
+            else:
+                columns.append(self._column(spec, values))
+        return self._assemble(n_rows, columns)
+    
+    def transform(self, df):
+        """Encode new rows (e.g. prediction inputs) with the fitted encoding"""
+        columns = []
+        for col in self.columns:
+            spec = self.specs[col]
+            series = df[col] if col in df.columns else pd.Series([np.nan] * len(df), index=df.index)
+            if spec['kind'] == 'numeric' and series.dtype.kind in 'biuf':
+                values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            elif spec['kind'] == 'numeric':
+                values = _numeric_from_codes(*_factorize(series))
+                if values is None:
+                    values = np.full(len(series), np.nan)
+            else:
+                values, _ = _category_codes(*_factorize(series), spec['categories'])
+            columns.append(self._column(spec, values))
+        return self._assemble(len(df), columns)
+    
+    def _column(self, spec, values):
+        """A column's encoding: a float array, or (rows, column offsets) of the 1s of an indicator block"""
+        kind = spec['kind']
+        if kind == 'numeric':
+            return np.where(np.isnan(values), spec['fill'], values)
+        if kind == 'ordinal':
+            return values.astype(np.float64)
+        known = values >= 0
+        if kind == 'target':
+            encoded = np.full(len(values), spec['prior'])
+            encoded[known] = spec['means'][values[known]]
+            return encoded
+        # onehot / hash: unseen categories (-1) leave the row all zero
+        targets = values[known] if kind == 'onehot' else spec['buckets'][values[known]]
+        return np.flatnonzero(known), targets
+    
+    def _assemble(self, n_rows, columns):
+        """Write the encoded columns into one preallocated dense matrix, or a CSR matrix when sparse"""
+        width = len(self.feature_names)
+        if not self.sparse_output:
+            matrix = np.zeros((n_rows, width), dtype=np.float64)
+            offset = 0
+            for col, column in zip(self.columns, columns):
+                if isinstance(column, tuple):
+                    matrix[column[0], offset + column[1]] = 1.0
+                else:
+                    matrix[:, offset] = column
+                offset += self.specs[col]['width']
+            return matrix
+        
+        from scipy import sparse
+        rows, cols, data = [], [], []
+        offset = 0
+        for col, column in zip(self.columns, columns):
+            if isinstance(column, tuple):
+                rows.append(column[0])
+                cols.append(offset + column[1])
+                data.append(np.ones(len(column[0])))
+            else:
+                nonzero = np.flatnonzero(column)
+                rows.append(nonzero)
+                cols.append(np.full(len(nonzero), offset))
+                data.append(column[nonzero])
+            offset += self.specs[col]['width']
+        rows, cols, data = (np.concatenate(parts) if parts else np.empty(0) for parts in (rows, cols, data))
+        return sparse.csr_matrix((data, (rows, cols)), shape=(n_rows, width), dtype=np.float64)
+    
+    def _buckets(self, categories):
+        hashes = pd.util.hash_array(np.asarray(categories, dtype=object))
+        return (hashes % np.uint64(self.hash_buckets)).astype(np.int64)
+    
+    def _target_means(self, codes, y, n_categories, mask=None):
+        if mask is not None:
+            codes, y = codes[mask], y[mask]
+        prior = float(y.mean()) if len(y) else 0.0
+        sums = np.bincount(codes, weights=y, minlength=n_categories)
+        counts = np.bincount(codes, minlength=n_categories)
+        return (sums + self.smoothing * prior) / (counts + self.smoothing), prior
+    
+    def _oof_target(self, codes, y, n_categories):
+        folds = np.random.default_rng(42).permutation(len(codes)) % self.folds
+        encoded = np.empty(len(codes), dtype=np.float64)
+        for fold in range(self.folds):
+            in_fold = folds == fold
+            if not in_fold.any():
+                continue
+            means, _ = self._target_means(codes, y, n_categories, mask=~in_fold)
+            encoded[in_fold] = means[codes[in_fold]]
+        return encoded
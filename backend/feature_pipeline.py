@@ -0,0 +1,318 @@
+import json
+import math
+import hashlib
+import threading
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from dataset_io import parse_dates
+
+# Steps in the order their columns are added
+PIPELINE_STEPS = ['date_parts', 'encode', 'interactions', 'scale', 'bin']
+
+DATE_PARTS = ['year', 'month', 'day', 'hour', 'minute', 'dayofweek', 'dayofyear', 'quarter']
+# Date parts that can also be encoded as sin/cos of their position in the cycle: (first value, period)
+CYCLICAL_PARTS = {
+    'month': (1, 12), 'day': (1, 31), 'hour': (0, 24), 'minute': (0, 60),
+    'dayofweek': (0, 7), 'dayofyear': (1, 366), 'quarter': (1, 4)
+}
+ENCODE_METHODS = ['codes', 'onehot', 'frequency']
+SCALE_METHODS = ['standard', 'minmax']
+BIN_STRATEGIES = ['quantile', 'uniform']
+
+# Column selectors a step may use instead of a list of column names
+COLUMN_SELECTORS = {
+    'numeric': [np.number],
+    'categorical': ['object', 'string', 'category'],
+    'datetime': ['datetime64']
+}
+
+# What process_transformation does without a spec
+DEFAULT_PIPELINE = {
+    'date_parts': {'columns': 'datetime', 'parts': ['year', 'month', 'day', 'dayofweek'], 'cyclical': ['month', 'dayofweek']},
+    'encode': {'columns': 'categorical', 'method': 'codes'},
+    'interactions': {'columns': 'numeric', 'pairs': 1},
+    'scale': {'columns': 'numeric', 'method': 'standard'},
+    'bin': None
+}
+
+STEP_DEFAULTS = {
+    'date_parts': {'columns': 'datetime', 'parts': ['year', 'month', 'day'], 'cyclical': []},
+    'encode': {'columns': 'categorical', 'method': 'codes', 'max_categories': None},
+    'interactions': {'columns': 'numeric', 'pairs': 1},
+    'scale': {'columns': 'numeric', 'method': 'standard'},
+    'bin': {'columns': 'numeric', 'bins': 5, 'strategy': 'quantile'}
+}
+
+def normalize_pipeline(spec, columns=None):
+    """Validate a feature pipeline spec and fill in defaults; raises ValueError.
+    
+    A spec maps step names to their options, or to null to switch a step off.
+    Steps left out keep their DEFAULT_PIPELINE setting, e.g.
+    {"bin": {"columns": ["age"], "bins": 4}, "scale": {"method": "minmax"}}.
+    With columns given, named columns must be among them.
+    """
+    if spec is None:
+        spec = {}
+    if not isinstance(spec, dict):
+        raise ValueError("pipeline must be an object mapping steps to options")
+    unknown = set(spec) - set(PIPELINE_STEPS)
+    if unknown:
+        raise ValueError(f"Unknown pipeline steps: {', '.join(sorted(unknown))}. Allowed: {', '.join(PIPELINE_STEPS)}")
+    
+    normalized = {}
+    for step in PIPELINE_STEPS:
+        options = spec.get(step, DEFAULT_PIPELINE[step])
+        if options is None or options is False:
+            normalized[step] = None
+            continue
+        if options is True:
+            options = {}
+        if not isinstance(options, dict):
+            raise ValueError(f"Options of pipeline step {step} must be an object")
+        extra = set(options) - set(STEP_DEFAULTS[step])
+        if extra:
+            raise ValueError(f"Unknown options for pipeline step {step}: {', '.join(sorted(extra))}")
+        options = {**STEP_DEFAULTS[step], **options}
+        
+        selected = options['columns']
+        if isinstance(selected, list):
+            valid_columns = all(isinstance(c, str) for c in selected)
+        else:
+            valid_columns = isinstance(selected, str) and selected in COLUMN_SELECTORS
+        if not valid_columns:
+            raise ValueError(f"columns of pipeline step {step} must be a list of names or one of {', '.join(COLUMN_SELECTORS)}")
+        if step == 'date_parts' and (not isinstance(options['parts'], list) or set(options['parts']) - set(DATE_PARTS)):
+            raise ValueError(f"Invalid date parts. Allowed: {', '.join(DATE_PARTS)}")
+        if step == 'date_parts' and (not isinstance(options['cyclical'], list) or set(options['cyclical']) - set(CYCLICAL_PARTS)):
+            raise ValueError(f"Invalid cyclical date parts. Allowed: {', '.join(CYCLICAL_PARTS)}")
+        if step == 'encode' and options['method'] not in ENCODE_METHODS:
+            raise ValueError(f"Invalid encode method: {options['method']}. Allowed: {', '.join(ENCODE_METHODS)}")
+        if step == 'scale' and options['method'] not in SCALE_METHODS:
+            raise ValueError(f"Invalid scale method: {options['method']}. Allowed: {', '.join(SCALE_METHODS)}")
+        if step == 'bin':
+            if options['strategy'] not in BIN_STRATEGIES:
+                raise ValueError(f"Invalid bin strategy: {options['strategy']}. Allowed: {', '.join(BIN_STRATEGIES)}")
+            if not isinstance(options['bins'], int) or options['bins'] < 2:
+                raise ValueError("bins must be an integer of at least 2")
+        if step == 'interactions':
+            pairs = options['pairs']
+            valid_count = isinstance(pairs, int) and pairs >= 0
+            valid_list = isinstance(pairs, list) and all(
+                isinstance(pair, list) and len(pair) == 2 and all(isinstance(c, str) for c in pair) for pair in pairs
+            )
+            if not (valid_count or valid_list):
+                raise ValueError("pairs must be a number of pairs or a list of [column, column] pairs")
+        if columns is not None:
+            named = list(options['columns']) if isinstance(options['columns'], list) else []
+            if step == 'interactions' and isinstance(options['pairs'], list):
+                named += [col for pair in options['pairs'] for col in pair]
+            missing = [col for col in named if col not in columns]
+            if missing:
+                raise ValueError(f"Unknown pipeline columns: {', '.join(missing)}")
+        normalized[step] = options
+    return normalized
+
+def pipeline_hash(spec):
+    """Stable hash of a normalized spec, used as the key of its fitted parameters"""
+    payload = json.dumps(spec, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    # Created on first use, so each process (including CPU pool workers) gets its own threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.FEATURE_THREADS, thread_name_prefix='dataflow-features')
+        return _executor
+
+def _select(df, columns, date_formats):
+    if isinstance(columns, list):
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"Unknown pipeline columns: {', '.join(missing)}")
+        return columns
+    selected = list(df.select_dtypes(include=COLUMN_SELECTORS[columns]).columns)
+    # Text columns whose date format was detected at ingest count as dates, not categories
+    if columns == 'datetime':
+        selected += [col for col in df.columns if col in date_formats and col not in selected]
+    elif columns == 'categorical':
+        selected = [col for col in selected if col not in date_formats]
+    return selected
+
+def _chunks(items, parts):
+    size = max(8, math.ceil(len(items) / max(parts, 1)))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+# Each step function returns ({source: {new column name: values}}, {source: fitted parameters})
+# for its group of columns. Parameters in options['fitted'] are applied instead of being fitted again.
+
+def _date_parts(df, columns, options):
+    new = {}
+    for col in columns:
+        # Parsed with the format recorded at ingest (inferred only for columns without one)
+        values = parse_dates(df[col], options['formats'].get(col)).dt
+        new[col] = {f'{col}_{part}': getattr(values, part) for part in options['parts']}
+        for part in options['cyclical']:
+            first, period = CYCLICAL_PARTS[part]
+            angle = 2 * np.pi * (getattr(values, part).to_numpy(dtype=np.float64, na_value=np.nan) - first) / period
+            new[col][f'{col}_{part}_sin'] = np.sin(angle)
+            new[col][f'{col}_{part}_cos'] = np.cos(angle)
+    return new, {}
+
+def _encode(df, columns, options):
+    new, state = {}, {}
+    max_categories = options['max_categories'] or Config.ENCODING_MAX_CATEGORIES
+    for col in columns:
+        method = options['method']
+        fitted = options['fitted'].get(col)
+        if fitted is None:
+            codes, uniques = pd.factorize(df[col], sort=True, use_na_sentinel=True)
+            uniques = uniques.tolist()
+            fitted = {'categories': uniques, 'onehot': method == 'onehot' and len(uniques) <= max_categories}
+            if method == 'frequency':
+                counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+                fitted['frequency'] = (counts / max(len(codes), 1)).tolist()
+        else:
+            # Categories unseen when fitting get -1 (no indicator, frequency 0)
+            uniques = fitted['categories']
+            codes = pd.Index(uniques).get_indexer(df[col])
+        state[col] = fitted
+        if fitted['onehot']:
+            indicators = np.zeros((len(codes), len(uniques)), dtype=np.uint8)
+            known = codes >= 0
+            indicators[np.flatnonzero(known), codes[known]] = 1
+            new[col] = {f'{col}_{label}': indicators[:, i] for i, label in enumerate(uniques)}
+        elif method == 'frequency':
+            frequency = np.append(fitted['frequency'], 0.0)[codes]
+            frequency[df[col].isna().to_numpy()] = np.nan
+            new[col] = {f'{col}_frequency': frequency}
+        else:
+            # Codes, also for columns with too many categories to one-hot encode
+            new[col] = {f'{col}_encoded': codes.astype(np.int32)}
+    return new, state
+
+def _interactions(df, pairs, options):
+    return {(col1, col2): {f'{col1}_x_{col2}': df[col1] * df[col2]} for col1, col2 in pairs}, {}
+
+def _scale(df, columns, options):
+    block = df[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+    fitted = options['fitted']
+    center = np.array([fitted[col][0] if col in fitted else np.nan for col in columns], dtype=np.float64)
+    spread = np.array([fitted[col][1] if col in fitted else np.nan for col in columns], dtype=np.float64)
+    unfitted = np.array([col not in fitted for col in columns], dtype=bool)
+    if unfitted.any():
+        # One pass over the block computes every column's statistics
+        sub = block[:, unfitted]
+        if options['method'] == 'standard':
+            center[unfitted] = np.nanmean(sub, axis=0)
+            spread[unfitted] = np.nanstd(sub, axis=0, ddof=1)
+        else:
+            center[unfitted] = np.nanmin(sub, axis=0)
+            spread[unfitted] = np.nanmax(sub, axis=0) - center[unfitted]
+    suffix = 'normalized' if options['method'] == 'standard' else 'minmax'
+    keep = spread > 0
+    scaled = (block[:, keep] - center[keep]) / spread[keep]
+    kept = [col for col, scalable in zip(columns, keep) if scalable]
+    state = {col: [float(c), float(s)] for col, c, s in zip(columns, center, spread)}
+    return {col: {f'{col}_{suffix}': scaled[:, i]} for i, col in enumerate(kept)}, state
+
+def _bin(df, columns, options):
+    new, state = {}, {}
+    for col in columns:
+        edges = options['fitted'].get(col)
+        if edges is not None:
+            # Fitted edges, open-ended so values beyond the fitted range land in the outer bins
+            binned = pd.cut(df[col], [-np.inf, *edges[1:-1], np.inf], labels=False)
+        elif options['strategy'] == 'quantile':
+            binned, edges = pd.qcut(df[col], options['bins'], labels=False, duplicates='drop', retbins=True)
+        else:
+            binned, edges = pd.cut(df[col], options['bins'], labels=False, retbins=True)
+        new[col] = {f'{col}_bin': binned}
+        state[col] = [float(edge) for edge in edges]
+    return new, state
+
+STEP_FUNCTIONS = {
+    'date_parts': _date_parts,
+    'encode': _encode,
+    'interactions': _interactions,
+    'scale': _scale,
+    'bin': _bin
+}
+
+def run_pipeline(df, spec, date_formats=None, fitted=None):
+    """Compute the new feature columns of a normalized spec; returns (new columns, report).
+    
+    Each step works on whole columns, and its columns are split into
+    independent groups that run on a thread pool (pandas and numpy release the
+    GIL in the heavy parts). The caller adds the columns to the frame at once.
+    date_formats ({column: format}, see dataset_store.date_formats) marks text
+    columns as dates and is used to parse them.
+    
+    report['fitted'] holds the parameters the steps learned ({step: {column:
+    parameters}}: categories, scaling center and spread, bin edges). Passed
+    back as fitted, they are applied as-is, so rows appended later are
+    transformed exactly like the rows the parameters were fitted on.
+    """
+    date_formats = date_formats or {}
+    fitted = fitted or {}
+    tasks = []
+    report = {
+        'feature_engineering': {},
+        'encoded_features': {},
+        'interaction_features': [],
+        'scaled_features': [],
+        'binned_features': [],
+        'fitted': {}
+    }
+    for step in PIPELINE_STEPS:
+        options = spec.get(step)
+        if options is None:
+            continue
+        if step == 'interactions':
+            pairs = options['pairs']
+            if isinstance(pairs, int):
+                pairs = list(itertools.islice(itertools.combinations(_select(df, options['columns'], date_formats), 2), pairs))
+            else:
+                _select(df, [col for pair in pairs for col in pair], date_formats)
+            items = [tuple(pair) for pair in pairs]
+        else:
+            items = _select(df, options['columns'], date_formats)
+        options = {**options, 'fitted': fitted.get(step, {})}
+        if step == 'date_parts':
+            options['formats'] = date_formats
+        for group in _chunks(items, Config.FEATURE_THREADS):
+            tasks.append((step, group, options))
+    
+    if Config.FEATURE_THREADS > 1 and len(tasks) > 1:
+        executor = _get_executor()
+        futures = [executor.submit(STEP_FUNCTIONS[step], df, group, options) for step, group, options in tasks]
+        results = [future.result() for future in futures]
+    else:
+        results = [STEP_FUNCTIONS[step](df, group, options) for step, group, options in tasks]
+    
+    new_columns = {}
+    for (step, group, options), (sources, state) in zip(tasks, results):
+        if state:
+            report['fitted'].setdefault(step, {}).update(state)
+        for source, columns in sources.items():
+            new_columns.update(columns)
+            names = list(columns)
+            if step == 'date_parts':
+                report['feature_engineering'][f'{source}_date_features'] = (
+                    list(options['parts']) + [f'{part}_sin/cos' for part in options['cyclical']]
+                )
+            elif step == 'encode':
+                report['encoded_features'][source] = names[0] if len(names) == 1 else names
+            elif step == 'interactions':
+                report['interaction_features'] += names
+            elif step == 'scale':
+                report['scaled_features'] += names
+            else:
+                report['binned_features'] += names
+    return new_columns, report
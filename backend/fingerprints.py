@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+from config import Config
+
+DEDUP_KEEP = ['first', 'last']
+
+def normalize_dedup(options, columns=None):
+    """Validate the dedup options of a cleaning request; raises ValueError.
+    
+    {"subset": [...]} compares rows on those columns only (all columns by
+    default); "keep" picks the first or last row of each duplicate group.
+    """
+    options = dict(options or {})
+    unknown = set(options) - {'subset', 'keep'}
+    if unknown:
+        raise ValueError(f"Unknown dedup options: {', '.join(sorted(unknown))}")
+    subset = options.get('subset')
+    if subset is not None:
+        if not isinstance(subset, list) or not subset or not all(isinstance(col, str) for col in subset):
+            raise ValueError("dedup subset must be a non-empty list of column names")
+        if columns is not None and set(subset) - set(columns):
+            raise ValueError(f"Unknown dedup columns: {', '.join(sorted(set(subset) - set(columns)))}")
+    keep = options.get('keep', 'first')
+    if keep not in DEDUP_KEEP:
+        raise ValueError(f"Invalid dedup keep: {keep}. Allowed: {', '.join(DEDUP_KEEP)}")
+    return {'subset': subset, 'keep': keep}
+
+# Hash of missing values, and the golden-ratio constant of the hash combine step
+_NA_HASH = np.uint64(0x2545F4914F6CDD1D)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+# Bumped whenever value hashes change, so fingerprints stored by an older version are recomputed
+HASH_VERSION = 2
+
+def hash_column(series):
+    """64-bit hash of every value of a column; missing values hash to the same constant.
+    
+    Numbers hash by value, not by dtype: 1, 1.0 and True hash alike, so a
+    batch whose int column was read back as float64 (because it holds
+    nulls) or as a nullable Int64 matches the other batches.
+    """
+    if series.dtype.kind in 'biuf':
+        return _hash_numbers(series)
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'mM':
+        return pd.util.hash_array(series.to_numpy())
+    # Strings and other objects: hash each distinct value once and spread it over the rows
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    hashed = pd.util.hash_array(np.asarray(uniques, dtype=object))
+    return np.append(hashed, _NA_HASH)[codes]
+
+def _hash_numbers(series):
+    """Integral values hash as int64 and others as float64, missing values as _NA_HASH"""
+    missing = series.isna().to_numpy()
+    if series.dtype.kind in 'biu':
+        hashes = pd.util.hash_array(series.to_numpy(dtype=np.int64, na_value=0))
+    else:
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        hashes = pd.util.hash_array(values)
+        with np.errstate(invalid='ignore'):
+            integral = (values == np.trunc(values)) & (np.abs(values) < 2.0 ** 63)
+        if integral.any():
+            hashes[integral] = pd.util.hash_array(values[integral].astype(np.int64))
+    hashes[missing] = _NA_HASH
+    return hashes
+
+def hash_rows(df, columns=None, chunk_rows=None):
+    """64-bit hash of every row (of the given columns), computed chunk by chunk.
+    
+    Columns are hashed with pandas' vectorized hash_array (text columns via
+    their distinct values) and combined per row, so no row is ever built as a
+    Python tuple. Value hashes do not depend on the chunk, so hashes of
+    separately read batches can be compared.
+    """
+    chunk_rows = chunk_rows or Config.ROW_HASH_CHUNK_ROWS
+    frame = df[list(columns)] if columns else df
+    hashes = np.empty(len(frame), dtype=np.uint64)
+    for start in range(0, len(frame), chunk_rows):
+        chunk = frame.iloc[start:start + chunk_rows]
+        combined = np.zeros(len(chunk), dtype=np.uint64)
+        for col in chunk.columns:
+            # boost::hash_combine, wrapping around on overflow
+            combined ^= hash_column(chunk[col]) + _MIX + (combined << np.uint64(6)) + (combined >> np.uint64(2))
+        hashes[start:start + len(chunk)] = combined
+    return hashes
+
+def hash_batches(batches):
+    """Row hashes of a stream of DataFrame batches (e.g. Parquet row groups)"""
+    parts = [hash_rows(batch) for batch in batches]
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.uint64)
+
+def duplicate_mask(hashes, keep='first'):
+    """Boolean mask of the rows that repeat an earlier (or, with keep='last', later) row.
+    
+    Works on the 8-byte hashes alone. Two different rows share a 64-bit hash
+    with negligible probability (about n^2 / 2^65 for n rows).
+    """
+    return pd.Series(hashes, copy=False).duplicated(keep=keep).to_numpy()
+
+def duplicate_groups(hashes, limit=20, sample_rows=5):
+    """Summary of the groups of identical rows, largest first, as row positions"""
+    codes, uniques = pd.factorize(pd.Series(hashes, copy=False))
+    counts = np.bincount(codes, minlength=len(uniques))
+    repeated = np.flatnonzero(counts > 1)
+    largest = repeated[np.argsort(-counts[repeated], kind='stable')[:limit]]
+    
+    groups = []
+    if len(largest):
+        # Positions of the rows of the reported groups only
+        members = np.flatnonzero(np.isin(codes, largest))
+        by_group = pd.Series(members).groupby(codes[members])
+        for code in largest:
+            rows = by_group.get_group(code).to_numpy()
+            groups.append({
+                'count': int(counts[code]),
+                'rows': [int(row) for row in rows[:sample_rows]]
+            })
+    return {
+        'total_rows': int(len(hashes)),
+        'duplicate_rows': int(counts[repeated].sum() - len(repeated)),
+        'duplicate_groups': int(len(repeated)),
+        'largest_groups': groups
+    }
@@ -1,23 +1,61 @@
-import google.generativeai as genai
+import os
 import json
+import time
+import hashlib
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from config import Config
+from cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MODEL_SUGGESTIONS = [
+    'Random Forest',
+    'Linear Regression',
+    'Decision Tree',
+    'K-Nearest Neighbors',
+    'SVM'
+]
+
+class StubBackend:
+    """Offline backend with canned responses, for tests and local development"""
+    
+    name = 'stub'
+    
+    def generate(self, prompt):
+        if 'JSON array of model names' in prompt:
+            return json.dumps(DEFAULT_MODEL_SUGGESTIONS)
+        return (
+            "**Data cleaning:** check for missing values and duplicate rows.\n\n"
+            "**Models:** start with Random Forest and Linear Regression.\n\n"
+            "**Insight:** look for correlations between the numeric columns."
+        )
+
 class GeminiService:
     """Handle Gemini API interactions for AI-powered insights"""
     
     def __init__(self):
-        if Config.GEMINI_API_KEY:
-            genai.configure(api_key=Config.GEMINI_API_KEY)
+        self.backend = StubBackend() if Config.GEMINI_BACKEND == 'stub' else None
+        if self.backend:
+            self.model = None
+            self.model_name = StubBackend.name
+        elif Config.GEMINI_API_KEY:
             self.model_name = 'gemini-1.5-flash'  # Default model
             self.model = None
-            # Try to initialize model (will be lazy-loaded)
+            # The SDK is imported and configured when the model is first needed
         else:
             self.model = None
             self.model_name = None
             logger.warning("Gemini API key not configured")
+        
+        # Prompt-hash response cache: in-memory LRU backed by JSON files on disk
+        self._cache = TTLCache(maxsize=Config.LLM_CACHE_SIZE, ttl=Config.LLM_CACHE_TTL)
+        self._cache_folder = Config.LLM_CACHE_FOLDER
+        # Identical prompts in flight share one call
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=Config.LLM_MAX_CONCURRENCY, thread_name_prefix='gemini')
     
     def _get_model(self):
         """Lazy load model with fallback"""
@@ -26,6 +64,9 @@ class GeminiService:
         if self.model:
             return self.model
         
+        import google.generativeai as genai
+        genai.configure(api_key=Config.GEMINI_API_KEY)
+        
         # Try different model names
         model_names = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
         for model_name in model_names:
@@ -40,15 +81,99 @@ class GeminiService:
         logger.warning("Could not initialize any Gemini model")
         return None
     
-    def get_data_insights(self, dataset_summary):
-        """Get AI insights about dataset"""
-        model = self._get_model()
-        if not model:
+    def is_available(self):
+        return self.backend is not None or self._get_model() is not None
+    
+    def _call_backend(self, prompt):
+        if self.backend:
+            return self.backend.generate(prompt)
+        return self._get_model().generate_content(prompt).text
+    
+    def _prompt_key(self, prompt):
+        return hashlib.sha256(f"{self.model_name}\n{prompt}".encode('utf-8')).hexdigest()
+    
+    def _read_disk_cache(self, key):
+        path = os.path.join(self._cache_folder, f"{key}.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('created_at', 0) > Config.LLM_CACHE_TTL:
+            return None
+        return entry.get('text')
+    
+    def _write_disk_cache(self, key, text):
+        try:
+            os.makedirs(self._cache_folder, exist_ok=True)
+            path = os.path.join(self._cache_folder, f"{key}.json")
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'created_at': time.time(), 'model': self.model_name, 'text': text}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not persist LLM response cache: {e}")
+    
+    def _on_call_done(self, key, future):
+        # Cached before the call stops being in flight, so no caller in between starts it again
+        if future.exception() is None and future.result():
+            self._cache.set(key, future.result())
+            self._write_disk_cache(key, future.result())
+        with self._lock:
+            self._inflight.pop(key, None)
+    
+    def generate(self, prompt, timeout=None):
+        """Generate text for a prompt through the cache.
+        
+        Concurrent identical prompts are coalesced into one backend call.
+        Returns None when the call does not finish within the timeout; the
+        call keeps running and its result is cached for the next request.
+        """
+        key = self._prompt_key(prompt)
+        text = self._cache.get(key)
+        if text is None:
+            text = self._read_disk_cache(key)
+            if text is not None:
+                self._cache.set(key, text)
+        if text is not None:
+            return text
+        
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                # A call that finished since the cache was checked
+                text = self._cache.get(key)
+                if text is not None:
+                    return text
+                future = self._executor.submit(self._call_backend, prompt)
+                self._inflight[key] = future
+        if leader:
+            # Registered outside the lock: the callback runs inline if the call already finished
+            future.add_done_callback(lambda f: self._on_call_done(key, f))
+        
+        try:
+            return future.result(timeout=timeout or Config.GEMINI_TIMEOUT)
+        except FuturesTimeoutError:
+            logger.warning(f"Gemini call timed out after {timeout or Config.GEMINI_TIMEOUT}s")
+            return None
+    
+    def get_data_insights(self, dataset_summary, timeout=None, raise_errors=False):
+        """Get AI insights about dataset.
+        
+        By default a placeholder message is returned when Gemini is not
+        configured, times out or fails; with raise_errors=True these raise
+        (RuntimeError, TimeoutError, the API error) so callers can record
+        the failure instead of storing the message as insights.
+        """
+        if not self.is_available():
+            if raise_errors:
+                raise RuntimeError("AI insights unavailable. Please configure GEMINI_API_KEY.")
             return "AI insights unavailable. Please configure GEMINI_API_KEY."
         
         try:
             prompt = f"""
-            You are an expert Data Scientist. 
+            You are an expert Data Scientist.
             Analyze the following dataset summary:
             {dataset_summary}
             
@@ -60,24 +185,23 @@ class GeminiService:
             Format as markdown.
             """
             
-            response = model.generate_content(prompt)
-            return response.text
-            
+            text = self.generate(prompt, timeout=timeout)
+            if text is None:
+                if raise_errors:
+                    raise TimeoutError(f"AI insights timed out after {timeout or Config.GEMINI_TIMEOUT}s")
+                return "AI insights are taking longer than expected. Please try again shortly."
+            return text
+        
         except Exception as e:
             logger.error(f"Gemini API error: {e}")
+            if raise_errors:
+                raise
             return f"Error generating insights: {str(e)}. Please check your API key and model availability."
     
     def suggest_models(self, dataset_summary):
         """Suggest suitable ML models for dataset"""
-        model = self._get_model()
-        if not model:
-            return [
-                'Random Forest',
-                'Linear Regression',
-                'Decision Tree',
-                'K-Nearest Neighbors',
-                'SVM'
-            ]
+        if not self.is_available():
+            return list(DEFAULT_MODEL_SUGGESTIONS)
         
         try:
             prompt = f"""
@@ -89,8 +213,10 @@ class GeminiService:
             No explanations, just the JSON array.
             """
             
-            response = model.generate_content(prompt)
-            text = response.text.strip()
+            text = self.generate(prompt)
+            if text is None:
+                return list(DEFAULT_MODEL_SUGGESTIONS)
+            text = text.strip()
             
             # Clean markdown if present
             text = text.replace('```json', '').replace('```', '').strip()
@@ -103,20 +229,8 @@ class GeminiService:
                 pass
             
             # Fallback to default models
-            return [
-                'Random Forest',
-                'Linear Regression',
-                'Decision Tree',
-                'K-Nearest Neighbors',
-                'SVM'
-            ]
-            
+            return list(DEFAULT_MODEL_SUGGESTIONS)
+        
         except Exception as e:
             logger.error(f"Gemini API error: {e}")
-            return [
-                'Random Forest',
-                'Linear Regression',
-                'Decision Tree',
-                'K-Nearest Neighbors',
-                'SVM'
-            ]
\ No newline at end of file
+            return list(DEFAULT_MODEL_SUGGESTIONS)
@@ -0,0 +1,44 @@
+"""
+Gunicorn settings for production serving:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Set WORKER_CLASS=gevent for the async serving mode: each worker multiplexes
+thousands of connections (polling, SSE, predictions) on greenlets, MySQL and
+HTTP calls yield instead of pinning a thread, and CPU-bound stages run in the
+CPU_WORKERS process pool so they never block the event loop.
+
+With threaded workers the app is preloaded in the master and sklearn is
+imported there before fork (PRELOAD_APP=0 disables this), so workers start
+instantly and share those pages copy-on-write. gevent workers import the app
+themselves, after monkey-patching. After the imports the master loads the
+most-used models and their datasets' feature matrices (warmup.py).
+"""
+import os
+
+bind = os.environ.get('BIND') or '0.0.0.0:5000'
+workers = int(os.environ.get('WEB_CONCURRENCY') or 2)
+worker_class = os.environ.get('WORKER_CLASS') or 'gthread'
+threads = int(os.environ.get('WORKER_THREADS') or 8)  # gthread workers
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS') or 2000)  # gevent workers
+timeout = int(os.environ.get('WORKER_TIMEOUT') or 300)  # Training requests can be slow
+
+# Import the app (and, in when_ready, the ML stack) once in the master before forking workers
+preload_app = (os.environ.get('PRELOAD_APP') or '1') == '1' and worker_class != 'gevent'
+
+def when_ready(server):
+    if preload_app:
+        import ml_processor
+        ml_processor.preload()
+        server.log.info("Preloaded ML modules before forking workers")
+        
+        # Most-used models and their feature matrices, shared copy-on-write (WARMUP_MODELS=0 disables)
+        import app
+        import warmup
+        report = warmup.warmup(app.db, app.ml_processor)
+        server.log.info(f"Warmed up {report['models']} models and {report['datasets']} feature matrices")
+
+def worker_exit(server, worker):
+    # Write out buffered prediction rows before the worker goes away
+    import app
+    app.prediction_log.close()
@@ -0,0 +1,286 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import cProfile
+from contextlib import contextmanager
+from datetime import datetime
+from config import Config
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Latency histogram buckets in seconds (requests and stages share them)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Finer buckets for single predictions, which mostly take a few milliseconds
+PREDICTION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class Histogram:
+    """Cumulative Prometheus-style histogram keyed by a tuple of label values"""
+    
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._series = {}
+    
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series['counts'][i] += 1
+        series['sum'] += value
+        series['count'] += 1
+    
+    def items(self):
+        return self._series.items()
+    
+    def quantile(self, labels, q):
+        """Upper bucket bound below which a share q of the observations fall (None when above every bucket or empty)"""
+        series = self._series.get(labels)
+        if not series or not series['count']:
+            return None
+        for bound, count in zip(self.buckets, series['counts']):
+            if count >= q * series['count']:
+                return bound
+        return None
+
+class MetricsRegistry:
+    """Per-process request and stage metrics, rendered in the Prometheus text format"""
+    
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._lock = threading.Lock()
+        self.request_latency = Histogram(buckets)
+        self.stage_latency = Histogram(buckets)
+        self.stage_rows = {}
+        self.stage_peak_rss = {}
+        self.prediction_latency = Histogram(PREDICTION_BUCKETS)
+        self.prediction_errors = {}
+    
+    def observe_request(self, route, method, status, seconds):
+        with self._lock:
+            self.request_latency.observe((route, method, str(status)), seconds)
+    
+    def observe_stage(self, stage, seconds, rows=None, peak_rss=None):
+        with self._lock:
+            self.stage_latency.observe((stage,), seconds)
+            if rows:
+                self.stage_rows[stage] = self.stage_rows.get(stage, 0) + rows
+            if peak_rss:
+                self.stage_peak_rss[stage] = max(self.stage_peak_rss.get(stage, 0), peak_rss)
+    
+    def observe_prediction(self, model_id, alias, seconds, error=False):
+        """Count a prediction of a model version, served directly or through an alias ('' when direct)"""
+        labels = (str(model_id), alias or '')
+        with self._lock:
+            if error:
+                self.prediction_errors[labels] = self.prediction_errors.get(labels, 0) + 1
+            else:
+                self.prediction_latency.observe(labels, seconds)
+    
+    def prediction_stats(self, model_id):
+        """Predictions, errors, mean and p95 latency of a model version in this process, per alias"""
+        stats = {}
+        with self._lock:
+            for (labeled_id, alias), series in self.prediction_latency.items():
+                if labeled_id != str(model_id):
+                    continue
+                stats[alias or 'direct'] = {
+                    'predictions': series['count'],
+                    'errors': self.prediction_errors.get((labeled_id, alias), 0),
+                    'mean_ms': round(series['sum'] / series['count'] * 1000, 3) if series['count'] else None,
+                    'p95_ms': _milliseconds(self.prediction_latency.quantile((labeled_id, alias), 0.95))
+                }
+            for (labeled_id, alias), errors in self.prediction_errors.items():
+                if labeled_id == str(model_id) and (alias or 'direct') not in stats:
+                    stats[alias or 'direct'] = {'predictions': 0, 'errors': errors, 'mean_ms': None, 'p95_ms': None}
+        return stats
+    
+    def render(self):
+        """Prometheus text exposition of every metric"""
+        lines = []
+        with self._lock:
+            lines += _render_histogram(
+                'dataflow_request_duration_seconds', 'HTTP request latency by route',
+                ('route', 'method', 'status'), self.request_latency
+            )
+            lines += _render_histogram(
+                'dataflow_stage_duration_seconds', 'Pipeline stage latency',
+                ('stage',), self.stage_latency
+            )
+            lines.append('# HELP dataflow_stage_rows_total Rows processed per stage (divide by duration sum for rows/sec)')
+            lines.append('# TYPE dataflow_stage_rows_total counter')
+            for stage, rows in sorted(self.stage_rows.items()):
+                lines.append(f"dataflow_stage_rows_total{{stage=\"{_escape(stage)}\"}} {rows}")
+            lines.append('# HELP dataflow_stage_peak_rss_bytes Process peak RSS observed at the end of a stage')
+            lines.append('# TYPE dataflow_stage_peak_rss_bytes gauge')
+            for stage, peak in sorted(self.stage_peak_rss.items()):
+                lines.append(f"dataflow_stage_peak_rss_bytes{{stage=\"{_escape(stage)}\"}} {peak}")
+            lines += _render_histogram(
+                'dataflow_prediction_duration_seconds', 'Prediction latency by model version and alias',
+                ('model_id', 'alias'), self.prediction_latency
+            )
+            lines.append('# HELP dataflow_prediction_errors_total Failed predictions by model version and alias')
+            lines.append('# TYPE dataflow_prediction_errors_total counter')
+            for (model_id, alias), errors in sorted(self.prediction_errors.items()):
+                lines.append(f"dataflow_prediction_errors_total{{model_id=\"{model_id}\",alias=\"{_escape(alias)}\"}} {errors}")
+        peak = peak_rss_bytes()
+        if peak is not None:
+            lines.append('# HELP dataflow_process_peak_rss_bytes Process peak RSS')
+            lines.append('# TYPE dataflow_process_peak_rss_bytes gauge')
+            lines.append(f"dataflow_process_peak_rss_bytes{{pid=\"{os.getpid()}\"}} {peak}")
+        return '\n'.join(lines) + '\n'
+
+def _milliseconds(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _render_histogram(name, help_text, label_names, histogram):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, series in sorted(histogram.items()):
+        label_str = ','.join(f'{key}="{_escape(value)}"' for key, value in zip(label_names, labels))
+        for bound, count in zip(histogram.buckets, series['counts']):
+            lines.append(f'{name}_bucket{{{label_str},le="{bound}"}} {count}')
+        lines.append(f'{name}_bucket{{{label_str},le="+Inf"}} {series["count"]}')
+        lines.append(f"{name}_sum{{{label_str}}} {series['sum']:.6f}")
+        lines.append(f"{name}_count{{{label_str}}} {series['count']}")
+    return lines
+
+# Global metrics registry
+metrics = MetricsRegistry()
+
+_local = threading.local()
+
+def _request_spans():
+    """Span list of the current Flask request, or None outside a request"""
+    try:
+        from flask import g, has_request_context
+    except ImportError:
+        return None
+    if not has_request_context():
+        return None
+    if 'spans' not in g:
+        g.spans = []
+    return g.spans
+
+def record_span(entry):
+    """Record a finished span in the registry, the current request and any active capture"""
+    metrics.observe_stage(entry['stage'], entry['seconds'], entry.get('rows'), entry.get('peak_rss'))
+    spans = _request_spans()
+    if spans is not None:
+        spans.append(entry)
+    captured = getattr(_local, 'captured', None)
+    if captured is not None:
+        captured.append(entry)
+
+@contextmanager
+def span(stage, rows=None):
+    """Time a block as a named pipeline stage.
+    
+    The yielded dict may be updated with 'rows' once the row count is known.
+    """
+    info = {'rows': rows}
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        seconds = time.perf_counter() - start
+        entry = {
+            'stage': stage,
+            'seconds': round(seconds, 6),
+            'rows': info.get('rows'),
+            'rows_per_s': round(info['rows'] / seconds, 1) if info.get('rows') and seconds > 0 else None,
+            'peak_rss': peak_rss_bytes()
+        }
+        record_span(entry)
+        logger.debug(json.dumps({'event': 'span', **entry}))
+
+def call_with_spans(fn, *args, **kwargs):
+    """Run fn (in a pool worker) and return its result along with the spans it recorded"""
+    _local.captured = []
+    try:
+        result = fn(*args, **kwargs)
+        return result, _local.captured
+    finally:
+        _local.captured = None
+
+def server_timing(spans):
+    """Server-Timing header value for a list of spans"""
+    return ', '.join(f"{entry['stage']};dur={entry['seconds'] * 1000:.1f}" for entry in spans)
+
+# cProfile hooks the whole interpreter and refuses a second active profiler,
+# so one request per process is profiled at a time
+_profiling = threading.Lock()
+
+class RequestProfiler:
+    """Per-request profiler: cProfile by default, pyinstrument when requested and installed"""
+    
+    def __init__(self, kind='cprofile'):
+        self.kind = kind
+        self._profiler = None
+        if kind == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+                self._profiler = Profiler()
+            except ImportError:
+                self.kind = 'cprofile'
+        if self._profiler is None:
+            self._profiler = cProfile.Profile()
+    
+    def start(self):
+        """Start profiling; returns None, without profiling, while another request is being profiled"""
+        if not _profiling.acquire(blocking=False):
+            return None
+        try:
+            if self.kind == 'pyinstrument':
+                self._profiler.start()
+            else:
+                self._profiler.enable()
+        except Exception:
+            _profiling.release()
+            raise
+        return self
+    
+    def _disable(self):
+        try:
+            if self.kind == 'pyinstrument':
+                self._profiler.stop()
+            else:
+                self._profiler.disable()
+        finally:
+            _profiling.release()
+    
+    def stop(self, name):
+        """Stop profiling and write the dump to PROFILE_FOLDER; returns the file name"""
+        self._disable()
+        os.makedirs(Config.PROFILE_FOLDER, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        safe_name = ''.join(c if c.isalnum() else '_' for c in name).strip('_') or 'request'
+        if self.kind == 'pyinstrument':
+            filename = f"{timestamp}_{safe_name}.html"
+            with open(os.path.join(Config.PROFILE_FOLDER, filename), 'w', encoding='utf-8') as f:
+                f.write(self._profiler.output_html())
+        else:
+            filename = f"{timestamp}_{safe_name}.prof"
+            self._profiler.dump_stats(os.path.join(Config.PROFILE_FOLDER, filename))
+        return filename
+    
+    def cancel(self):
+        """Stop profiling without writing a dump (the request failed before its response)"""
+        self._disable()
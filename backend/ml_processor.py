@@ -1,52 +1,208 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
-from sklearn.linear_model import LinearRegression, LogisticRegression
-from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
-from sklearn.neighbors import KNeighborsClassifier, KNeighborsRegressor
-from sklearn.svm import SVC, SVR
-from sklearn.metrics import (
-    accuracy_score, precision_score, recall_score, f1_score,
-    r2_score, mean_squared_error, mean_absolute_error,
-    classification_report, confusion_matrix
-)
-import joblib
 import os
 import logging
+import importlib
 from datetime import datetime
 from config import Config
+from dataset_store import dataset_store
+from metrics import span
+from cache import TTLCache
+from shared_features import shared_features, feature_key
+from encoding import FeatureEncoder
+from model_artifacts import save_artifact, load_artifact, compact_model, compression_for, export_model
+from tree_inference import compile_model
 
 logger = logging.getLogger(__name__)
 
+# Estimators as (module, class, parameters); sklearn is only imported when a model is first built
+MODEL_SPECS = {
+    'Random Forest': {
+        'classifier': ('sklearn.ensemble', 'RandomForestClassifier', {'n_estimators': 100, 'random_state': 42}),
+        'regressor': ('sklearn.ensemble', 'RandomForestRegressor', {'n_estimators': 100, 'random_state': 42})
+    },
+    'Linear Regression': {
+        'regressor': ('sklearn.linear_model', 'LinearRegression', {})
+    },
+    'Logistic Regression': {
+        'classifier': ('sklearn.linear_model', 'LogisticRegression', {'random_state': 42, 'max_iter': 1000})
+    },
+    'Decision Tree': {
+        'classifier': ('sklearn.tree', 'DecisionTreeClassifier', {'random_state': 42}),
+        'regressor': ('sklearn.tree', 'DecisionTreeRegressor', {'random_state': 42})
+    },
+    'K-Nearest Neighbors': {
+        'classifier': ('sklearn.neighbors', 'KNeighborsClassifier', {'n_neighbors': 5}),
+        'regressor': ('sklearn.neighbors', 'KNeighborsRegressor', {'n_neighbors': 5})
+    },
+    'SGD': {
+        'classifier': ('sklearn.linear_model', 'SGDClassifier', {'loss': 'log_loss', 'random_state': 42}),
+        'regressor': ('sklearn.linear_model', 'SGDRegressor', {'random_state': 42})
+    },
+    'SVM': {
+        'classifier': ('sklearn.svm', 'SVC', {'random_state': 42, 'probability': True}),
+        'regressor': ('sklearn.svm', 'SVR', {})
+    }
+}
+
+# Modules used by training and prediction besides the estimators themselves
+SUPPORT_MODULES = ['sklearn.model_selection', 'sklearn.metrics', 'sklearn.preprocessing', 'joblib']
+
+def build_estimator(spec):
+    """Import and instantiate an estimator from a MODEL_SPECS entry"""
+    module, class_name, params = spec
+    return getattr(importlib.import_module(module), class_name)(**params)
+
+def preload():
+    """Import every estimator and support module up front.
+    
+    Called in the gunicorn master before fork (see gunicorn.conf.py) so that
+    workers share the imported modules instead of each importing on first use.
+    """
+    modules = {spec[0] for specs in MODEL_SPECS.values() for spec in specs.values()}
+    for module in sorted(modules) + SUPPORT_MODULES:
+        importlib.import_module(module)
+
+def encoder_path(model_path):
+    """Path of the feature encoder saved next to a model file"""
+    return f"{os.path.splitext(model_path)[0]}.encoder.pkl"
+
 class MLProcessor:
     """Handle ML model training, prediction, and evaluation"""
     
     def __init__(self):
-        self.model_map = {
-            'Random Forest': {
-                'classifier': RandomForestClassifier(n_estimators=100, random_state=42),
-                'regressor': RandomForestRegressor(n_estimators=100, random_state=42)
-            },
-            'Linear Regression': {
-                'regressor': LinearRegression()
-            },
-            'Logistic Regression': {
-                'classifier': LogisticRegression(random_state=42, max_iter=1000)
-            },
-            'Decision Tree': {
-                'classifier': DecisionTreeClassifier(random_state=42),
-                'regressor': DecisionTreeRegressor(random_state=42)
-            },
-            'K-Nearest Neighbors': {
-                'classifier': KNeighborsClassifier(n_neighbors=5),
-                'regressor': KNeighborsRegressor(n_neighbors=5)
-            },
-            'SVM': {
-                'classifier': SVC(random_state=42, probability=True),
-                'regressor': SVR()
-            }
-        }
+        self.model_map = MODEL_SPECS
+        # Loaded models by path; model files are never rewritten, so entries never go stale
+        self._models = TTLCache(maxsize=Config.MODEL_CACHE_SIZE)
+    
+    def load_model(self, model_path):
+        """Load a trained model, reusing it across predictions"""
+        model = self._models.get(model_path)
+        if model is None:
+            with span('ml.model_load'):
+                model = load_artifact(model_path)
+            self._models.set(model_path, model)
+        return model
+    
+    def load_encoder(self, model_path):
+        """The feature encoder saved with a model, or None for models trained before encoders were saved"""
+        key = ('encoder', model_path)
+        encoder = self._models.get(key)
+        if encoder is None:
+            path = encoder_path(model_path)
+            encoder = False
+            if os.path.exists(path):
+                with span('ml.model_load'):
+                    encoder = load_artifact(path)
+            self._models.set(key, encoder)
+        return encoder or None
+    
+    def compiled_model(self, model_path):
+        """The model flattened for NumPy inference (see tree_inference.py), or None for other models or with TREE_INFERENCE=sklearn"""
+        if Config.TREE_INFERENCE != 'compiled':
+            return None
+        key = ('compiled', model_path)
+        compiled = self._models.get(key)
+        if compiled is None:
+            with span('ml.compile'):
+                compiled = compile_model(self.load_model(model_path)) or False
+            self._models.set(key, compiled)
+        return compiled or None
+    
+    def infer(self, model_path, X):
+        """Predictions and class probabilities (None for regressors) of encoded feature rows.
+        
+        Random forests are evaluated by their compiled form for up to
+        TREE_INFERENCE_MAX_ROWS rows, where it beats sklearn's per-call
+        overhead; larger batches go through sklearn. Both give the same results.
+        """
+        compiled = self.compiled_model(model_path)
+        if compiled is not None and X.shape[0] <= Config.TREE_INFERENCE_MAX_ROWS:
+            X = X.toarray() if hasattr(X, 'toarray') else X
+            if compiled.classes_ is None:
+                return compiled.predict(X), None
+            proba = compiled.predict_proba(X)
+            return compiled.classes_.take(np.argmax(proba, axis=1), axis=0), proba
+        model = self.load_model(model_path)
+        proba = model.predict_proba(X) if hasattr(model, 'predict_proba') else None
+        return model.predict(X), proba
+    
+    def discard_model(self, model_path):
+        """Remove a saved model file and its encoder"""
+        for path in [model_path, encoder_path(model_path)]:
+            if os.path.exists(path):
+                os.remove(path)
+        self._models.pop(model_path)
+        self._models.pop(('encoder', model_path))
+        self._models.pop(('compiled', model_path))
+    
+    def save_model(self, model, model_path, encoder, algorithm=None):
+        """Write a model and its encoder with the algorithm's compression (and MODEL_COMPACT_TREES); returns the model file size"""
+        with span('ml.serialize'):
+            if Config.MODEL_COMPACT_TREES:
+                model = compact_model(model)
+            size = save_artifact(model, model_path, compression_for(algorithm))
+            # Prediction inputs are encoded the same way as the training data
+            save_artifact(encoder, encoder_path(model_path))
+        return size
+    
+    def export_model(self, model_path, fmt):
+        """A saved model in a portable format (skops, onnx) as a BytesIO; raises ValueError"""
+        return export_model(self.load_model(model_path), fmt)
+    
+    def publish_features(self, file_path, headers):
+        """Prepare a dataset's feature matrix and place it in shared memory for training.
+        
+        Returns the published size in bytes, or 0 when the features cannot be
+        shared (non-numeric target, or larger than WARMUP_MAX_FEATURE_MB).
+        """
+        X, y, feature_cols, target_col, encoder = self.encode_features(file_path, headers)
+        # A CSR matrix is shared as its three arrays
+        if encoder.sparse_output:
+            arrays = {'X': X.data, 'X.indices': X.indices, 'X.indptr': X.indptr}
+        else:
+            arrays = {'X': X.to_numpy(dtype=np.float64)}
+        y_values = np.asarray(y)
+        nbytes = sum(array.nbytes for array in arrays.values())
+        if y_values.dtype == object or nbytes > Config.WARMUP_MAX_FEATURE_MB * 1024 * 1024:
+            return 0
+        problem_type = self.detect_problem_type(
+            dataset_store.load(file_path, columns=[target_col]), target_col
+        )
+        key = feature_key(file_path, headers)
+        shared_features.publish(f"{key}:y", y_values)
+        for name in ['X.indices', 'X.indptr']:
+            if name in arrays:
+                shared_features.publish(f"{key}:{name}", arrays[name])
+        shared_features.publish(f"{key}:X", arrays['X'], {
+            'feature_cols': feature_cols,
+            'target_col': target_col,
+            'problem_type': problem_type,
+            'encoder': encoder,
+            'sparse_shape': list(X.shape) if encoder.sparse_output else None
+        })
+        return nbytes + y_values.nbytes
+    
+    def shared_prepared_data(self, file_path, headers):
+        """Prepared (X, y, feature_cols, target_col, problem_type, encoder) from shared memory, or None"""
+        key = feature_key(file_path, headers)
+        X_entry = shared_features.get(f"{key}:X")
+        y_entry = shared_features.get(f"{key}:y")
+        if X_entry is None or y_entry is None:
+            return None
+        X_values, meta = X_entry
+        if getattr(meta['encoder'], 'parts', None) != dataset_store.part_count(file_path):
+            return None  # Rows were appended since the features were published
+        if meta['sparse_shape'] is not None:
+            from scipy import sparse
+            indices = shared_features.get(f"{key}:X.indices")
+            indptr = shared_features.get(f"{key}:X.indptr")
+            if indices is None or indptr is None:
+                return None
+            X = sparse.csr_matrix((X_values, indices[0], indptr[0]), shape=tuple(meta['sparse_shape']), copy=False)
+        else:
+            X = pd.DataFrame(X_values, columns=meta['feature_cols'], copy=False)
+        return X, y_entry[0], meta['feature_cols'], meta['target_col'], meta['problem_type'], meta['encoder']
     
     def detect_problem_type(self, df, target_col):
         """Detect if problem is classification or regression"""
@@ -65,85 +221,81 @@ class MLProcessor:
             else:
                 return 'regression'
     
-    def prepare_data(self, file_path, headers):
+    def prepare_data(self, file_path, headers, filters=None, encoding=None):
         """Prepare data for ML training"""
+        X, y, feature_cols, target_col, _ = self.encode_features(file_path, headers, filters, encoding)
+        return X, y, feature_cols, target_col
+    
+    def encode_features(self, file_path, headers, filters=None, encoding=None):
+        """Load and encode a dataset; returns (X, y, feature_cols, target_col, encoder).
+        
+        All features are written by a FeatureEncoder into one preallocated
+        float64 matrix, which X wraps without copying, or into a SciPy CSR
+        matrix (returned as X itself) when one-hot / hash columns are many.
+        """
         try:
-            df = pd.read_csv(file_path) if file_path.endswith('.csv') else pd.read_excel(file_path)
-            
             # Select last column as target (or user can specify)
             if len(headers) < 2:
                 raise ValueError("Dataset must have at least 2 columns")
             
+            # Only the header columns are used for training; the part count dates the features (see update_model)
+            parts = None if filters else dataset_store.part_count(file_path)
+            df = dataset_store.load(file_path, columns=list(headers), filters=filters,
+                                    part_range=None if filters else (0, parts))
+            
             target_col = headers[-1]  # Use last column as target
             
             # Handle missing values - fill instead of drop to preserve more data
             df = df.dropna(subset=[target_col])  # Only drop rows where target is missing
             
+            # Encode target if categorical (sorted codes, as LabelEncoder assigns them)
+            y = df[target_col]
+            target_classes = None
+            if y.dtype.kind in 'biuf':
+                y = y.to_numpy()
+            else:
+                y, target_classes = pd.factorize(y.astype(str), sort=True)
+                target_classes = list(target_classes)
+            
             # Separate features and target
             feature_cols = [col for col in headers if col != target_col]
-            X_df = df[feature_cols].copy()
-            
-            # Try to convert numeric strings to numbers
-            for col in X_df.columns:
-                if X_df[col].dtype == 'object':
-                    # Try to convert to numeric
-                    numeric_vals = pd.to_numeric(X_df[col], errors='coerce')
-                    if not numeric_vals.isna().all():  # If at least some values are numeric
-                        X_df[col] = numeric_vals
-                        X_df[col] = X_df[col].fillna(X_df[col].median())
-            
-            # Handle categorical features by encoding them
-            from sklearn.preprocessing import LabelEncoder
-            le_dict = {}
-            X_processed = pd.DataFrame(index=X_df.index)
-            
-            for col in X_df.columns:
-                if X_df[col].dtype in [np.number, 'int64', 'float64', np.int64, np.float64]:
-                    # Numeric column - use as is
-                    X_processed[col] = X_df[col].fillna(X_df[col].median())
-                else:
-                    # Categorical column - encode it
-                    le = LabelEncoder()
-                    # Fill NaN with 'Unknown' before encoding
-                    col_filled = X_df[col].fillna('Unknown').astype(str)
-                    X_processed[col] = le.fit_transform(col_filled)
-                    le_dict[col] = le
-            
-            if X_processed.empty or len(X_processed.columns) == 0:
+            if not feature_cols:
                 raise ValueError("No usable features found for training. Please ensure your dataset has numeric or categorical columns.")
             
-            X = X_processed
-            
-            y = df.loc[X.index, target_col].copy()
-            
-            # Handle missing values in target - drop rows with NaN targets
-            valid_mask = y.notna()
-            X = X[valid_mask]
-            y = y[valid_mask]
-            
-            # Encode target if categorical
-            if y.dtype == 'object':
-                from sklearn.preprocessing import LabelEncoder
-                le = LabelEncoder()
-                y = le.fit_transform(y.astype(str))
-            else:
-                # Fill numeric target missing values
-                y = y.fillna(y.median())
-            
-            return X, y, list(X.columns), target_col
+            encoder = FeatureEncoder(**(encoding or {}))
+            matrix = encoder.fit_transform(df[feature_cols], y)
+            encoder.target_classes = target_classes
+            encoder.parts = parts
+            # CSR matrices go to the estimators as they are
+            X = matrix if encoder.sparse_output else pd.DataFrame(matrix, columns=encoder.feature_names, copy=False)
             
+            return X, y, encoder.feature_names, target_col, encoder
+        
         except Exception as e:
             logger.error(f"Error preparing data: {e}")
             raise
     
-    def train_model(self, file_path, headers, model_name, split_ratio, user_id, dataset_id):
+    def train_model(self, file_path, headers, model_name, split_ratio, user_id, dataset_id, filters=None, encoding=None):
         """Train a machine learning model"""
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import (
+            accuracy_score, precision_score, recall_score, f1_score,
+            r2_score, mean_squared_error, mean_absolute_error
+        )
+        
         try:
             # Prepare data
-            X, y, feature_cols, target_col = self.prepare_data(file_path, headers)
-            
-            # Detect problem type
-            problem_type = self.detect_problem_type(pd.read_csv(file_path) if file_path.endswith('.csv') else pd.read_excel(file_path), target_col)
+            # Hot datasets were prepared (with the default encoding) before fork and are shared read-only
+            shared = None if filters or encoding else self.shared_prepared_data(file_path, headers)
+            if shared is not None:
+                X, y, feature_cols, target_col, problem_type, encoder = shared
+            else:
+                with span('ml.prepare') as stage:
+                    X, y, feature_cols, target_col, encoder = self.encode_features(file_path, headers, filters, encoding)
+                    stage['rows'] = X.shape[0]
+                
+                # Detect problem type
+                problem_type = self.detect_problem_type(dataset_store.load(file_path, columns=[target_col], filters=filters), target_col)
             
             # Split data
             test_size = (100 - split_ratio) / 100
@@ -160,18 +312,17 @@ class MLProcessor:
             
             if model_key not in model_config:
                 # If model doesn't support the problem type, use a default
-                if problem_type == 'classification':
-                    model = RandomForestClassifier(n_estimators=100, random_state=42)
-                else:
-                    model = RandomForestRegressor(n_estimators=100, random_state=42)
+                model = build_estimator(MODEL_SPECS['Random Forest'][model_key])
             else:
-                model = model_config[model_key]
+                model = build_estimator(model_config[model_key])
             
             # Train model
-            model.fit(X_train, y_train)
+            with span('ml.fit', rows=X_train.shape[0]):
+                model.fit(X_train, y_train)
             
             # Evaluate
-            y_pred = model.predict(X_test)
+            with span('ml.evaluate', rows=X_test.shape[0]):
+                y_pred = model.predict(X_test)
             
             metrics = {}
             if problem_type == 'classification':
@@ -203,7 +354,7 @@ class MLProcessor:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             model_filename = f"model_{user_id}_{dataset_id}_{model_name.replace(' ', '_')}_{timestamp}.pkl"
             model_path = os.path.join(Config.MODELS_FOLDER, model_filename)
-            joblib.dump(model, model_path)
+            model_size = self.save_model(model, model_path, encoder, model_name)
             
             return {
                 'model_name': model_name,
@@ -212,38 +363,120 @@ class MLProcessor:
                 'accuracy': float(accuracy) * 100 if problem_type == 'classification' else float(accuracy) * 100,
                 'metrics': metrics,
                 'problem_type': problem_type,
-                'feature_count': len(feature_cols)
+                'feature_count': len(feature_cols),
+                'model_size': model_size
             }
-            
+        
         except Exception as e:
             logger.error(f"Error training model: {e}")
             raise
     
+    def update_model(self, model_path, file_path, headers, algorithm=None):
+        """Continue training a model on the rows appended to its dataset since it was trained.
+        
+        Estimators with partial_fit (SGD) take one more pass over the new
+        rows; random forests are warm-started with WARM_START_ESTIMATORS more
+        trees grown on them. The new rows are encoded with the model's fitted
+        encoder, and the model is scored on them before the update
+        (test-then-train). The updated model is saved under a new path.
+        """
+        import copy
+        
+        try:
+            encoder = self.load_encoder(model_path)
+            if encoder is None or getattr(encoder, 'parts', None) is None:
+                raise ValueError("The model does not record which rows it was trained on; retrain it instead")
+            # A copy, so predictions keep using the cached model until the update is saved
+            model = copy.deepcopy(self.load_model(model_path))
+            if hasattr(model, 'partial_fit'):
+                method = 'partial_fit'
+            elif hasattr(model, 'estimators_') and 'warm_start' in model.get_params():
+                method = 'warm_start'
+            else:
+                raise ValueError(f"{type(model).__name__} cannot be updated incrementally; retrain it instead")
+            
+            part_count = dataset_store.part_count(file_path)
+            if part_count <= encoder.parts:
+                return {'model_path': model_path, 'method': method, 'rows': 0}
+            
+            with span('ml.prepare') as stage:
+                target_col = headers[-1]
+                df = dataset_store.load(file_path, columns=list(headers), part_range=(encoder.parts, part_count))
+                df = df.dropna(subset=[target_col])
+                stage['rows'] = len(df)
+                y = df[target_col]
+                if encoder.target_classes is None:
+                    y = y.to_numpy()
+                else:
+                    y = pd.Index(encoder.target_classes).get_indexer(y.astype(str))
+                    if (y < 0).any():
+                        raise ValueError("The new rows have target classes the model has not seen; retrain it instead")
+                X = encoder.transform(df[encoder.columns])
+                if not encoder.sparse_output:
+                    X = pd.DataFrame(X, columns=encoder.feature_names, copy=False)
+            if not len(df):
+                return {'model_path': model_path, 'method': method, 'rows': 0}
+            
+            with span('ml.evaluate', rows=len(df)):
+                score_before = float(model.score(X, y))
+            with span('ml.fit', rows=len(df)):
+                if method == 'partial_fit':
+                    model.partial_fit(X, y)
+                else:
+                    # New trees must see every class, or the forest's classes would no longer line up
+                    if hasattr(model, 'classes_') and not np.array_equal(np.unique(y), model.classes_):
+                        raise ValueError("The new rows do not cover every target class; retrain the model instead")
+                    model.set_params(warm_start=True, n_estimators=model.n_estimators + Config.WARM_START_ESTIMATORS)
+                    model.fit(X, y)
+                    model.set_params(warm_start=False)
+            
+            encoder = copy.copy(encoder)
+            encoder.parts = part_count
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            base = os.path.splitext(os.path.basename(model_path))[0].split('__')[0]
+            updated_path = os.path.join(Config.MODELS_FOLDER, f"{base}__update_{timestamp}.pkl")
+            self.save_model(model, updated_path, encoder, algorithm)
+            
+            return {
+                'model_path': updated_path,
+                'method': method,
+                'rows': len(df),
+                'score_before_update': score_before
+            }
+        
+        except Exception as e:
+            logger.error(f"Error updating model: {e}")
+            raise
+    
     def predict(self, model_path, features, algorithm):
         """Make prediction using trained model"""
         try:
-            # Load model
-            model = joblib.load(model_path)
-            
-            # Convert features to numpy array
-            feature_values = list(features.values())
-            feature_array = np.array(feature_values).reshape(1, -1)
+            encoder = self.load_encoder(model_path)
+            if encoder is not None:
+                feature_array = encoder.transform(pd.DataFrame([features]))
+                if not encoder.sparse_output:
+                    feature_array = pd.DataFrame(feature_array, columns=encoder.feature_names, copy=False)
+            else:
+                # Convert features to numpy array
+                feature_values = list(features.values())
+                feature_array = np.array(feature_values).reshape(1, -1)
             
             # Make prediction
-            prediction = model.predict(feature_array)[0]
-            
-            # Get prediction probabilities if classifier
-            confidence = 0.95  # Default confidence
-            if hasattr(model, 'predict_proba'):
-                proba = model.predict_proba(feature_array)[0]
-                confidence = float(np.max(proba))
+            with span('ml.predict', rows=1):
+                predictions, proba = self.infer(model_path, feature_array)
+                prediction = predictions[0]
+                
+                # Confidence from the prediction probabilities if classifier
+                confidence = 0.95  # Default confidence
+                if proba is not None:
+                    confidence = float(np.max(proba[0]))
             
             return {
                 'prediction': float(prediction) if isinstance(prediction, (np.integer, np.floating)) else str(prediction),
                 'confidence': confidence,
                 'algorithm': algorithm
             }
-            
+        
         except Exception as e:
             logger.error(f"Error making prediction: {e}")
             raise
\ No newline at end of file
@@ -0,0 +1,154 @@
+import io
+import os
+import copy
+from config import Config
+
+# Compressors a model file can be written with (see Config.MODEL_COMPRESSION)
+COMPRESSION_METHODS = ['none', 'zstd', 'lz4', 'zlib', 'lzma']
+
+# zstd is registered by this module; plain joblib.load cannot read files written with it
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Compression of downloads re-written for plain joblib.load
+PORTABLE_COMPRESSION = 'zlib:3'
+
+# Portable export formats for download, with their mimetypes
+EXPORT_FORMATS = {
+    'pkl': 'application/octet-stream',
+    'skops': 'application/octet-stream',
+    'onnx': 'application/octet-stream'
+}
+
+# Node statistics only used while growing a tree or for feature importances, not for predictions
+_TREE_TRAINING_FIELDS = ['impurity', 'n_node_samples', 'weighted_n_node_samples']
+
+_joblib = None
+
+def joblib_module():
+    """joblib, imported on first use and with the zstd compressor registered"""
+    global _joblib
+    if _joblib is None:
+        import joblib
+        from joblib.compressor import CompressorWrapper, register_compressor
+        
+        class ZstdCompressorWrapper(CompressorWrapper):
+            # Frame magic number, by which joblib.load recognizes the file
+            prefix = _ZSTD_MAGIC
+            extension = '.zst'
+            
+            def __init__(self):
+                self.fileobj_factory = None
+            
+            def compressor_file(self, fileobj, compresslevel=None):
+                import zstandard
+                cctx = zstandard.ZstdCompressor(level=compresslevel or 3, threads=-1)
+                return zstandard.open(fileobj, 'wb', cctx=cctx)
+            
+            def decompressor_file(self, fileobj):
+                import zstandard
+                return zstandard.open(fileobj, 'rb')
+        
+        register_compressor('zstd', ZstdCompressorWrapper(), force=True)
+        _joblib = joblib
+    return _joblib
+
+def parse_compression(value):
+    """(method, level) of a 'method[:level]' setting such as 'zstd:3'; raises ValueError"""
+    method, _, level = (value or 'none').strip().lower().partition(':')
+    if method not in COMPRESSION_METHODS:
+        raise ValueError(f"Invalid model compression: {method}. Allowed: {', '.join(COMPRESSION_METHODS)}")
+    if method == 'lz4':
+        try:
+            import lz4  # noqa: F401
+        except ImportError:
+            raise ValueError("lz4 model compression needs the lz4 package")
+    try:
+        level = int(level) if level else None
+    except ValueError:
+        raise ValueError(f"Invalid model compression level: {level}")
+    return method, level
+
+def compression_for(algorithm=None):
+    """The compression setting for models of an algorithm: MODEL_COMPRESSION_BY_ALGORITHM, else MODEL_COMPRESSION"""
+    return Config.MODEL_COMPRESSION_BY_ALGORITHM.get(algorithm) or Config.MODEL_COMPRESSION
+
+def save_artifact(obj, path, compression=None):
+    """Write a model or encoder with joblib, compressed as configured; returns the file size.
+    
+    joblib.load recognizes the compressor from the file header, so files
+    written with any setting (and older uncompressed ones) load alike.
+    """
+    joblib = joblib_module()
+    method, level = parse_compression(compression or Config.MODEL_COMPRESSION)
+    compress = 0 if method == 'none' else (method, 3 if level is None else level)
+    joblib.dump(obj, path, compress=compress)
+    return os.path.getsize(path)
+
+def load_artifact(path):
+    """Load a file written by save_artifact"""
+    return joblib_module().load(path)
+
+def portable_artifact(path):
+    """A saved artifact that plain joblib.load can read: the file path itself, or a zlib re-dump as a BytesIO.
+    
+    Only files written with the zstd compressor, which joblib does not ship,
+    are re-dumped.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(_ZSTD_MAGIC)) != _ZSTD_MAGIC:
+            return path
+    joblib = joblib_module()
+    buffer = io.BytesIO()
+    method, level = parse_compression(PORTABLE_COMPRESSION)
+    joblib.dump(load_artifact(path), buffer, compress=(method, level))
+    buffer.seek(0)
+    return buffer
+
+def compact_model(model):
+    """Copy of a decision tree or tree ensemble without the statistics only training needs.
+    
+    Node impurities and sample counts, and the values of internal nodes,
+    are zeroed. Predictions are unchanged, but the copy no longer reports
+    feature importances. The zeroed arrays then compress to almost nothing.
+    Other models are returned as they are.
+    """
+    estimators = getattr(model, 'estimators_', None)
+    if not hasattr(model, 'tree_') and not (estimators and all(hasattr(tree, 'tree_') for tree in estimators)):
+        return model
+    model = copy.deepcopy(model)
+    for tree in [model] if hasattr(model, 'tree_') else model.estimators_:
+        state = tree.tree_.__getstate__()
+        nodes = state['nodes'].copy()
+        for field in _TREE_TRAINING_FIELDS:
+            nodes[field] = 0
+        values = state['values'].copy()
+        values[nodes['left_child'] != -1] = 0
+        state.update(nodes=nodes, values=values)
+        tree.tree_.__setstate__(state)
+    for attr in ['oob_score_', 'oob_decision_function_', 'oob_prediction_']:
+        if hasattr(model, attr):
+            delattr(model, attr)
+    return model
+
+def export_model(model, fmt):
+    """A model serialized for loading outside this app, as a BytesIO; raises ValueError.
+    
+    'skops' can be loaded without executing arbitrary pickled code
+    (skops.io.load), 'onnx' runs in onnxruntime on float32 inputs in the
+    model's encoded feature order. Each needs its package installed.
+    """
+    if fmt == 'skops':
+        try:
+            import skops.io as sio
+        except ImportError:
+            raise ValueError("skops export needs the skops package")
+        return io.BytesIO(sio.dumps(model))
+    if fmt == 'onnx':
+        try:
+            from skl2onnx import to_onnx
+            from skl2onnx.common.data_types import FloatTensorType
+        except ImportError:
+            raise ValueError("ONNX export needs the skl2onnx package")
+        initial_types = [('input', FloatTensorType([None, model.n_features_in_]))]
+        return io.BytesIO(to_onnx(model, initial_types=initial_types).SerializeToString())
+    raise ValueError(f"Invalid format. Allowed: {', '.join(EXPORT_FORMATS)}")
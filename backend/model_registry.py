@@ -0,0 +1,117 @@
+import json
+import random
+import hashlib
+from config import Config
+from cache import TTLCache
+
+# Names a dataset's model versions can be published under
+MODEL_ALIASES = ['production', 'staging']
+
+MAX_ROUTES = 10
+
+def normalize_routes(options):
+    """Validate the routes of an alias update; raises ValueError.
+    
+    {"model_id": 3} sends all traffic to one version; {"routes": [{"model_id":
+    3, "weight": 90}, {"model_id": 5, "weight": 10}]} splits it in proportion
+    to the weights. Returns a list of {"model_id", "weight"} dicts.
+    """
+    if not isinstance(options, dict):
+        raise ValueError("Expected a JSON object with model_id or routes")
+    if 'model_id' in options:
+        routes = [{'model_id': options['model_id'], 'weight': 1}]
+    else:
+        routes = options.get('routes')
+    if not isinstance(routes, list) or not routes:
+        raise ValueError("routes must be a non-empty list of {\"model_id\", \"weight\"} objects")
+    if len(routes) > MAX_ROUTES:
+        raise ValueError(f"An alias can route to at most {MAX_ROUTES} model versions")
+    
+    normalized = []
+    for route in routes:
+        if not isinstance(route, dict) or set(route) - {'model_id', 'weight'}:
+            raise ValueError("Each route must be an object with model_id and an optional weight")
+        model_id, weight = route.get('model_id'), route.get('weight', 1)
+        if not isinstance(model_id, int) or isinstance(model_id, bool):
+            raise ValueError("Route model_id must be an integer")
+        if not isinstance(weight, (int, float)) or isinstance(weight, bool) or weight <= 0:
+            raise ValueError("Route weight must be a positive number")
+        normalized.append({'model_id': model_id, 'weight': weight})
+    if len({route['model_id'] for route in normalized}) != len(normalized):
+        raise ValueError("Each model version may appear in an alias only once")
+    return normalized
+
+def choose_route(routes, routing_key=None):
+    """Pick a route in proportion to the weights.
+    
+    With a routing key (e.g. a customer id) the choice is a hash of the key,
+    so the same key keeps reaching the same version while the split is
+    unchanged; without one it is random per request.
+    """
+    total = sum(route['weight'] for route in routes)
+    if routing_key is None:
+        point = random.random() * total
+    else:
+        digest = hashlib.blake2b(str(routing_key).encode('utf-8'), digest_size=8).digest()
+        point = int.from_bytes(digest, 'big') / 2 ** 64 * total
+    for route in routes:
+        point -= route['weight']
+        if point < 0:
+            return route
+    return routes[-1]
+
+class ModelRegistry:
+    """Aliases (production, staging) of a dataset's model versions and the traffic split between them.
+    
+    An alias is stored as one row of model_aliases holding its routes as
+    JSON, so changing it is a single-row write. Routes are cached per
+    process for MODEL_ALIAS_TTL seconds; an alias changed in this process
+    replaces its cached routes in one step, so concurrent predictions see
+    either the old or the new split, never a mix. Other processes pick the
+    change up when their entry expires.
+    """
+    
+    def __init__(self, db, ttl=None):
+        self.db = db
+        self._routes = TTLCache(maxsize=Config.QUERY_CACHE_SIZE, ttl=Config.MODEL_ALIAS_TTL if ttl is None else ttl)
+    
+    def routes(self, dataset_id, alias, user_id):
+        """The routes of an alias as a tuple, or None when the alias is not set"""
+        key = (dataset_id, alias, user_id)
+        routes = self._routes.get(key)
+        if routes is None:
+            rows = self.db.execute_query(
+                "SELECT routes FROM model_aliases WHERE dataset_id = %s AND alias = %s AND user_id = %s",
+                (dataset_id, alias, user_id)
+            )
+            routes = tuple(json.loads(rows[0]['routes'])) if rows else ()
+            self._routes.set(key, routes)
+        return routes or None
+    
+    def set_routes(self, dataset_id, alias, user_id, routes):
+        """Point an alias at new routes (see normalize_routes)"""
+        self.db.execute_query(
+            """INSERT INTO model_aliases (dataset_id, alias, user_id, routes)
+               VALUES (%s, %s, %s, %s)
+               ON DUPLICATE KEY UPDATE routes = VALUES(routes), user_id = VALUES(user_id)""",
+            (dataset_id, alias, user_id, json.dumps(routes)),
+            fetch=False
+        )
+        self._routes.set((dataset_id, alias, user_id), tuple(routes))
+    
+    def remove(self, dataset_id, alias, user_id):
+        """Unset an alias"""
+        self.db.execute_query(
+            "DELETE FROM model_aliases WHERE dataset_id = %s AND alias = %s AND user_id = %s",
+            (dataset_id, alias, user_id),
+            fetch=False
+        )
+        self._routes.set((dataset_id, alias, user_id), ())
+    
+    def aliases(self, dataset_id, user_id):
+        """Every alias of a dataset: {alias: {'routes': [...], 'updated_at': ...}}"""
+        rows = self.db.execute_query(
+            "SELECT alias, routes, updated_at FROM model_aliases WHERE dataset_id = %s AND user_id = %s ORDER BY alias",
+            (dataset_id, user_id)
+        )
+        return {row['alias']: {'routes': json.loads(row['routes']), 'updated_at': row['updated_at']} for row in rows}
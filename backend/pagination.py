@@ -0,0 +1,58 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def page_params(args, default_limit=DEFAULT_PAGE_SIZE):
+    """Parse ?limit=&cursor= from request args; raises ValueError on bad input"""
+    try:
+        limit = int(args.get('limit', default_limit))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, MAX_PAGE_SIZE), decode_cursor(args.get('cursor'))
+
+def encode_cursor(row):
+    """Opaque cursor pointing after a row, from its (created_at, id)"""
+    created_at = row['created_at']
+    if isinstance(created_at, datetime):
+        created_at = created_at.strftime('%Y-%m-%d %H:%M:%S')
+    payload = json.dumps([created_at, row['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor, or None for the first page"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S')
+        return created_at, int(row_id)
+    except (binascii.Error, ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+def keyset_condition(alias, cursor):
+    """WHERE fragment and params selecting rows after the cursor in (created_at DESC, id DESC) order.
+
+    Spelled out instead of a row comparison so MySQL uses a range scan on
+    the (user_id, created_at) indexes, whose entries also carry the id.
+    """
+    if cursor is None:
+        return '', ()
+    created_at, row_id = cursor
+    return (
+        f" AND ({alias}.created_at < %s OR ({alias}.created_at = %s AND {alias}.id < %s))",
+        (created_at, created_at, row_id)
+    )
+
+def paginate(rows, limit):
+    """Split the limit + 1 rows of a keyset query into (page, next_cursor)"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,243 @@
+import os
+import glob
+import json
+import time
+import uuid
+import atexit
+import itertools
+import logging
+import threading
+from collections import deque
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class PredictionLog:
+    """Write-behind buffer for rows of the predictions table.
+    
+    Rows are queued in memory and inserted in batches with execute_many by a
+    background thread, when BATCH_SIZE rows are waiting or every FLUSH_SECONDS.
+    The flusher has a connection of its own, so it never holds one of the
+    request pool's connections while inserting.
+    The buffer holds at most MAX_ROWS rows; beyond that the oldest rows are
+    dropped rather than making the predict path wait on MySQL.
+    
+    With a spool path rows are appended to a local file instead of being held
+    in memory. A flush rotates that file aside and deletes it once its rows are
+    committed, so rows of a crashed or failed flush are inserted by the next
+    flush instead of being lost. Each process flushes only its own files; those
+    of dead processes are claimed by a surviving one.
+    """
+    
+    INSERT_QUERY = """INSERT INTO predictions (model_id, user_id, input_features, prediction_result, confidence_score, prediction_uuid)
+                      VALUES (%s, %s, %s, %s, %s, %s)"""
+    
+    def __init__(self, db, batch_size=None, flush_seconds=None, max_rows=None, spool_path=None):
+        self.db = db
+        self.batch_size = batch_size or Config.PREDICTION_LOG_BATCH_SIZE
+        self.flush_seconds = flush_seconds or Config.PREDICTION_LOG_FLUSH_SECONDS
+        self.max_rows = max_rows or Config.PREDICTION_LOG_MAX_ROWS
+        self.spool_path = Config.PREDICTION_LOG_SPOOL if spool_path is None else spool_path
+        self.dropped = 0
+        self._rows = deque()
+        self._spooled = 0
+        self._spool = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._pid = None
+        self._connection = None
+        self._sequence = itertools.count()
+        if self.spool_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+        atexit.register(self.close)
+    
+    def _ensure_started(self):
+        # Started lazily (and again after fork) so gunicorn workers each run their own flusher
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._rows = deque()
+        self._spooled = 0
+        self._spool = None
+        # The parent's connection (if any) must not be used by the forked child
+        self._connection = None
+        if self.spool_path:
+            self._claim_leftovers()
+        self._thread = threading.Thread(target=self._run, name='prediction-log', daemon=True)
+        self._thread.start()
+    
+    def _spool_file(self):
+        return f"{self.spool_path}.{os.getpid()}"
+    
+    def _pending_file(self):
+        return f"{self._spool_file()}.{time.time_ns()}.{next(self._sequence)}.pending"
+    
+    def _rotate_spool(self):
+        """Move this process's live spool file aside as a pending batch"""
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+        if os.path.exists(self._spool_file()):
+            os.replace(self._spool_file(), self._pending_file())
+    
+    def _claim_leftovers(self):
+        """Take over the live and pending spool files of dead processes.
+        
+        Workers share the spool path, so each file is claimed by an atomic
+        rename into this process's name first; a worker that loses the race
+        skips the file, and only claimed files are ever flushed.
+        """
+        prefix = glob.escape(self.spool_path)
+        for path in glob.glob(f"{prefix}.*[0-9]") + glob.glob(f"{prefix}.*.pending"):
+            pid = path[len(self.spool_path) + 1:].split('.', 1)[0]
+            if not pid.isdigit() or int(pid) == os.getpid() or _pid_alive(int(pid)):
+                continue
+            try:
+                os.replace(path, self._pending_file())
+            except FileNotFoundError:
+                continue
+    
+    def append(self, model_id, user_id, features, prediction):
+        """Queue one prediction row and return its prediction id; never blocks on the database.
+        
+        The id is a UUID made here and written with the row, so it can be
+        returned right away and looked up once the row has been flushed.
+        """
+        prediction_id = uuid.uuid4().hex
+        row = (
+            model_id,
+            user_id,
+            json.dumps(features),
+            json.dumps(prediction),
+            prediction.get('confidence', 0),
+            prediction_id
+        )
+        with self._lock:
+            self._ensure_started()
+            if self.spool_path:
+                # Spooled rows live on disk only
+                if self._spool is None:
+                    self._spool = open(self._spool_file(), 'a', encoding='utf-8')
+                self._spool.write(json.dumps(row) + '\n')
+                self._spool.flush()
+                self._spooled += 1
+                queued = self._spooled
+            else:
+                if len(self._rows) >= self.max_rows:
+                    self._rows.popleft()
+                    self.dropped += 1
+                    if self.dropped % 1000 == 1:
+                        logger.warning(f"Prediction log buffer full, dropped {self.dropped} rows so far")
+                self._rows.append(row)
+                queued = len(self._rows)
+            if queued >= self.batch_size:
+                self._wakeup.set()
+        return prediction_id
+    
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Prediction log flush failed: {e}")
+    
+    def flush(self):
+        """Insert every queued row; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = list(self._rows), deque()
+                if self._spooled:
+                    self._rotate_spool()
+                    self._spooled = 0
+            if self.spool_path:
+                self._claim_leftovers()
+                return self._flush_pending()
+            written = 0
+            try:
+                for start in range(0, len(rows), self.batch_size):
+                    batch = rows[start:start + self.batch_size]
+                    self._insert(batch)
+                    written += len(batch)
+            except Exception:
+                self._requeue(rows[written:])
+                raise
+            return written
+    
+    def _flush_pending(self):
+        # The spool files are the source of truth: each is deleted only after its rows are committed
+        written = 0
+        # Only this process's files: other workers flush (or claim) their own
+        for path in sorted(glob.glob(f"{glob.escape(self._spool_file())}.*.pending")):
+            with open(path, 'r', encoding='utf-8') as f:
+                # Rows spooled before prediction ids existed have none
+                rows = [tuple(json.loads(line) + [None])[:6] for line in f if line.strip()]
+            committed = 0
+            try:
+                for start in range(0, len(rows), self.batch_size):
+                    batch = rows[start:start + self.batch_size]
+                    self._insert(batch)
+                    committed += len(batch)
+            except Exception:
+                if committed:
+                    # Keep only the rows that were not committed, so a retry does not duplicate any
+                    _write_rows(path, rows[committed:])
+                raise
+            finally:
+                written += committed
+            os.remove(path)
+        return written
+    
+    def _insert(self, batch):
+        """Insert a batch on the flusher's own connection, reconnecting if it was dropped"""
+        if self._connection is None or not self._connection.is_connected():
+            self._connection = self.db.connect()
+        self.db.execute_many(self.INSERT_QUERY, batch, connection=self._connection)
+    
+    def _requeue(self, rows):
+        """Put rows of a failed flush back in front of the buffer, within the size limit"""
+        with self._lock:
+            merged = list(rows) + list(self._rows)
+            overflow = len(merged) - self.max_rows
+            if overflow > 0:
+                self.dropped += overflow
+                merged = merged[overflow:]
+            self._rows = deque(merged)
+    
+    def stats(self):
+        with self._lock:
+            return {'buffered': len(self._rows) + self._spooled, 'dropped': self.dropped}
+    
+    def close(self):
+        """Stop the flusher and write out everything still queued"""
+        if self._closed or self._pid != os.getpid():
+            return
+        self._closed = True
+        self._wakeup.set()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Could not flush prediction log on shutdown: {e}")
+        if self._connection is not None and self._connection.is_connected():
+            self._connection.close()
+        self._connection = None
+
+def _write_rows(path, rows):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row) + '\n')
+    os.replace(tmp_path, path)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -10,6 +10,9 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Errors raised by schema statements and migrations that were applied before
+ALREADY_APPLIED_ERRORS = ['already exists', 'duplicate key name', 'duplicate column name']
+
 def create_database():
     """Create database if it doesn't exist"""
     try:
@@ -67,7 +70,8 @@ def execute_schema():
                     cursor.execute(statement)
                     connection.commit()
                 except Error as e:
-                    if "already exists" not in str(e).lower():
+                    # Migrations re-run on every setup; ignore the ones already applied
+                    if not any(msg in str(e).lower() for msg in ALREADY_APPLIED_ERRORS):
                         print(f"Warning: {e}")
         
         cursor.close()
@@ -0,0 +1,111 @@
+import os
+import json
+import atexit
+import hashlib
+import logging
+import threading
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+logger = logging.getLogger(__name__)
+
+def feature_key(file_path, headers):
+    """Key of the prepared feature matrix of a dataset for a given header list"""
+    payload = json.dumps([os.path.basename(file_path), list(headers)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def _attach(name):
+    try:
+        # Python 3.13+: attach without registering with the resource tracker
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+class SharedFeatureRegistry:
+    """Read-only numpy arrays in named shared memory.
+    
+    The process that publishes an array owns its segment and unlinks it at
+    exit. Forked workers inherit the mapping; spawned CPU pool workers attach
+    by name from the descriptors passed to their initializer, so hot feature
+    matrices exist once in RAM however many processes read them.
+    """
+    
+    def __init__(self):
+        self._descriptors = {}
+        self._segments = {}
+        self._owner_pid = os.getpid()
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+    
+    def publish(self, key, array, meta=None):
+        """Copy an array into a new shared segment under key"""
+        array = np.ascontiguousarray(array)
+        if array.dtype == object:
+            raise ValueError("Object arrays cannot be placed in shared memory")
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        # Lifetime is managed here, not by the resource tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        with self._lock:
+            self._segments[key] = shm
+            self._descriptors[key] = {
+                'name': shm.name,
+                'shape': list(array.shape),
+                'dtype': array.dtype.str,
+                'meta': meta or {}
+            }
+        return self._descriptors[key]
+    
+    def get(self, key):
+        """Return (read-only array, meta) for key, or None if it was not published"""
+        with self._lock:
+            descriptor = self._descriptors.get(key)
+            if descriptor is None:
+                return None
+            shm = self._segments.get(key)
+            if shm is None:
+                try:
+                    shm = self._segments[key] = _attach(descriptor['name'])
+                except FileNotFoundError:
+                    self._descriptors.pop(key, None)
+                    return None
+        array = np.ndarray(tuple(descriptor['shape']), dtype=np.dtype(descriptor['dtype']), buffer=shm.buf)
+        array.flags.writeable = False
+        return array, descriptor['meta']
+    
+    def descriptors(self):
+        with self._lock:
+            return dict(self._descriptors)
+    
+    def attach_all(self, descriptors):
+        """Adopt the descriptors of another process (CPU pool initializer)"""
+        with self._lock:
+            self._descriptors.update(descriptors or {})
+    
+    def nbytes(self):
+        return sum(int(np.prod(d['shape'])) * np.dtype(d['dtype']).itemsize for d in self.descriptors().values())
+    
+    def close(self):
+        """Detach every segment; the owning process also unlinks them"""
+        with self._lock:
+            segments, self._segments = self._segments, {}
+            owner = os.getpid() == self._owner_pid
+            published = set(self._descriptors) if owner else set()
+        for key, shm in segments.items():
+            try:
+                if key in published:
+                    # unlink() unregisters from the tracker, so register it back first
+                    resource_tracker.register(shm._name, 'shared_memory')
+                    shm.unlink()
+                shm.close()
+            except (OSError, BufferError) as e:
+                logger.debug(f"Could not release shared features {key}: {e}")
+
+# Global registry of hot feature matrices
+shared_features = SharedFeatureRegistry()
+
+def init_worker(descriptors):
+    """ProcessPoolExecutor initializer: make the parent's shared features visible"""
+    shared_features.attach_all(descriptors)
@@ -0,0 +1,45 @@
+import threading
+from background import BackgroundTasks
+
+def test_finished_tasks_are_evicted_after_their_ttl():
+    tasks = BackgroundTasks(max_workers=1, task_ttl=0)
+    tasks.submit('a', lambda: 1).result()
+    assert tasks.status('a') is None
+    assert tasks._tasks == {}
+    tasks.shutdown()
+
+def test_only_the_oldest_finished_tasks_beyond_the_limit_are_evicted():
+    tasks = BackgroundTasks(max_workers=2, task_ttl=3600, max_finished=2)
+    release = threading.Event()
+    running = tasks.submit('running', release.wait)
+    for key in ['a', 'b', 'c']:
+        tasks.submit(key, lambda: None).result()
+    assert tasks.status('a') is None
+    assert tasks.status('b')['status'] == 'completed'
+    assert tasks.status('c')['status'] == 'completed'
+    assert tasks.status('running')['status'] in ['pending', 'running']
+    release.set()
+    running.result()
+    tasks.shutdown()
+
+def test_failed_task_status_is_kept_until_evicted():
+    tasks = BackgroundTasks(max_workers=1, task_ttl=3600)
+    
+    def fail():
+        raise RuntimeError('boom')
+    
+    future = tasks.submit('a', fail)
+    assert isinstance(future.exception(), RuntimeError)
+    assert tasks.status('a')['status'] == 'failed'
+    assert tasks.status('a')['error'] == 'boom'
+    tasks.shutdown()
+
+def test_wait_returns_once_the_task_finishes():
+    tasks = BackgroundTasks(max_workers=1, task_ttl=3600)
+    release = threading.Event()
+    tasks.submit('a', release.wait)
+    assert tasks.wait('a', timeout=0.05)['status'] in ['pending', 'running']
+    release.set()
+    assert tasks.wait('a', timeout=5)['status'] == 'completed'
+    assert tasks.wait('unknown', timeout=5) is None
+    tasks.shutdown()
@@ -0,0 +1,37 @@
+import os
+import sys
+import json
+import subprocess
+from benchmark import compare
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _run_benchmark(*args):
+    command = [
+        sys.executable, 'benchmark.py', '--rows', '300', '--cols', '5', '--repeat', '1', '--no-memory',
+        '--models', 'Random Forest', '--model-compressions', 'zlib:3', '--import-budget', '30', *args
+    ]
+    return subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True, timeout=300)
+
+def test_small_run_times_every_suite_and_compares_with_its_baseline(tmp_path):
+    output = tmp_path / 'bench.json'
+    result = _run_benchmark('--output', str(output))
+    assert result.returncode == 0, result.stderr
+    results = json.loads(output.read_text())['results']
+    for name in ['startup.import_app', 'data.process_cleaning', 'ml.train_model[Random Forest]', 'api.predict']:
+        assert results[name]['min_s'] > 0
+    assert results['startup.import_app']['eager_modules'] == []
+    
+    compared = tmp_path / 'compared.json'
+    result = _run_benchmark('--suite', 'stages', '--baseline', str(output), '--threshold', '100', '--output', str(compared))
+    assert result.returncode == 0, result.stderr
+    assert json.loads(compared.read_text())['comparison']['regressions'] == []
+
+def test_slower_stages_are_reported_as_regressions():
+    baseline = {'results': {'a': {'min_s': 1.0}, 'b': {'min_s': 1.0, 'peak_mb': 10}, 'new': {'min_s': 0}}}
+    current = {'results': {'a': {'min_s': 1.1}, 'b': {'min_s': 1.5, 'peak_mb': 20}, 'new': {'min_s': 1.0}}}
+    report, regressions = compare(current, baseline, threshold=0.2)
+    assert regressions == ['b']
+    assert report['a']['ratio'] == 1.1
+    assert report['b']['memory_ratio'] == 2.0
+    assert 'new' not in report
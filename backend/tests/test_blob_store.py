@@ -0,0 +1,66 @@
+import io
+import os
+import pytest
+import blob_store as blob_store_module
+from blob_store import BlobStore, StorageQuotaExceeded
+from dataset_store import DatasetStore
+
+CSV = b'a,b\n1,x\n2,y\n3,z\n'
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    datasets = DatasetStore(root=str(tmp_path / 'store'))
+    monkeypatch.setattr(blob_store_module, 'dataset_store', datasets)
+    return BlobStore(root=str(tmp_path / 'uploads')), datasets
+
+def _files(root):
+    return sorted(entry.name for entry in os.scandir(root))
+
+def test_quota_only_applies_to_new_content(stores):
+    blobs, _ = stores
+    path, _, size, existed = blobs.save(io.BytesIO(CSV), 'data.csv')
+    assert (size, existed) == (len(CSV), False)
+    # Stored content takes no space, so it is accepted even over the quota
+    assert blobs.save(io.BytesIO(CSV), 'data.csv', max_bytes=1) == (path, os.path.basename(path).split('.')[0], len(CSV), True)
+    with pytest.raises(StorageQuotaExceeded):
+        blobs.save(io.BytesIO(CSV + b'4,w\n'), 'data.csv', max_bytes=len(CSV))
+    assert _files(blobs.root) == [os.path.basename(path)]
+
+def test_fork_links_the_blob_and_its_store_and_discard_unlinks_them(stores):
+    blobs, datasets = stores
+    path = blobs.save(io.BytesIO(CSV), 'data.csv')[0]
+    datasets.convert(path)
+    table = datasets.table_path(path)
+    
+    forked, created = blobs.fork(path, 'dataset-1')
+    assert created
+    assert blobs.fork(path, 'dataset-1') == (forked, False)
+    assert os.stat(path).st_nlink == 2
+    assert os.stat(table).st_nlink == 2
+    assert datasets.load_meta(forked)['source'] == forked
+    assert datasets.load(forked)['a'].tolist() == [1, 2, 3]
+    
+    blobs.discard(forked)
+    assert not os.path.exists(forked)
+    assert not os.path.exists(datasets.store_dir(forked))
+    assert os.stat(path).st_nlink == 1
+    assert os.stat(table).st_nlink == 1
+    assert datasets.load(path)['a'].tolist() == [1, 2, 3]
+
+def test_garbage_collection_keeps_referenced_blobs(stores):
+    blobs, datasets = stores
+    kept = blobs.save(io.BytesIO(CSV), 'data.csv')[0]
+    removed = blobs.save(io.BytesIO(CSV + b'4,w\n'), 'data.csv')[0]
+    datasets.convert(kept)
+    datasets.convert(removed)
+    
+    report = blobs.collect_garbage([kept], grace_seconds=-60)
+    assert report['removed_files'] == 1
+    assert report['freed_bytes'] == len(CSV) + 4
+    assert _files(blobs.root) == [os.path.basename(kept)]
+    assert os.path.isdir(datasets.store_dir(kept))
+    assert not os.path.exists(datasets.store_dir(removed))
+    # Recently saved uploads are kept until the grace period ends
+    recent = blobs.save(io.BytesIO(b'c\n1\n'), 'data.csv')[0]
+    assert blobs.collect_garbage([kept], grace_seconds=3600)['removed_files'] == 0
+    assert os.path.exists(recent)
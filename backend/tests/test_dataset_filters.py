@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+from dataset_store import DatasetStore
+from dataset_filters import normalize_filters, coerce_filters
+
+DATES = ['2024-01-05', '2024-03-01', '2024-07-09']
+
+@pytest.fixture
+def store(tmp_path):
+    return DatasetStore(root=str(tmp_path / 'store'))
+
+@pytest.fixture
+def parquet_upload(tmp_path):
+    timestamps = pd.to_datetime(DATES)
+    df = pd.DataFrame({
+        'ts': timestamps.astype('datetime64[us]'),
+        'ts_utc': timestamps.tz_localize('UTC'),
+        'day': timestamps.date,
+        'x': [1, 2, 3]
+    })
+    path = tmp_path / 'upload.parquet'
+    df.to_parquet(path)
+    return str(path)
+
+@pytest.mark.parametrize('column', ['ts', 'ts_utc', 'day'])
+def test_native_date_columns_compare_with_string_values(store, parquet_upload, column):
+    assert store.load(parquet_upload, filters=[[column, '>=', '2024-02-01']])['x'].tolist() == [2, 3]
+    assert store.load(parquet_upload, filters=[[column, 'in', ['2024-03-01']]])['x'].tolist() == [2]
+
+def test_text_date_columns_compare_as_dates(store, tmp_path):
+    path = tmp_path / 'upload.csv'
+    path.write_text('d,x\n05/01/2024,1\n20/12/2023,2\n15/02/2024,3\n')
+    store.convert(str(path))
+    # As strings '20/12/2023' would sort after '15/02/2024'
+    assert store.load(str(path), filters=[['d', '>=', '2024-01-01']])['x'].tolist() == [1, 3]
+
+def test_invalid_values_raise_value_error(store, parquet_upload):
+    with pytest.raises(ValueError, match='Invalid number'):
+        store.check_filters(parquet_upload, [['x', '>', 'abc']])
+    with pytest.raises(ValueError, match='Invalid date'):
+        store.load(parquet_upload, filters=[['ts', '>', 'not a date']])
+    with pytest.raises(ValueError, match='Unknown filter column'):
+        store.check_filters(parquet_upload, [['missing', '==', 1]])
+
+def test_coerce_filters_casts_to_column_types():
+    filters = normalize_filters([['a', '=', '3'], ['b', 'in', [1, '2.5']], ['c', '==', 7]])
+    coerced = coerce_filters(filters, {'a': 'int64', 'b': 'double', 'c': 'string'})
+    assert coerced == [['a', '==', 3], ['b', 'in', [1.0, 2.5]], ['c', '==', '7']]
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dataset_io import EXPORT_FORMATS, write_dataframe, read_dataframe, read_csv, export_filename, get_file_extension, get_file_type
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        'id': [1, 2, 3],
+        'score': [0.5, np.nan, 2.25],
+        'name': ['a', None, 'c;d'],
+        'flag': [True, False, True]
+    })
+
+@pytest.mark.parametrize('fmt', list(EXPORT_FORMATS))
+def test_exports_read_back_unchanged(tmp_path, frame, fmt):
+    if fmt == 'csv.zst':
+        pytest.importorskip('zstandard')
+    path = tmp_path / f'data.{EXPORT_FORMATS[fmt][0]}'
+    path.write_bytes(write_dataframe(frame, fmt).getvalue())
+    assert get_file_extension(str(path)) == fmt
+    pd.testing.assert_frame_equal(read_dataframe(str(path)), frame, check_dtype=fmt not in ['csv', 'csv.gz', 'csv.zst'])
+    assert read_dataframe(str(path), columns=['id', 'name'])['name'].tolist()[::2] == ['a', 'c;d']
+
+def test_csv_schema_is_reused_without_inference(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('id;when;amount\n1;2024-01-05;1.5\n2;2024-03-01;NA\n')
+    df, schema = read_csv(str(path))
+    assert schema['delimiter'] == ';'
+    assert schema['date_columns'] == ['when']
+    assert df['when'].tolist() == ['2024-01-05', '2024-03-01']
+    again, reused = read_csv(str(path), schema=schema)
+    assert reused is schema
+    pd.testing.assert_frame_equal(again, df)
+
+def test_unknown_export_formats_raise_value_error(frame):
+    with pytest.raises(ValueError):
+        write_dataframe(frame, 'xlsx')
+
+def test_export_names_and_file_types():
+    assert export_filename('sales.csv.gz', 'cleaned', 'parquet') == 'sales_cleaned.parquet'
+    assert get_file_extension('Sales.CSV.ZST') == 'csv.zst'
+    assert [get_file_type(ext) for ext in ['csv.gz', 'arrow', 'parquet']] == ['csv', 'feather', 'parquet']
@@ -0,0 +1,30 @@
+import dataset_store
+from dataset_store import DatasetStore
+
+def test_schema_recording_keeps_metadata_written_during_the_parse(tmp_path, monkeypatch):
+    store = DatasetStore(root=str(tmp_path / 'store'))
+    path = tmp_path / 'upload.csv'
+    path.write_text('a,b\n1,x\n2,y\n')
+    file_path = str(path)
+    read_csv = dataset_store.read_csv
+    
+    def read_while_converting(*args, **kwargs):
+        # Another worker finishes a conversion while this one is parsing
+        store.save_meta(file_path, {'converted_at': 'now', 'parts': ['part-0.parquet']})
+        return read_csv(*args, **kwargs)
+    
+    monkeypatch.setattr(dataset_store, 'read_csv', read_while_converting)
+    assert store._load_csv(file_path)['a'].tolist() == [1, 2]
+    meta = store.load_meta(file_path)
+    assert meta['converted_at'] == 'now'
+    assert meta['parts'] == ['part-0.parquet']
+    assert meta['csv_schema']
+
+def test_store_lock_is_reentrant(tmp_path):
+    store = DatasetStore(root=str(tmp_path / 'store'))
+    file_path = str(tmp_path / 'upload.csv')
+    with store.locked(file_path):
+        with store.locked(file_path):
+            store.save_meta(file_path, {'parts': []})
+        store._record_meta(file_path, 'csv_schema', {'a': 'int64'})
+    assert store.load_meta(file_path) == {'parts': [], 'csv_schema': {'a': 'int64'}}
@@ -0,0 +1,47 @@
+import pandas as pd
+import dataset_io
+from dataset_io import detect_date_formats, parse_dates
+from dataset_store import DatasetStore
+
+def test_formats_are_detected_per_column():
+    df = pd.DataFrame({
+        'iso': ['2024-03-14', '2024-03-15T09:30:00', '2024-12-01 23:59:59'],
+        'day_first': ['14/03/2024', '01/12/2024', '25/06/2023'],
+        'month_first': ['03/14/2024', '12/01/2024', '06/25/2023'],
+        'dotted': ['14.03.2024 09:30', '01.12.2024 00:00', '25.06.2023 18:45'],
+        'written': ['Mar 14, 2024', 'Dec 1, 2024', 'Jun 25, 2023'],
+        'codes': ['A-17', 'B-22', 'C-9'],
+        'text': ['a long free text value', 'that is not a date', 'at all'],
+        'number': [1, 2, 3]
+    })
+    assert detect_date_formats(df) == {
+        'iso': 'ISO8601',
+        'day_first': '%d/%m/%Y',
+        'month_first': '%m/%d/%Y',
+        'dotted': '%d.%m.%Y %H:%M',
+        'written': '%b %d, %Y'
+    }
+
+def test_a_few_unparseable_values_are_tolerated(monkeypatch):
+    monkeypatch.setattr(dataset_io.Config, 'DATE_DETECT_MIN_RATIO', 0.9)
+    values = [f'2024-01-{day:02d}' for day in range(1, 20)] + ['unknown']
+    assert detect_date_formats(pd.DataFrame({'d': values})) == {'d': 'ISO8601'}
+    assert detect_date_formats(pd.DataFrame({'d': values[:5] + ['unknown']})) == {}
+
+def test_parse_dates_uses_the_format():
+    parsed = parse_dates(pd.Series(['01/02/2024', None, 'garbage']), '%d/%m/%Y')
+    assert parsed.iloc[0] == pd.Timestamp('2024-02-01')
+    assert parsed.iloc[1:].isna().all()
+
+def test_formats_are_recorded_at_conversion(tmp_path, monkeypatch):
+    store = DatasetStore(root=str(tmp_path / 'store'))
+    path = tmp_path / 'upload.csv'
+    path.write_text('d,x\n14/03/2024,1\n01/12/2024,2\n')
+    store.convert(str(path))
+    assert store.load_meta(str(path))['date_formats'] == {'d': '%d/%m/%Y'}
+    
+    def fail(*args, **kwargs):
+        raise AssertionError('date formats detected again')
+    
+    monkeypatch.setattr('dataset_store.detect_date_formats', fail)
+    assert store.date_formats(str(path)) == {'d': '%d/%m/%Y'}
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+import data_processor as data_processor_module
+from data_processor import DataProcessor
+from dataset_store import DatasetStore
+from feature_pipeline import normalize_pipeline, pipeline_hash
+
+BASE = 'age,income,city\n30,100,Oslo\n40,,Lima\n50,300,Oslo\n,400,Pune\n35,150,Lima\n45,250,Oslo\n'
+# A missing value, an outlier, a repeat of a base row and a new row
+DELTA = pd.DataFrame({
+    'age': [np.nan, 38.0, 30.0, 41.0],
+    'income': [5000.0, np.nan, 100.0, 220.0],
+    'city': ['Pune', None, 'Oslo', 'Rome']
+})
+PIPELINE = {
+    'encode': {'columns': ['city'], 'method': 'onehot'},
+    'scale': {'columns': ['age', 'income'], 'method': 'minmax'},
+    'bin': {'columns': ['income'], 'bins': 3},
+    'interactions': None
+}
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    store = DatasetStore(root=str(tmp_path / 'store'))
+    monkeypatch.setattr(data_processor_module, 'dataset_store', store)
+    path = tmp_path / 'upload.csv'
+    path.write_text(BASE)
+    store.convert(str(path))
+    return store, str(path)
+
+def _frame(records):
+    return pd.DataFrame(records).reset_index(drop=True)
+
+def test_delta_cleaning_applies_the_first_runs_fill_values_and_bounds(dataset):
+    store, path = dataset
+    processor = DataProcessor()
+    processor.process_cleaning(path)
+    fitted = store.load_fitted(path, 'cleaning')
+    assert fitted['parts'] == 1
+    base = store.load(path)
+    
+    store.append(path, DELTA)
+    report = processor.process_cleaning(path, delta=True)
+    assert report['delta'] == {'from_part': 1, 'to_part': 2}
+    assert report['original_rows'] == len(DELTA)
+    assert report['duplicates_removed'] == 1
+    
+    # A full re-run with the same parameters gives the same rows for the appended part
+    full, _ = processor.clean_dataframe(store.load(path), fitted=fitted)
+    expected = full.loc[full.index >= len(base)].reset_index(drop=True)
+    pd.testing.assert_frame_equal(_frame(report['sample_data']), expected, check_dtype=False)
+    assert expected['age'].iloc[0] == fitted['fill']['age']
+    assert expected['income'].max() == fitted['bounds']['income'][1]
+    
+    refitted = store.load_fitted(path, 'cleaning')
+    assert refitted['parts'] == 2
+    assert refitted['bounds'] == fitted['bounds']
+
+def test_delta_transformation_reuses_the_fitted_pipeline(dataset):
+    store, path = dataset
+    processor = DataProcessor()
+    headers = ['age', 'income', 'city']
+    processor.process_transformation(path, headers, pipeline=PIPELINE)
+    store.append(path, DELTA)
+    report = processor.process_transformation(path, headers, pipeline=PIPELINE, delta=True)
+    assert report['delta'] == {'from_part': 1, 'to_part': 2}
+    
+    fitted = store.load_fitted(path, f"transformation-{pipeline_hash(normalize_pipeline(PIPELINE))}")
+    full, _ = processor.transform_dataframe(store.load(path), headers, PIPELINE, fitted=fitted['steps'])
+    expected = full.iloc[-len(DELTA):].reset_index(drop=True)
+    pd.testing.assert_frame_equal(_frame(report['sample_data']), expected, check_dtype=False)
+    # 'Rome' was not seen by the first run, so it gets no indicator column
+    assert 'city_Rome' not in expected
+    assert expected.loc[3, ['city_Lima', 'city_Oslo', 'city_Pune']].sum() == 0
+
+def test_first_delta_run_processes_every_row(dataset):
+    store, path = dataset
+    report = DataProcessor().process_cleaning(path, delta=True)
+    assert report['delta'] == {'from_part': 0, 'to_part': 1}
+    assert report['original_rows'] == 6
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+from encoding import FeatureEncoder, normalize_encoding, UNKNOWN
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        'x': [1.0, np.nan, 3.0, 4.0],
+        'n': ['1', '2', None, '4'],  # numbers stored as text
+        'c': ['b', 'a', None, 'b']
+    })
+
+def _encoder(strategy, **kwargs):
+    return FeatureEncoder(strategy=strategy, high_cardinality=strategy, max_categories=10, sparse=False, **kwargs)
+
+def test_numeric_columns_are_median_filled(frame):
+    matrix = _encoder('ordinal').fit_transform(frame)
+    assert matrix[:, 0].tolist() == [1.0, 3.0, 3.0, 4.0]
+    assert matrix[:, 1].tolist() == [1.0, 2.0, 2.0, 4.0]
+
+def test_ordinal_uses_sorted_codes_and_marks_unseen_categories(frame):
+    encoder = _encoder('ordinal')
+    matrix = encoder.fit_transform(frame)
+    assert list(encoder.specs['c']['categories']) == [UNKNOWN, 'a', 'b']
+    assert matrix[:, 2].tolist() == [2.0, 1.0, 0.0, 2.0]
+    assert encoder.transform(pd.DataFrame({'x': [1.0], 'n': ['1'], 'c': ['z']}))[0, 2] == -1.0
+
+def test_onehot_leaves_unseen_categories_all_zero(frame):
+    encoder = _encoder('onehot')
+    matrix = encoder.fit_transform(frame)
+    assert encoder.feature_names == ['x', 'n', f'c_{UNKNOWN}', 'c_a', 'c_b']
+    assert matrix[:, 2:].tolist() == [[0, 0, 1], [0, 1, 0], [1, 0, 0], [0, 0, 1]]
+    rows = encoder.transform(pd.DataFrame({'x': [2.0, 2.0], 'n': ['3', '3'], 'c': ['a', 'z']}))
+    assert rows[:, 2:].tolist() == [[0, 1, 0], [0, 0, 0]]
+
+def test_target_encoding_is_smoothed_and_unseen_categories_get_the_prior(frame):
+    y = [1.0, 0.0, 0.0, 1.0]
+    encoder = _encoder('target', smoothing=1.0, folds=2)
+    matrix = encoder.fit_transform(frame, y)
+    # While training each row is encoded from the other fold only
+    assert not np.allclose(matrix[:, 2], encoder.transform(frame)[:, 2])
+    spec = encoder.specs['c']
+    assert spec['prior'] == 0.5
+    # 'b' has targets 1 and 1: (2 + 1 * 0.5) / (2 + 1)
+    assert encoder.transform(pd.DataFrame({'x': [1.0], 'n': ['1'], 'c': ['b']}))[0, 2] == pytest.approx(2.5 / 3)
+    assert encoder.transform(pd.DataFrame({'x': [1.0], 'n': ['1'], 'c': ['z']}))[0, 2] == 0.5
+
+def test_target_encoding_falls_back_to_ordinal_without_a_target(frame):
+    encoder = _encoder('target')
+    encoder.fit_transform(frame)
+    assert encoder.specs['c']['kind'] == 'ordinal'
+
+def test_hash_sets_one_stable_bucket_per_row(frame):
+    encoder = _encoder('hash', hash_buckets=8)
+    matrix = encoder.fit_transform(frame)
+    block = matrix[:, 2:]
+    assert block.shape == (4, 8)
+    assert block.sum(axis=1).tolist() == [1, 1, 1, 1]
+    assert block[0].tolist() == block[3].tolist()
+    np.testing.assert_array_equal(encoder.transform(frame), matrix)
+    unseen = encoder.transform(pd.DataFrame({'x': [1.0], 'n': ['1'], 'c': ['z']}))
+    assert unseen[0, 2:].sum() == 0
+
+def test_high_cardinality_columns_use_the_high_cardinality_encoding():
+    df = pd.DataFrame({'c': [f'v{i}' for i in range(20)]})
+    encoder = FeatureEncoder(strategy='onehot', high_cardinality='hash', max_categories=5, hash_buckets=4, sparse=False)
+    assert encoder.fit_transform(df).shape == (20, 4)
+    assert encoder.specs['c']['kind'] == 'hash'
+
+def test_missing_columns_are_encoded_as_missing(frame):
+    encoder = _encoder('onehot')
+    encoder.fit_transform(frame)
+    row = encoder.transform(pd.DataFrame({'x': [7.0]}))
+    assert row.tolist() == [[7.0, 2.0, 1.0, 0.0, 0.0]]
+
+@pytest.mark.parametrize('options', [
+    {'strategy': 'binary'},
+    {'max_categories': 0},
+    {'hash_buckets': '8'},
+    {'sparse': 'yes'},
+    {'high_cardinality': 'onehot', 'sparse': False},
+    {'unknown': 1}
+])
+def test_invalid_encoding_options_raise_value_error(options):
+    with pytest.raises(ValueError):
+        normalize_encoding(options)
+
+def test_sparse_output_matches_the_dense_matrix(frame):
+    dense = _encoder('onehot')
+    sparse_encoder = FeatureEncoder(strategy='onehot', high_cardinality='onehot', max_categories=10, sparse=True)
+    matrix = sparse_encoder.fit_transform(frame)
+    assert matrix.format == 'csr'
+    np.testing.assert_array_equal(matrix.toarray(), dense.fit_transform(frame))
+    np.testing.assert_array_equal(sparse_encoder.transform(frame).toarray(), dense.transform(frame))
+
+def test_wide_indicator_blocks_are_sparse_by_default(monkeypatch):
+    from config import Config
+    monkeypatch.setattr(Config, 'ENCODING_SPARSE_MIN_COLUMNS', 10)
+    df = pd.DataFrame({'x': np.arange(50.0), 'c': [f'v{i}' for i in range(50)]})
+    encoder = FeatureEncoder(strategy='onehot', high_cardinality='onehot', max_categories=100)
+    matrix = encoder.fit_transform(df)
+    assert encoder.sparse_output
+    assert matrix.shape == (50, 51)
+    # One stored value per row for x (except the 0) and one for its category
+    assert matrix.nnz == 99
+    assert isinstance(FeatureEncoder(strategy='onehot', max_categories=100).fit_transform(df[['x']]), np.ndarray)
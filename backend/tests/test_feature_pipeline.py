@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+from config import Config
+from feature_pipeline import normalize_pipeline, run_pipeline, pipeline_hash, DEFAULT_PIPELINE, STEP_DEFAULTS
+
+SPEC = {
+    'date_parts': {'columns': ['day'], 'parts': ['year', 'month', 'dayofweek'], 'cyclical': ['month']},
+    'encode': {'columns': ['city'], 'method': 'onehot'},
+    'interactions': {'pairs': [['x', 'y']]},
+    'scale': {'columns': ['x', 'y'], 'method': 'standard'},
+    'bin': {'columns': ['x'], 'bins': 3}
+}
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'day': pd.date_range('2024-01-01', periods=60, freq='5D').strftime('%d/%m/%Y'),
+        'city': rng.choice(['Oslo', 'Lima', 'Pune'], 60),
+        'x': rng.normal(size=60),
+        'y': rng.uniform(1, 5, size=60)
+    })
+
+def test_defaults_are_filled_in_and_steps_can_be_switched_off():
+    spec = normalize_pipeline({'bin': {'columns': ['x']}, 'interactions': None}, columns=['x'])
+    assert spec['bin'] == {**STEP_DEFAULTS['bin'], 'columns': ['x']}
+    assert spec['interactions'] is None
+    assert spec['scale'] == {**STEP_DEFAULTS['scale'], **DEFAULT_PIPELINE['scale']}
+    assert pipeline_hash(spec) == pipeline_hash(normalize_pipeline({'interactions': False, 'bin': {'columns': ['x']}}))
+
+@pytest.mark.parametrize('spec', [
+    {'resample': {}},
+    {'scale': {'method': 'robust'}},
+    {'bin': {'bins': 1}},
+    {'encode': {'columns': 'text'}},
+    {'date_parts': {'parts': ['week']}},
+    {'interactions': {'pairs': [['x']]}},
+    {'scale': {'columns': ['missing']}},
+    {'scale': {'columns': ['x'], 'clip': True}},
+    []
+])
+def test_invalid_specs_raise_value_error(spec):
+    with pytest.raises(ValueError):
+        normalize_pipeline(spec, columns=['x', 'y'])
+
+def test_steps_add_their_columns(frame):
+    new, report = run_pipeline(frame, normalize_pipeline(SPEC), date_formats={'day': '%d/%m/%Y'})
+    assert new['day_month'].tolist()[:2] == [1, 1]
+    assert np.allclose(new['day_month_sin'] ** 2 + new['day_month_cos'] ** 2, 1)
+    assert report['encoded_features']['city'] == ['city_Lima', 'city_Oslo', 'city_Pune']
+    assert (new['city_Lima'] + new['city_Oslo'] + new['city_Pune'] == 1).all()
+    assert np.allclose(new['x_x_y'], frame['x'] * frame['y'])
+    assert abs(np.mean(new['x_normalized'])) < 1e-9
+    assert sorted(set(new['x_bin'])) == [0, 1, 2]
+    assert set(report['fitted']) == {'encode', 'scale', 'bin'}
+
+def test_fitted_parameters_transform_a_delta_like_the_full_run(frame):
+    spec = normalize_pipeline(SPEC)
+    formats = {'day': '%d/%m/%Y'}
+    full, report = run_pipeline(frame, spec, date_formats=formats)
+    delta = frame.iloc[45:]
+    # The delta alone has other statistics, but the parameters fitted on all rows are reused
+    refitted, _ = run_pipeline(delta, spec, date_formats=formats)
+    assert not np.allclose(refitted['x_normalized'], np.asarray(full['x_normalized'])[45:])
+    reused, delta_report = run_pipeline(delta, spec, date_formats=formats, fitted=report['fitted'])
+    assert set(reused) == set(full)
+    for name, values in reused.items():
+        np.testing.assert_allclose(np.asarray(values, dtype=np.float64), np.asarray(full[name], dtype=np.float64)[45:])
+    assert delta_report['fitted'] == report['fitted']
+
+def test_unseen_categories_get_no_indicator(frame):
+    spec = normalize_pipeline(SPEC)
+    _, report = run_pipeline(frame, spec, date_formats={'day': '%d/%m/%Y'})
+    rows = frame.iloc[:1].assign(city='Rome')
+    new, _ = run_pipeline(rows, spec, date_formats={'day': '%d/%m/%Y'}, fitted=report['fitted'])
+    assert [new[f'city_{label}'][0] for label in ['Lima', 'Oslo', 'Pune']] == [0, 0, 0]
+
+def test_threaded_and_inline_runs_agree(frame, monkeypatch):
+    spec = normalize_pipeline(SPEC)
+    monkeypatch.setattr(Config, 'FEATURE_THREADS', 4)
+    threaded, _ = run_pipeline(frame, spec, date_formats={'day': '%d/%m/%Y'})
+    monkeypatch.setattr(Config, 'FEATURE_THREADS', 1)
+    inline, _ = run_pipeline(frame, spec, date_formats={'day': '%d/%m/%Y'})
+    assert list(threaded) == list(inline)
+    for name in inline:
+        np.testing.assert_array_equal(np.asarray(threaded[name]), np.asarray(inline[name]))
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from dataset_store import DatasetStore
+from fingerprints import hash_column, hash_rows, hash_batches, duplicate_mask
+
+def test_numbers_hash_by_value_across_dtypes():
+    ints = hash_column(pd.Series([1, 2, 3], dtype='int64'))
+    floats = hash_column(pd.Series([1.0, 2.0, 3.0]))
+    nullable = hash_column(pd.Series([1, 2, 3], dtype='Int64'))
+    assert (ints == floats).all()
+    assert (ints == nullable).all()
+    assert hash_column(pd.Series([1.5]))[0] != hash_column(pd.Series([1]))[0]
+
+def test_missing_values_hash_alike():
+    floats = hash_column(pd.Series([np.nan]))
+    nullable = hash_column(pd.Series([None], dtype='Int64'))
+    text = hash_column(pd.Series([None], dtype=object))
+    assert floats[0] == nullable[0] == text[0]
+
+def test_duplicates_found_across_batches_with_upcast_int_column():
+    # The second batch holds a null, so its int column reads back as float64
+    first = pd.DataFrame({'id': [1, 2, 3], 'name': ['a', 'b', 'c']})
+    second = pd.DataFrame({'id': [2.0, np.nan], 'name': ['b', 'd']})
+    hashes = hash_batches([first, second])
+    assert duplicate_mask(hashes).tolist() == [False, False, False, True, False]
+    assert (hashes == hash_rows(pd.concat([first, second], ignore_index=True))).all()
+
+def test_duplicates_found_across_appended_parts(tmp_path):
+    store = DatasetStore(root=str(tmp_path / 'store'))
+    upload = tmp_path / 'upload.csv'
+    upload.write_text('id,name\n1,a\n2,b\n3,c\n')
+    store.convert(str(upload))
+    
+    # Appended with a null id: the part is an int64 column with nulls, read back as float64
+    store.append(str(upload), pd.DataFrame({'id': pd.Series([3, None], dtype='Int64'), 'name': ['c', 'e']}))
+    hashes = store.row_hashes(str(upload))
+    assert duplicate_mask(hashes).tolist() == [False, False, False, True, False]
+    
+    # Recomputed from the parts, batch by batch, the fingerprints are the same
+    stored = np.array(hashes)
+    for path in (tmp_path / 'store').rglob('*.npy'):
+        path.unlink()
+    assert (store.row_hashes(str(upload)) == stored).all()
@@ -0,0 +1,56 @@
+import threading
+import pytest
+from config import Config
+from gemini_service import GeminiService
+
+class SlowBackend:
+    """Counts calls and answers once released"""
+    
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+    
+    def generate(self, prompt):
+        self.calls += 1
+        self.release.wait(5)
+        return f"answer to {prompt}"
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'GEMINI_BACKEND', 'stub')
+    monkeypatch.setattr(Config, 'LLM_CACHE_FOLDER', str(tmp_path / 'llm'))
+    service = GeminiService()
+    service.backend = SlowBackend()
+    return service
+
+def test_concurrent_identical_prompts_share_one_call(service):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.generate('p', timeout=5))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    service.backend.release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ['answer to p'] * 5
+    assert service.backend.calls == 1
+
+def test_responses_are_cached_in_memory_and_on_disk(service):
+    service.backend.release.set()
+    assert service.generate('p', timeout=5) == 'answer to p'
+    assert service.generate('p', timeout=5) == 'answer to p'
+    assert service.backend.calls == 1
+    
+    restarted = GeminiService()
+    restarted.backend = SlowBackend()
+    assert restarted.generate('p', timeout=5) == 'answer to p'
+    assert restarted.backend.calls == 0
+
+def test_timed_out_calls_keep_running_and_fill_the_cache(service):
+    assert service.generate('p', timeout=0.05) is None
+    with pytest.raises(TimeoutError):
+        service.get_data_insights('summary', timeout=0.05, raise_errors=True)
+    service.backend.release.set()
+    for future in list(service._inflight.values()):
+        future.exception(5)
+    assert service.generate('p', timeout=5) == 'answer to p'
+    assert service.backend.calls == 2
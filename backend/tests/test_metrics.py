@@ -0,0 +1,24 @@
+import os
+from config import Config
+from metrics import RequestProfiler
+
+def test_concurrent_profiles_are_refused_not_raised(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'PROFILE_FOLDER', str(tmp_path))
+    first = RequestProfiler().start()
+    assert first is not None
+    assert RequestProfiler().start() is None
+    filename = first.stop('first')
+    assert os.path.exists(tmp_path / filename)
+    second = RequestProfiler().start()
+    assert second is not None
+    second.cancel()
+
+def test_metrics_require_the_metrics_token(monkeypatch):
+    from app import app
+    monkeypatch.setattr(Config, 'METRICS_TOKEN', 'secret')
+    client = app.test_client()
+    assert client.get('/api/metrics').status_code == 403
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    response = client.get('/api/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert b'dataflow_' in response.data
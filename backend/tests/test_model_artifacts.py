@@ -0,0 +1,36 @@
+import sys
+import subprocess
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from model_artifacts import save_artifact, load_artifact, portable_artifact
+
+def _plain_joblib_load(path):
+    """Predictions of a model loaded by a fresh interpreter with only joblib, none of this app's modules"""
+    code = "import sys, joblib; print(joblib.load(sys.argv[1]).predict([[0.0, 0.0]])[0])"
+    return subprocess.run([sys.executable, '-c', code, str(path)], capture_output=True, text=True, check=True).stdout.strip()
+
+@pytest.fixture
+def model():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(100, 2))
+    return RandomForestClassifier(n_estimators=3, random_state=0).fit(X, (X[:, 0] > 0).astype(int))
+
+def test_default_compression_loads_with_plain_joblib(tmp_path, model):
+    path = tmp_path / 'model.pkl'
+    save_artifact(model, str(path))
+    assert _plain_joblib_load(path) == str(model.predict([[0.0, 0.0]])[0])
+
+@pytest.mark.parametrize('compression', ['none', 'zlib:3', 'zstd:3'])
+def test_round_trip_and_portable_download(tmp_path, model, compression):
+    path = tmp_path / 'model.pkl'
+    save_artifact(model, str(path), compression)
+    assert np.array_equal(load_artifact(str(path)).predict_proba([[0.5, -0.5]]), model.predict_proba([[0.5, -0.5]]))
+    
+    artifact = portable_artifact(str(path))
+    if compression != 'zstd:3':
+        assert artifact == str(path)
+    else:
+        path = tmp_path / 'download.pkl'
+        path.write_bytes(artifact.read())
+    assert _plain_joblib_load(path) == str(model.predict([[0.0, 0.0]])[0])
@@ -0,0 +1,104 @@
+import json
+from collections import Counter
+import pytest
+from mysql.connector import Error, errorcode
+from model_registry import ModelRegistry, normalize_routes, choose_route, MAX_ROUTES
+
+ROUTES = [{'model_id': 3, 'weight': 90}, {'model_id': 5, 'weight': 10}]
+
+class FakeDatabase:
+    """Records queries; SELECTs return the rows queued for them"""
+    
+    def __init__(self, results=()):
+        self.queries = []
+        self.results = list(results)
+    
+    def execute_query(self, query, params=None, fetch=True):
+        self.queries.append((query, params))
+        result = self.results.pop(0) if self.results else []
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+def test_single_model_and_weighted_routes_are_normalized():
+    assert normalize_routes({'model_id': 7}) == [{'model_id': 7, 'weight': 1}]
+    assert normalize_routes({'routes': [{'model_id': 3, 'weight': 90}, {'model_id': 5}]}) == [
+        {'model_id': 3, 'weight': 90}, {'model_id': 5, 'weight': 1}
+    ]
+
+@pytest.mark.parametrize('options', [
+    None,
+    {'routes': []},
+    {'model_id': '3'},
+    {'model_id': True},
+    {'routes': [{'model_id': 3, 'weight': 0}]},
+    {'routes': [{'model_id': 3, 'weight': '1'}]},
+    {'routes': [{'model_id': 3, 'share': 1}]},
+    {'routes': [{'model_id': 3}, {'model_id': 3}]},
+    {'routes': [{'model_id': i} for i in range(MAX_ROUTES + 1)]}
+])
+def test_invalid_routes_raise_value_error(options):
+    with pytest.raises(ValueError):
+        normalize_routes(options)
+
+def test_traffic_is_split_by_weight():
+    counts = Counter(choose_route(ROUTES, routing_key=f'customer-{i}')['model_id'] for i in range(5000))
+    assert 0.87 < counts[3] / 5000 < 0.93
+    counts = Counter(choose_route(ROUTES)['model_id'] for _ in range(5000))
+    assert 0.87 < counts[3] / 5000 < 0.93
+
+def test_routing_keys_are_sticky():
+    chosen = {key: choose_route(ROUTES, routing_key=key)['model_id'] for key in range(200)}
+    assert all(choose_route(ROUTES, routing_key=key)['model_id'] == model_id for key, model_id in chosen.items())
+    assert set(chosen.values()) == {3, 5}
+
+def test_alias_routes_are_cached_and_replaced_on_update():
+    db = FakeDatabase([[{'routes': json.dumps(ROUTES)}]])
+    registry = ModelRegistry(db, ttl=60)
+    assert registry.routes(1, 'production', 9) == tuple(ROUTES)
+    assert registry.routes(1, 'production', 9) == tuple(ROUTES)
+    assert len(db.queries) == 1
+    
+    registry.set_routes(1, 'production', 9, [{'model_id': 5, 'weight': 1}])
+    assert registry.routes(1, 'production', 9) == ({'model_id': 5, 'weight': 1},)
+    registry.remove(1, 'production', 9)
+    assert registry.routes(1, 'production', 9) is None
+    # Only the two writes reached the database after the first read
+    assert len(db.queries) == 3
+
+def test_unset_aliases_are_cached_too():
+    db = FakeDatabase()
+    registry = ModelRegistry(db, ttl=60)
+    assert registry.routes(1, 'staging', 9) is None
+    assert registry.routes(1, 'staging', 9) is None
+    assert len(db.queries) == 1
+
+def _duplicate_version():
+    return Error(msg='Duplicate entry for key uq_dataset_version', errno=errorcode.ER_DUP_ENTRY)
+
+def test_duplicate_versions_are_retried_with_a_new_number(monkeypatch):
+    import app
+    db = FakeDatabase([[{'version': 3}], _duplicate_version(), [{'version': 4}], 42])
+    monkeypatch.setattr(app, 'db', db)
+    assert app.insert_model_version(1, ('params',)) == (42, 4)
+    assert db.queries[1][1] == ('params', 3)
+    assert db.queries[3][1] == ('params', 4)
+
+def test_other_insert_errors_are_not_retried(monkeypatch):
+    import app
+    db = FakeDatabase([[{'version': 1}], Error(msg='Lost connection', errno=errorcode.CR_SERVER_LOST)])
+    monkeypatch.setattr(app, 'db', db)
+    with pytest.raises(Error):
+        app.insert_model_version(1, ('params',))
+    assert len(db.queries) == 2
+
+def test_version_retries_are_bounded(monkeypatch):
+    import app
+    results = []
+    for version in range(app.MODEL_VERSION_ATTEMPTS):
+        results += [[{'version': version + 1}], _duplicate_version()]
+    db = FakeDatabase(results)
+    monkeypatch.setattr(app, 'db', db)
+    with pytest.raises(Error):
+        app.insert_model_version(1, ('params',))
+    assert len(db.queries) == 2 * app.MODEL_VERSION_ATTEMPTS
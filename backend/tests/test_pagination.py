@@ -0,0 +1,46 @@
+import sqlite3
+from datetime import datetime
+import pytest
+from pagination import MAX_PAGE_SIZE, page_params, encode_cursor, decode_cursor, keyset_condition, paginate
+
+@pytest.fixture
+def table():
+    connection = sqlite3.connect(':memory:')
+    connection.row_factory = sqlite3.Row
+    connection.execute("CREATE TABLE datasets (id INTEGER PRIMARY KEY, user_id INTEGER, created_at TEXT)")
+    # Several rows share a timestamp, so pages must break ties by id
+    rows = [(i, 1, f"2024-01-0{1 + i // 3} 12:00:00") for i in range(1, 12)]
+    connection.executemany("INSERT INTO datasets VALUES (?, ?, ?)", rows)
+    return connection
+
+def _page(connection, limit, cursor):
+    condition, params = keyset_condition('d', cursor)
+    query = f"SELECT id, created_at FROM datasets d WHERE d.user_id = 1{condition} ORDER BY d.created_at DESC, d.id DESC LIMIT ?"
+    rows = [dict(row) for row in connection.execute(query.replace('%s', '?'), params + (limit + 1,))]
+    return paginate(rows, limit)
+
+def test_cursor_round_trips():
+    cursor = encode_cursor({'created_at': datetime(2024, 3, 1, 9, 30, 5), 'id': 42})
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == ('2024-03-01 09:30:05', 42)
+    assert page_params({'limit': '5', 'cursor': cursor}) == (5, ('2024-03-01 09:30:05', 42))
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 4, 11, 50])
+def test_pages_cover_every_row_once_in_order(table, limit):
+    seen, cursor = [], None
+    while True:
+        rows, cursor = _page(table, limit, decode_cursor(cursor))
+        assert len(rows) <= limit
+        seen += [row['id'] for row in rows]
+        if cursor is None:
+            break
+    expected = [row['id'] for row in table.execute("SELECT id FROM datasets ORDER BY created_at DESC, id DESC")]
+    assert seen == expected
+
+@pytest.mark.parametrize('args', [{'limit': '0'}, {'limit': 'x'}, {'cursor': 'not-a-cursor'}, {'cursor': encode_cursor({'created_at': 'yesterday', 'id': 1})}])
+def test_bad_page_params_raise_value_error(args):
+    with pytest.raises(ValueError):
+        page_params(args)
+
+def test_limit_is_capped():
+    assert page_params({'limit': '10000'})[0] == MAX_PAGE_SIZE
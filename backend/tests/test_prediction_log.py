@@ -0,0 +1,56 @@
+import os
+import json
+from prediction_log import PredictionLog
+
+class FakeDatabase:
+    def __init__(self):
+        self.rows = []
+    
+    def connect(self):
+        return self
+    
+    def is_connected(self):
+        return True
+    
+    def close(self):
+        pass
+    
+    def execute_many(self, query, params_list, connection=None):
+        self.rows.extend(params_list)
+
+def _spool_rows(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row) + '\n')
+
+def test_append_returns_the_id_written_with_the_row():
+    db = FakeDatabase()
+    log = PredictionLog(db, flush_seconds=60, spool_path='')
+    prediction_id = log.append(1, 2, {'x': 1}, {'prediction': 'a', 'confidence': 0.9})
+    log.flush()
+    assert len(prediction_id) == 32
+    assert db.rows[0][-1] == prediction_id
+
+def test_flush_leaves_files_of_live_workers(tmp_path):
+    spool = str(tmp_path / 'predictions.spool')
+    # The parent process stands in for another live worker sharing the spool path
+    other = f"{spool}.{os.getppid()}.1.0.pending"
+    _spool_rows(other, [[1, 2, '{}', '{}', 0.5, 'a' * 32]])
+    db = FakeDatabase()
+    log = PredictionLog(db, flush_seconds=60, spool_path=spool)
+    log.append(1, 2, {'x': 1}, {'prediction': 'a', 'confidence': 0.9})
+    assert log.flush() == 1
+    assert os.path.exists(other)
+    assert len(db.rows) == 1
+
+def test_files_of_dead_workers_are_claimed_and_flushed_once(tmp_path):
+    spool = str(tmp_path / 'predictions.spool')
+    dead_pid = 2 ** 22 + 12345  # Above the default pid_max, so never a live process
+    _spool_rows(f"{spool}.{dead_pid}.1.0.pending", [[1, 2, '{}', '{}', 0.5, 'b' * 32]])
+    # A live spool file left by the crash, and a row spooled before prediction ids existed
+    _spool_rows(f"{spool}.{dead_pid}", [[1, 2, '{}', '{}', 0.5]])
+    first, second = FakeDatabase(), FakeDatabase()
+    assert PredictionLog(first, flush_seconds=60, spool_path=spool).flush() == 2
+    assert PredictionLog(second, flush_seconds=60, spool_path=spool).flush() == 0
+    assert sorted(row[-1] or '' for row in first.rows) == ['', 'b' * 32]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.pending')]
@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+import data_processor as data_processor_module
+from data_processor import DataProcessor
+from dataset_store import DatasetStore
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = DatasetStore(root=str(tmp_path / 'store'))
+    monkeypatch.setattr(data_processor_module, 'dataset_store', store)
+    return store
+
+@pytest.fixture
+def csv_upload(tmp_path):
+    rows = '\n'.join(f'{i},name{i},{i * 1.5},{i % 3}' for i in range(50))
+    path = tmp_path / 'upload.csv'
+    path.write_text('id,name,amount,group\n' + rows + '\n')
+    return str(path)
+
+def test_column_types_come_from_metadata(store, csv_upload, tmp_path):
+    assert store.numeric_columns(csv_upload) is None
+    store.convert(csv_upload)
+    assert store.numeric_columns(csv_upload) == ['id', 'amount', 'group']
+    parquet = tmp_path / 'upload.parquet'
+    pd.DataFrame({'a': [1.0], 'b': ['x']}).to_parquet(parquet)
+    assert store.column_types(str(parquet))['a'] == 'double'
+    assert store.numeric_columns(str(parquet)) == ['a']
+
+def test_projected_loads_read_only_the_requested_columns(store, csv_upload):
+    store.convert(csv_upload)
+    df = DataProcessor().load_columns(csv_upload, ['amount', 'id'], nrows=5)
+    assert list(df.columns) == ['amount', 'id']
+    assert df['id'].tolist() == [0, 1, 2, 3, 4]
+
+def test_visualizations_read_two_numeric_columns_and_twenty_rows(store, csv_upload, monkeypatch):
+    store.convert(csv_upload)
+    calls = []
+    load = store.load
+    
+    def recording_load(file_path, columns=None, **kwargs):
+        calls.append((columns, kwargs.get('nrows')))
+        return load(file_path, columns=columns, **kwargs)
+    
+    monkeypatch.setattr(store, 'load', recording_load)
+    DataProcessor().generate_visualizations(csv_upload, ['id', 'name', 'amount', 'group'])
+    assert calls == [(['id', 'amount'], 20)]
@@ -0,0 +1,112 @@
+from contextlib import contextmanager
+import pytest
+from flask import Flask
+from database import db, WRITE_TABLE_PATTERN
+from cache import TTLCache
+
+QUERY = "SELECT id, file_path FROM datasets WHERE id = %s AND user_id = %s"
+
+class FakeCursor:
+    def __init__(self, log):
+        self.log = log
+        self.lastrowid = 1
+    
+    def execute(self, query, params):
+        self.log.append(query)
+    
+    def executemany(self, query, params_list):
+        self.log.append(query)
+    
+    def fetchall(self):
+        return [{'id': 1, 'file_path': f'path-{len(self.log)}'}]
+    
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, log):
+        self.log = log
+    
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.log)
+    
+    def commit(self):
+        pass
+    
+    def rollback(self):
+        pass
+
+@pytest.fixture
+def executed(monkeypatch):
+    log = []
+    
+    @contextmanager
+    def connection():
+        yield FakeConnection(log)
+    
+    monkeypatch.setattr(db, 'connection', connection)
+    db._query_cache.clear()
+    db._cached_keys.clear()
+    yield log
+    db._query_cache.clear()
+    db._cached_keys.clear()
+
+def test_repeated_reads_hit_the_cache_and_return_copies(executed):
+    rows = db.cached_query(QUERY, (1, 2), tables=['datasets'])
+    rows[0]['file_path'] = 'changed'
+    assert db.cached_query(QUERY, (1, 2), tables=['datasets']) == [{'id': 1, 'file_path': 'path-1'}]
+    assert len(executed) == 1
+    db.cached_query(QUERY, (1, 3), tables=['datasets'])
+    assert len(executed) == 2
+
+@pytest.mark.parametrize('write', [
+    "UPDATE datasets SET file_path = %s WHERE id = %s",
+    "INSERT INTO datasets (name) VALUES (%s)",
+    "insert ignore into `datasets` (name) values (%s)",
+    "DELETE FROM datasets WHERE id = %s",
+    "REPLACE INTO datasets (id) VALUES (%s)"
+])
+def test_writes_to_a_table_drop_its_cached_reads(executed, write):
+    db.cached_query(QUERY, (1, 2), tables=['datasets'])
+    db.execute_query(write, ('x',), fetch=False)
+    assert db.cached_query(QUERY, (1, 2), tables=['datasets'])[0]['file_path'] == 'path-3'
+    assert len(executed) == 3
+
+def test_batch_writes_drop_cached_reads(executed):
+    db.cached_query(QUERY, (1, 2), tables=['datasets'])
+    db.execute_many("INSERT INTO datasets (name) VALUES (%s)", [('a',), ('b',)])
+    db.cached_query(QUERY, (1, 2), tables=['datasets'])
+    assert len(executed) == 3
+
+def test_writes_to_other_tables_keep_cached_reads(executed):
+    db.cached_query(QUERY, (1, 2), tables=['datasets'])
+    db.execute_query("UPDATE models SET model_path = %s WHERE id = %s", ('x', 1), fetch=False)
+    db.execute_query("SELECT * FROM datasets", fetch=True)
+    db.cached_query(QUERY, (1, 2), tables=['datasets'])
+    assert len(executed) == 3
+
+def test_writes_drop_the_request_cache_too(executed):
+    with Flask(__name__).test_request_context():
+        db.cached_query(QUERY, (1, 2), tables=['datasets'])
+        db.cached_query(QUERY, (1, 2), tables=['datasets'])
+        assert len(executed) == 1
+        db.execute_query("UPDATE datasets SET name = %s WHERE id = %s", ('x', 1), fetch=False)
+        db.cached_query(QUERY, (1, 2), tables=['datasets'])
+        assert len(executed) == 3
+
+def test_expired_entries_are_read_again(executed):
+    db.cached_query(QUERY, (1, 2), tables=['datasets'], ttl=0)
+    db.cached_query(QUERY, (1, 2), tables=['datasets'], ttl=0)
+    assert len(executed) == 2
+
+def test_write_table_pattern_ignores_reads():
+    assert WRITE_TABLE_PATTERN.match("SELECT * FROM datasets") is None
+    assert WRITE_TABLE_PATTERN.match("  UPDATE models SET x = 1").group(1) == 'models'
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
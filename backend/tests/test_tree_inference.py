@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor, ExtraTreesClassifier
+from sklearn.tree import DecisionTreeClassifier
+from tree_inference import CompiledTrees, compile_model
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 6))
+    return X, rng
+
+def test_binary_classifier_matches_sklearn(data):
+    X, _ = data
+    y = (X[:, 0] + X[:, 1] > 0).astype(int)
+    model = RandomForestClassifier(n_estimators=15, random_state=0).fit(X, y)
+    compiled = compile_model(model)
+    assert np.array_equal(compiled.predict_proba(X), model.predict_proba(X))
+    assert np.array_equal(compiled.predict(X), model.predict(X))
+
+def test_multiclass_classifier_matches_sklearn(data):
+    X, _ = data
+    y = np.array(['low', 'mid', 'high'])[np.digitize(X[:, 2], [-0.5, 0.5])]
+    model = ExtraTreesClassifier(n_estimators=10, random_state=0).fit(X, y)
+    compiled = compile_model(model)
+    assert np.array_equal(compiled.predict_proba(X), model.predict_proba(X))
+    assert np.array_equal(compiled.predict(X), model.predict(X))
+
+def test_regressor_matches_sklearn(data):
+    X, rng = data
+    y = X[:, 0] * 3 + rng.normal(size=len(X))
+    model = RandomForestRegressor(n_estimators=12, max_depth=6, random_state=0).fit(X, y)
+    compiled = compile_model(model)
+    assert np.array_equal(compiled.predict(X), model.predict(X))
+    with pytest.raises(ValueError):
+        compiled.predict_proba(X)
+
+def test_single_node_trees_match_sklearn(data):
+    X, _ = data
+    # A constant target leaves every tree with only its root
+    classifier = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, np.ones(len(X), dtype=int))
+    regressor = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, np.full(len(X), 2.5))
+    assert all(tree.tree_.node_count == 1 for tree in classifier.estimators_)
+    compiled = CompiledTrees(classifier)
+    assert np.array_equal(compiled.predict_proba(X), classifier.predict_proba(X))
+    assert np.array_equal(compiled.predict(X), classifier.predict(X))
+    assert np.array_equal(CompiledTrees(regressor).predict(X), regressor.predict(X))
+
+def test_missing_values_and_single_rows(data):
+    X, rng = data
+    y = (X[:, 0] > 0).astype(int)
+    X = X.copy()
+    X[rng.random(X.shape) < 0.1] = np.nan
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+    compiled = compile_model(model)
+    assert np.array_equal(compiled.predict_proba(X), model.predict_proba(X))
+    assert np.array_equal(compiled.predict_proba(X[0]), model.predict_proba(X[:1]))
+    with pytest.raises(ValueError):
+        compiled.predict(X[:, :3])
+
+def test_only_forests_are_compiled(data):
+    X, _ = data
+    y = (X[:, 0] > 0).astype(int)
+    assert compile_model(DecisionTreeClassifier(random_state=0).fit(X, y)) is None
+    assert compile_model(RandomForestRegressor(n_estimators=3, random_state=0).fit(X, np.c_[y, y])) is None
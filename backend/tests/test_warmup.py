@@ -0,0 +1,101 @@
+import gc
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pytest
+import warmup
+from shared_features import SharedFeatureRegistry, init_worker, shared_features
+
+def _shared_sum(key):
+    array, meta = shared_features.get(key)
+    return float(array.sum()), meta
+
+@pytest.fixture
+def registry():
+    registry = SharedFeatureRegistry()
+    yield registry
+    registry.close()
+
+def test_published_arrays_are_read_only_copies(registry):
+    source = np.arange(12, dtype=np.float64).reshape(3, 4)
+    registry.publish('k:X', source, {'rows': 3})
+    array, meta = registry.get('k:X')
+    np.testing.assert_array_equal(array, source)
+    assert meta == {'rows': 3}
+    assert not array.flags.writeable
+    assert registry.get('missing') is None
+    assert registry.nbytes() == source.nbytes
+    with pytest.raises(ValueError):
+        registry.publish('k:names', np.array(['a', None], dtype=object))
+
+def test_other_processes_attach_by_descriptor(registry):
+    registry.publish('k:X', np.ones((100, 3)), {'rows': 100})
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=init_worker, initargs=(registry.descriptors(),)) as pool:
+        assert pool.submit(_shared_sum, 'k:X').result(timeout=60) == (300.0, {'rows': 100})
+
+def test_segments_are_gone_once_the_owner_closes(registry):
+    registry.publish('k:X', np.ones(4))
+    reader = SharedFeatureRegistry()
+    reader.attach_all(registry.descriptors())
+    registry.close()
+    assert reader.get('k:X') is None
+
+class FakeDatabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.closed = False
+    
+    def execute_query(self, query, params=None):
+        return self.rows[:params[0]]
+    
+    def close_connection(self):
+        self.closed = True
+
+class FakeProcessor:
+    def __init__(self, broken=()):
+        self.loaded = []
+        self.published = []
+        self.broken = broken
+    
+    def load_model(self, model_path):
+        if model_path in self.broken:
+            raise OSError('missing model file')
+        self.loaded.append(model_path)
+    
+    def compiled_model(self, model_path):
+        return None
+    
+    def publish_features(self, file_path, headers):
+        self.published.append((file_path, headers))
+        return 800
+
+def test_warmup_loads_the_most_used_models_and_their_datasets():
+    rows = [
+        {'id': i, 'model_path': f'm{i}.pkl', 'dataset_id': dataset_id, 'file_path': f'd{dataset_id}.csv', 'headers': json.dumps(['a'])}
+        for i, dataset_id in enumerate([1, 1, 2, 3, 4])
+    ]
+    db = FakeDatabase(rows)
+    processor = FakeProcessor(broken={'m3.pkl'})
+    try:
+        report = warmup.warmup(db, processor, model_limit=4, dataset_limit=5)
+    finally:
+        gc.unfreeze()
+    assert db.closed
+    # m3's model could not be loaded, so its dataset is skipped too; m4 is beyond the limit
+    assert processor.loaded == ['m0.pkl', 'm1.pkl', 'm2.pkl']
+    assert processor.published == [('d1.csv', ['a']), ('d2.csv', ['a'])]
+    assert (report['models'], report['datasets'], report['shared_bytes']) == (3, 2, 1600)
+
+def test_warmup_survives_an_unreachable_database():
+    class BrokenDatabase(FakeDatabase):
+        def execute_query(self, query, params=None):
+            raise ConnectionError('no database')
+    
+    db = BrokenDatabase([])
+    try:
+        assert warmup.warmup(db, FakeProcessor(), model_limit=4)['models'] == 0
+    finally:
+        gc.unfreeze()
+    assert db.closed
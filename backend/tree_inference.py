@@ -0,0 +1,103 @@
+import numpy as np
+
+class CompiledTrees:
+    """A random forest flattened into contiguous node arrays, evaluated with NumPy.
+    
+    The nodes of every tree are concatenated, so one traversal step moves all
+    rows down all trees at once: the node of each (row, tree) pair that has
+    not reached a leaf yet is gathered into its feature and threshold and
+    replaced by the chosen child. Rows are compared as float32 against the
+    float64 thresholds and leaf outputs are summed tree by tree, exactly as
+    sklearn does, so results are identical to the model's. Its input
+    validation is skipped: X must already be the encoded feature matrix.
+    """
+    
+    def __init__(self, model):
+        trees = list(model.estimators_)
+        self.classes_ = getattr(model, 'classes_', None)
+        self.n_features_in_ = model.n_features_in_
+        self.n_trees = len(trees)
+        
+        features, thresholds, lefts, rights, leaves, missing_left, values, roots = [], [], [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            t = tree.tree_
+            nodes = np.arange(t.node_count) + offset
+            leaf = t.children_left == -1
+            roots.append(offset)
+            features.append(np.where(leaf, 0, t.feature))
+            thresholds.append(t.threshold)
+            lefts.append(np.where(leaf, nodes, t.children_left + offset))
+            rights.append(np.where(leaf, nodes, t.children_right + offset))
+            leaves.append(leaf)
+            missing_left.append(np.asarray(getattr(t, 'missing_go_to_left', np.zeros(t.node_count)), dtype=bool))
+            # Class fractions of classifiers, the mean target of regressors
+            values.append(t.value[:, 0, :] if self.classes_ is not None else t.value[:, 0, 0])
+            offset += t.node_count
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds)
+        self.left = np.concatenate(lefts).astype(np.intp)
+        self.right = np.concatenate(rights).astype(np.intp)
+        self.is_leaf = np.concatenate(leaves)
+        self.missing_left = np.concatenate(missing_left)
+        self.value = np.concatenate(values)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.node_count = offset
+    
+    def apply(self, X):
+        """Leaf index of every row in every tree, shape (rows, trees)"""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, but the model expects {self.n_features_in_}")
+        # One (row, tree) pair per entry, indexing the flat rows by row offset + feature
+        nodes = np.tile(self.roots, X.shape[0])
+        offsets = np.repeat(np.arange(X.shape[0]) * X.shape[1], self.n_trees)
+        values = X.ravel()
+        # Pairs still at a split; the others have reached their leaf
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while len(active):
+            current = nodes[active]
+            x = values[offsets[active] + self.feature[current]]
+            # Missing values follow the side sklearn learned for them at each split
+            go_left = np.where(np.isnan(x), self.missing_left[current], x <= self.threshold[current])
+            current = np.where(go_left, self.left[current], self.right[current])
+            nodes[active] = current
+            active = active[~self.is_leaf[current]]
+        return nodes.reshape(X.shape[0], self.n_trees)
+    
+    def _output(self, X):
+        leaves = self.apply(X)
+        # Summed tree by tree like sklearn's accumulation, so the floating-point result is the same
+        total = np.zeros((len(leaves),) + self.value.shape[1:], dtype=np.float64)
+        for tree in range(self.n_trees):
+            total += self.value[leaves[:, tree]]
+        total /= self.n_trees
+        return total
+    
+    def predict_proba(self, X):
+        """Class probabilities, as the model's predict_proba"""
+        if self.classes_ is None:
+            raise ValueError("predict_proba is only available for classifiers")
+        return self._output(X)
+    
+    def predict(self, X):
+        """Predictions, as the model's predict"""
+        output = self._output(X)
+        if self.classes_ is None:
+            return output
+        return self.classes_.take(np.argmax(output, axis=1), axis=0)
+
+def compile_model(model):
+    """CompiledTrees for a fitted single-output random forest or extra-trees model, else None.
+    
+    A single decision tree is not compiled: sklearn walks one tree about as
+    fast as the NumPy traversal does.
+    """
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor, ExtraTreesClassifier, ExtraTreesRegressor
+    
+    forests = (RandomForestClassifier, RandomForestRegressor, ExtraTreesClassifier, ExtraTreesRegressor)
+    if not isinstance(model, forests) or getattr(model, 'n_outputs_', None) != 1:
+        return None
+    return CompiledTrees(model)
@@ -0,0 +1,73 @@
+import gc
+import json
+import time
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+def most_used_models(db, limit):
+    """The models with the most predictions, with their dataset's file path and headers"""
+    return db.execute_query(
+        """SELECT m.id, m.model_path, m.dataset_id, d.file_path, d.headers,
+                  COUNT(p.id) AS prediction_count
+           FROM models m
+           JOIN datasets d ON d.id = m.dataset_id
+           LEFT JOIN predictions p ON p.model_id = m.id
+           WHERE m.status = 'trained'
+           GROUP BY m.id, m.model_path, m.dataset_id, d.file_path, d.headers
+           ORDER BY prediction_count DESC, m.id DESC
+           LIMIT %s""",
+        (limit,)
+    )
+
+def warmup(db, ml_processor, model_limit=None, dataset_limit=None):
+    """Load hot models and feature matrices into this process before workers are forked.
+    
+    Models, and the compiled form of tree models, go into the processor's
+    model cache; the feature matrices of the datasets behind them go into
+    shared memory. gc.freeze() then moves every
+    object allocated so far out of the collector's reach, so the collector
+    does not touch (and copy) the shared pages in the forked workers.
+    """
+    model_limit = Config.WARMUP_MODELS if model_limit is None else model_limit
+    dataset_limit = Config.WARMUP_DATASETS if dataset_limit is None else dataset_limit
+    started = time.perf_counter()
+    report = {'models': 0, 'datasets': 0, 'shared_bytes': 0}
+    
+    try:
+        rows = most_used_models(db, model_limit) if model_limit else []
+    except Exception as e:
+        logger.warning(f"Warmup skipped, could not query models: {e}")
+        rows = []
+    finally:
+        # Workers must open their own connections
+        db.close_connection()
+    
+    seen_datasets = set()
+    for row in rows:
+        try:
+            ml_processor.load_model(row['model_path'])
+            ml_processor.compiled_model(row['model_path'])
+            report['models'] += 1
+        except Exception as e:
+            logger.warning(f"Warmup could not load model {row['id']}: {e}")
+            continue
+        
+        if row['dataset_id'] in seen_datasets or len(seen_datasets) >= dataset_limit:
+            continue
+        seen_datasets.add(row['dataset_id'])
+        try:
+            headers = json.loads(row['headers']) if row['headers'] else []
+            shared_bytes = ml_processor.publish_features(row['file_path'], headers)
+            if shared_bytes:
+                report['datasets'] += 1
+                report['shared_bytes'] += shared_bytes
+        except Exception as e:
+            logger.warning(f"Warmup could not prepare dataset {row['dataset_id']}: {e}")
+    
+    gc.collect()
+    gc.freeze()
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    logger.info(f"Warmup complete: {report}")
+    return report
@@ -93,8 +93,11 @@ const Dashboard: React.FC = () => {
     
     try {
       const response = await processingAPI.gathering(datasetId);
-      setInsights(response.insights || 'Data gathering completed successfully.');
+      setInsights(response.insights || 'Data gathering completed successfully. Generating AI insights...');
       setCurrentStep(2);
+      if (!response.insights) {
+        pollInsights(response.workflow_id);
+      }
     } catch (err: any) {
       setError(err.message || "Failed to process data gathering.");
     } finally {
@@ -102,6 +105,26 @@ const Dashboard: React.FC = () => {
     }
   };
 
+  // Insights are generated in the background; poll until they are stored
+  const pollInsights = async (workflowId: number, attempt = 0) => {
+    try {
+      const response = await processingAPI.insights(workflowId);
+      if (response.status === 'completed' && response.insights) {
+        setInsights(response.insights);
+        return;
+      }
+      if (response.status === 'failed') {
+        setInsights('Data gathering completed successfully.');
+        return;
+      }
+    } catch (err) {
+      console.error('Failed to load insights:', err);
+    }
+    if (attempt < 30) {
+      setTimeout(() => pollInsights(workflowId, attempt + 1), 2000);
+    }
+  };
+
   const loadModelSuggestions = async () => {
     if (!datasetId) return;
     try {
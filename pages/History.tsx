@@ -6,6 +6,8 @@ const History: React.FC = () => {
   const [historyItems, setHistoryItems] = useState<any[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     loadHistory();
@@ -16,6 +18,7 @@ const History: React.FC = () => {
       setLoading(true);
       const response = await historyAPI.getAll();
       setHistoryItems(response.history || []);
+      setNextCursor(response.next_cursor || null);
       setError(null);
     } catch (err: any) {
       setError(err.message || 'Failed to load history');
@@ -25,6 +28,20 @@ const History: React.FC = () => {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const response = await historyAPI.getAll(nextCursor);
+      setHistoryItems((items) => [...items, ...(response.history || [])]);
+      setNextCursor(response.next_cursor || null);
+    } catch (err: any) {
+      setError(err.message || 'Failed to load history');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleLoadModel = async (sessionId: number) => {
     try {
       const session = await historyAPI.load(sessionId);
@@ -102,6 +119,17 @@ const History: React.FC = () => {
                </div>
             </div>
           ))}
+          {nextCursor && (
+            <div className="text-center pt-2">
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="px-4 py-2 border border-gray-300 rounded-lg text-sm font-medium hover:bg-gray-50 transition-colors disabled:opacity-50"
+              >
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </button>
+            </div>
+          )}
         </div>
       )}
     </div>
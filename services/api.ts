@@ -55,6 +55,11 @@ async function apiRequest<T>(
   return response.json();
 }
 
+// Query string for keyset-paginated listings
+function pageQuery(cursor?: string | null, limit: number = 20): string {
+  return `limit=${limit}` + (cursor ? `&cursor=${encodeURIComponent(cursor)}` : '');
+}
+
 // File upload helper
 async function apiUpload<T>(
   endpoint: string,
@@ -127,17 +132,25 @@ export const datasetAPI = {
   get: async (datasetId: number) => {
     return apiRequest<any>(`/datasets/${datasetId}`);
   },
+
+  list: async (cursor?: string | null, limit: number = 20) => {
+    return apiRequest<{ datasets: any[]; next_cursor: string | null }>(`/datasets?${pageQuery(cursor, limit)}`);
+  },
 };
 
 // Processing APIs
 export const processingAPI = {
   gathering: async (datasetId: number) => {
-    return apiRequest<{ workflow_id: number; data: any; insights: string }>('/process/gathering', {
+    return apiRequest<{ workflow_id: number; data: any; insights: string | null }>('/process/gathering', {
       method: 'POST',
       body: JSON.stringify({ dataset_id: datasetId }),
     });
   },
 
+  insights: async (workflowId: number) => {
+    return apiRequest<{ workflow_id: number; status: string; insights: string | null }>(`/workflows/${workflowId}/insights`);
+  },
+
   cleaning: async (datasetId: number) => {
     return apiRequest<{ workflow_id: number; data: any }>('/process/cleaning', {
       method: 'POST',
@@ -177,8 +190,18 @@ export const modelAPI = {
     return apiRequest<any>(`/models/${modelId}`);
   },
 
+  list: async (cursor?: string | null, limit: number = 20, datasetId?: number) => {
+    const query = pageQuery(cursor, limit) + (datasetId ? `&dataset_id=${datasetId}` : '');
+    return apiRequest<{ models: any[]; next_cursor: string | null }>(`/models?${query}`);
+  },
+
+  predictions: async (cursor?: string | null, limit: number = 20, modelId?: number) => {
+    const query = pageQuery(cursor, limit) + (modelId ? `&model_id=${modelId}` : '');
+    return apiRequest<{ predictions: any[]; next_cursor: string | null }>(`/predictions?${query}`);
+  },
+
   predict: async (modelId: number, features: Record<string, string>) => {
-    return apiRequest<{ prediction: any; prediction_id: number }>(`/models/${modelId}/predict`, {
+    return apiRequest<{ prediction: any; prediction_id: string }>(`/models/${modelId}/predict`, {
       method: 'POST',
       body: JSON.stringify({ features }),
     });
@@ -215,8 +238,8 @@ export const visualizationAPI = {
 
 // History APIs
 export const historyAPI = {
-  getAll: async () => {
-    return apiRequest<{ history: any[] }>('/history');
+  getAll: async (cursor?: string | null, limit: number = 50) => {
+    return apiRequest<{ history: any[]; next_cursor: string | null }>(`/history?${pageQuery(cursor, limit)}`);
   },
 
   load: async (sessionId: number) => {